@@ -1,13 +1,36 @@
 """
-usage: gimble blocks                      -z <z> [-l <l> -m <m> -u <u> -i <i>] [-f] [-h]
+usage: gimble blocks                      -z <z> [-l <l> -m <m> -u <u> -i <i>] [-b <b>] [-t <t>] [-s <s>] [-n <n> -e <e> -r] [-d] [-p <p>] [-f|-c] [-h]
     
     [Options]    
         -z, --zarr=<z>                       Path to existing GimbleStore 
         -l, --block_length=<l>               Successively genotyped sites per block [default: 64] 
+                                                (comma-separated lengths make one blocks dataset per length 
+                                                in a single pass over the sites)
         -m, --block_span=<m>                 Maximum distance between first and last site of a block (default: '-l' * 2)
         -u, --max_multiallelic=<u>           Max multiallelic variants at a site in a block (default: round('-l' * 0.05))
         -i, --max_missing=<i>                Max missing variants per block (default: round('-l' * 0.05))
+                                                ('-m', '-u', '-i' take one value per length in '-l' if comma-separated)
+        -b, --label=<b>                      Label of blocks dataset (default: unlabelled dataset 'blocks')
+                                                (if several lengths: datasets are labelled '<b>_l<l>_m<m>' 
+                                                or 'l<l>_m<m>' if no label is given)
+        -d, --defer_filter                   Save all blocks, '-u' and '-i' are applied when blocks are used
+                                                (allows 'gimble windows/tally' to change them without re-blocking)
+        -t, --layout=<t>                     Storage layout of blocks [default: arrays]
+                                                arrays: arrays for each sequence and sample set
+                                                table: one table for each sequence (indexed by sample set)
+        -s, --sample_sets=<s>                Sample sets for which blocks are made [default: all]
+                                                X: INTER-population sample sets
+                                                A/B: INTRA-population sample sets of population A/B
+                                                all: all sample sets
+                                                (other sample sets are blocked once needed)
+        -n, --max_pairs=<n>                  Max number of sample sets (pairs) per population combination (X, A, B)
+                                                (default: all sample sets)
+        -e, --seed=<e>                       Seed for random selection of sample sets [default: 19]
+        -r, --stratified                     Select sample sets so that samples are in similar numbers of sample sets
+        -p, --processes=<p>                  Number of processes (sequences are blocked in parallel) [default: 1]
         -f, --force                          Force overwrite of existing data
+        -c, --resume                         Resume interrupted run (same parameters), only blocks sequences
+                                                and sample sets that have not been saved
         -h, --help                           Show this
 
 """
@@ -22,24 +45,56 @@ class BlockParameterObj(lib.runargs.RunArgs):
     def __init__(self, params, args):
         super().__init__(params)
         self.zstore = self._get_path(args['--zarr'])
-        self.block_length = self._get_int(args['--block_length'])
-        self.block_span = self._get_block_span(args['--block_span'])
-        self.block_max_multiallelic = self._get_max_values(args['--max_multiallelic'])
-        self.block_max_missing = self._get_max_values(args['--max_missing'])
+        self.block_lengths = [self._get_int(block_length) for block_length in args['--block_length'].split(",")]
+        self.block_spans = self._get_block_spans(args['--block_span'])
+        self.block_max_multiallelics = self._get_max_values(args['--max_multiallelic'])
+        self.block_max_missings = self._get_max_values(args['--max_missing'])
+        self.label = self._check_label(args['--label'])
+        self.layout = args['--layout']
+        self.sample_sets = args['--sample_sets']
+        self.max_pairs = self._get_int(args['--max_pairs']) if args['--max_pairs'] is not None else None
+        self.seed = self._get_int(args['--seed'])
+        self.stratified = args['--stratified']
+        self.defer_filter = args['--defer_filter']
+        self.processes = self._get_int(args['--processes'])
         self.overwrite = True if args['--force'] else False
+        self.resume = args['--resume']
+
+    def _split_per_length(self, values, option):
+        values = values.split(",")
+        if len(values) != len(self.block_lengths):
+            sys.exit("[X] %r must have one value for each block length in '-l' (%s)" % (option, len(self.block_lengths)))
+        return [self._get_int(value) for value in values]
 
     def _get_max_values(self, max_value):
         if max_value is None:
-            return round(self.block_length * 0.05)
-        return self._get_int(max_value)
+            return [round(block_length * 0.05) for block_length in self.block_lengths]
+        if len(self.block_lengths) == 1 or "," in max_value:
+            return self._split_per_length(max_value, "--max_multiallelic/--max_missing")
+        return [self._get_int(max_value)] * len(self.block_lengths)
     
-    def _get_block_span(self, block_span):
+    def _get_block_spans(self, block_span):
         if block_span is None:
-            return 2 * self.block_length
-        block_span = self._get_int(block_span)
-        if block_span < self.block_length:
+            return [2 * block_length for block_length in self.block_lengths]
+        block_spans = self._split_per_length(block_span, "--block_span")
+        if any(span < length for span, length in zip(block_spans, self.block_lengths)):
             sys.exit("[X] Block span ('-m') must be greater or equal to block length '-l'")
-        return block_span
+        return block_spans
+
+    def _check_label(self, label):
+        if label is None:
+            return None
+        invalid_chars = set([c for c in label if not c.isalnum() and not c in set([".", "-", "_"])])
+        if invalid_chars:
+            sys.exit("[X] --label contains invalid characters (%r). Should only contain alphanumericals and -_." % "".join(invalid_chars))
+        return label
+
+    def _get_blocks_labels(self):
+        if len(self.block_lengths) == 1:
+            return [self.label]
+        return [
+            "%sl%s_m%s" % ("" if self.label is None else "%s_" % self.label, block_length, block_span)
+            for block_length, block_span in zip(self.block_lengths, self.block_spans)]
         
 def main(params):
     try:
@@ -49,13 +104,25 @@ def main(params):
         parameterObj = BlockParameterObj(params, args)
         import lib.gimble
         gimbleStore = lib.gimble.Store(path=parameterObj.zstore)
-        gimbleStore.blocks(
-            block_length=parameterObj.block_length,
-            block_span=parameterObj.block_span,
-            block_max_multiallelic=parameterObj.block_max_multiallelic,
-            block_max_missing=parameterObj.block_max_missing,
-            overwrite=parameterObj.overwrite)
-        gimbleStore.log_action(module=parameterObj._MODULE, command=parameterObj._get_cmd())
+        try:
+            gimbleStore.blocks_sweep(
+                block_lengths=parameterObj.block_lengths,
+                block_spans=parameterObj.block_spans,
+                block_max_multiallelics=parameterObj.block_max_multiallelics,
+                block_max_missings=parameterObj.block_max_missings,
+                overwrite=parameterObj.overwrite,
+                layout=parameterObj.layout,
+                processes=parameterObj.processes,
+                sample_sets=parameterObj.sample_sets,
+                max_pairs=parameterObj.max_pairs,
+                seed=parameterObj.seed,
+                stratified=parameterObj.stratified,
+                defer_filter=parameterObj.defer_filter,
+                blocks_labels=parameterObj._get_blocks_labels(),
+                resume=parameterObj.resume)
+            gimbleStore.log_action(module=parameterObj._MODULE, command=parameterObj._get_cmd())
+        finally:
+            gimbleStore.consolidate_metadata()
         print("[*] Total runtime was %s" % (lib.runargs.format_time(timer() - start_time)))
     except KeyboardInterrupt:
         print("\n[X] Interrupted by user after %s !\n" % (lib.runargs.format_time(timer() - start_time)))
@@ -28,7 +28,10 @@ def main(params):
         parameterObj = DeleteParameterObj(params, args)
         import lib.gimble
         gimbleStore = lib.gimble.Store(path=parameterObj.zstore)
-        gimbleStore.delete_key(data_key=parameterObj.data_key)
+        try:
+            gimbleStore.delete_key(data_key=parameterObj.data_key)
+        finally:
+            gimbleStore.consolidate_metadata()
         print("[*] Total runtime was %s" % (lib.runargs.format_time(timer() - start_time)))
     except KeyboardInterrupt:
         print("\n[X] Interrupted by user after %s !\n" % (lib.runargs.format_time(timer() - start_time)))
@@ -36,14 +36,17 @@ def main(params):
         parameterObj = GridsearchParameterObj(params, args)
         import lib.gimble
         gimbleStore = lib.gimble.Store(path=parameterObj.zstore, create=False)
-        gimbleStore.gridsearch(
-            data_key=parameterObj.data_key,
-            grid_key=parameterObj.grid_key,
-            windowsum=parameterObj.windowsum,
-            num_cores=parameterObj.num_cores,
-            chunksize=parameterObj.chunksize,
-            overwrite=parameterObj.overwrite,
-            )
+        try:
+            gimbleStore.gridsearch(
+                data_key=parameterObj.data_key,
+                grid_key=parameterObj.grid_key,
+                windowsum=parameterObj.windowsum,
+                num_cores=parameterObj.num_cores,
+                chunksize=parameterObj.chunksize,
+                overwrite=parameterObj.overwrite,
+                )
+        finally:
+            gimbleStore.consolidate_metadata()
         print("[*] Total runtime was %s" % lib.runargs.format_time(timer() - start_time))
     except KeyboardInterrupt:
         print("\n[X] Interrupted by user after %s !\n" % lib.runargs.format_time(timer() - start_time))
@@ -40,7 +40,7 @@ def main(params):
         print("[+] Running 'gimble info' ...")
         parameterObj = InfoParameterObj(params, args)
         import lib.gimble
-        gimbleStore = lib.gimble.Store(path=parameterObj.zstore)
+        gimbleStore = lib.gimble.Store(path=parameterObj.zstore, read_only=True)
         print("[+] Getting report. This might take a while ...")
         info = gimbleStore.info(
             version=parameterObj._VERSION,
@@ -50,7 +50,7 @@ def main(params):
         args = docopt(__doc__)
         parameterObj = ListParameterObj(params, args)
         import lib.gimble
-        gimbleStore = lib.gimble.Store(path=parameterObj.zstore)
+        gimbleStore = lib.gimble.Store(path=parameterObj.zstore, read_only=True)
         gimbleStore.list_keys(category=parameterObj.module)
         print("[*] Total runtime was %s" % (lib.runargs.format_time(timer() - start_time)))
     except KeyboardInterrupt:
@@ -116,22 +116,25 @@ def main(params):
             path=parameterObj.zstore, 
             prefix=parameterObj.prefix, 
             create=(False if parameterObj.zstore else True))
-        gimbleStore.makegrid(
-            Ne_A=parameterObj.Ne_A,
-            Ne_B=parameterObj.Ne_B,
-            Ne_A_B=parameterObj.Ne_A_B,
-            T=parameterObj.T,
-            me=parameterObj.me,
-            makegrid_label=parameterObj.makegrid_label,
-            model=parameterObj.model,
-            block_length=parameterObj.block_length,
-            ref_pop=parameterObj.ref_pop,
-            mu=parameterObj.mu,
-            kmax=parameterObj.kmax,
-            processes=parameterObj.processes,
-            seed=parameterObj.seed,
-            overwrite=parameterObj.overwrite,
-           )
+        try:
+            gimbleStore.makegrid(
+                Ne_A=parameterObj.Ne_A,
+                Ne_B=parameterObj.Ne_B,
+                Ne_A_B=parameterObj.Ne_A_B,
+                T=parameterObj.T,
+                me=parameterObj.me,
+                makegrid_label=parameterObj.makegrid_label,
+                model=parameterObj.model,
+                block_length=parameterObj.block_length,
+                ref_pop=parameterObj.ref_pop,
+                mu=parameterObj.mu,
+                kmax=parameterObj.kmax,
+                processes=parameterObj.processes,
+                seed=parameterObj.seed,
+                overwrite=parameterObj.overwrite,
+               )
+        finally:
+            gimbleStore.consolidate_metadata()
         print("[*] Total runtime was %s" % (lib.runargs.format_time(timer() - start_time)))
     except KeyboardInterrupt:
         print("\n[X] Interrupted by user after %s !\n" % (lib.runargs.format_time(timer() - start_time)))
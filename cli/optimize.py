@@ -174,28 +174,31 @@ def main(params):
         parameterObj = OptimizeParameterObj(params, args)
         import lib.gimble
         gimbleStore = lib.gimble.Store(path=parameterObj.zstore, create=False)
-        gimbleStore.optimize(
-            optimize_label=parameterObj.optimize_label,
-            data_key=parameterObj.data_key,
-            windowsum=parameterObj.windowsum,
-            Ne_A=parameterObj.Ne_A,
-            Ne_B=parameterObj.Ne_B,
-            Ne_A_B=parameterObj.Ne_A_B,
-            T=parameterObj.T,
-            me=parameterObj.me,
-            model=parameterObj.model,
-            sync_pops=parameterObj.sync_pops,
-            ref_pop=parameterObj.ref_pop,
-            mu=parameterObj.mu,
-            processes=parameterObj.processes,
-            seed=parameterObj.seed,
-            overwrite=parameterObj.overwrite,
-            start_point_method=parameterObj.start_point_method,
-            nlopt_maxeval=parameterObj.max_iterations,
-            nlopt_xtol_rel=parameterObj.xtol_rel,
-            nlopt_ftol_rel=parameterObj.ftol_rel,
-            nlopt_algorithm=parameterObj.algorithm,
-            )
+        try:
+            gimbleStore.optimize(
+                optimize_label=parameterObj.optimize_label,
+                data_key=parameterObj.data_key,
+                windowsum=parameterObj.windowsum,
+                Ne_A=parameterObj.Ne_A,
+                Ne_B=parameterObj.Ne_B,
+                Ne_A_B=parameterObj.Ne_A_B,
+                T=parameterObj.T,
+                me=parameterObj.me,
+                model=parameterObj.model,
+                sync_pops=parameterObj.sync_pops,
+                ref_pop=parameterObj.ref_pop,
+                mu=parameterObj.mu,
+                processes=parameterObj.processes,
+                seed=parameterObj.seed,
+                overwrite=parameterObj.overwrite,
+                start_point_method=parameterObj.start_point_method,
+                nlopt_maxeval=parameterObj.max_iterations,
+                nlopt_xtol_rel=parameterObj.xtol_rel,
+                nlopt_ftol_rel=parameterObj.ftol_rel,
+                nlopt_algorithm=parameterObj.algorithm,
+                )
+        finally:
+            gimbleStore.consolidate_metadata()
         print("[*] Total runtime was %s" % (lib.runargs.format_time(timer() - start_time)))
     except KeyboardInterrupt:
         print("\n[X] Interrupted by user after %s !\n" % (lib.runargs.format_time(timer() - start_time)))
@@ -1,5 +1,5 @@
 """
-usage: gimble parse                      -g <g> -v <v> -b <b> -s <s> [-z <z>] [-f] [-h]
+usage: gimble parse                      -g <g> -v <v> -b <b> -s <s> [-z <z>] [-c <c>] [-p <p>] [-f] [-h]
 
     [Options]
         -g, --genome_f=<g>               Gimble genome file (TSV) of sequence IDs/lengths for filtering BED file.
@@ -8,6 +8,10 @@ usage: gimble parse                      -g <g> -v <v> -b <b> -s <s> [-z <z>] [-
         -s, --sample_f=<s>               Gimble sample file (CSV) for filtering VCF file (vertically). 
                                             Only two populations are supported.
         -z, --zarr=<z>                   Prefix to use for GimbleStore [default: gimble]
+        -c, --chunk_length=<c>           Read VCF file in a single pass, in chunks of this many records
+                                            (default: one region query per sequence)
+        -p, --processes=<p>              Number of processes (sequences are parsed in parallel)
+                                            [default: 1]
         -f, --force                      Force overwrite of existing data
         -h, --help                       Show this
     
@@ -29,6 +33,8 @@ class ParseParameterObj(lib.runargs.RunArgs):
         self.sample_f = self._get_path(args['--sample_f'])
         self.outprefix = args['--zarr']
         self.overwrite = args['--force']
+        self.chunk_length = self._get_chunk_length(args['--chunk_length'])
+        self.processes = self._get_int(args['--processes'])
         self._pairedness = 2
         self._check()
 
@@ -42,6 +48,18 @@ class ParseParameterObj(lib.runargs.RunArgs):
         missing_args = [k for k,v in required_values_by_arg.items() if v is None]
         if missing_args:
             sys.exit("[X] Please provide arguments for %s" % (", ".join(missing_args)))
+        if self.processes < 1:
+            sys.exit("[X] '--processes' must be a positive integer.")
+        if self.chunk_length and self.processes > 1:
+            sys.exit("[X] '--chunk_length' (single pass over VCF file) can't be combined with '--processes'.")
+
+    def _get_chunk_length(self, chunk_length):
+        if chunk_length is None:
+            return None
+        chunk_length = self._get_int(chunk_length)
+        if chunk_length < 1:
+            sys.exit("[X] '--chunk_length' must be a positive integer.")
+        return chunk_length
 
 def main(params):
     try:
@@ -51,12 +69,17 @@ def main(params):
         parameterObj = ParseParameterObj(params, args)
         import lib.gimble
         gimbleStore = lib.gimble.Store(prefix=parameterObj.outprefix, create=True, overwrite=parameterObj.overwrite)
-        gimbleStore.measure(
-            genome_f=parameterObj.genome_f, 
-            sample_f=parameterObj.sample_f, 
-            bed_f=parameterObj.bed_f, 
-            vcf_f=parameterObj.vcf_f)
-        gimbleStore.log_action(module=parameterObj._MODULE, command=parameterObj._get_cmd())
+        try:
+            gimbleStore.measure(
+                genome_f=parameterObj.genome_f, 
+                sample_f=parameterObj.sample_f, 
+                bed_f=parameterObj.bed_f, 
+                vcf_f=parameterObj.vcf_f,
+                chunk_length=parameterObj.chunk_length,
+                processes=parameterObj.processes)
+            gimbleStore.log_action(module=parameterObj._MODULE, command=parameterObj._get_cmd())
+        finally:
+            gimbleStore.consolidate_metadata()
         print("[*] Total runtime was %s" % (lib.runargs.format_time(timer() - start_time)))
     except KeyboardInterrupt:
         print("\n[X] Interrupted by user after %s !\n" % (lib.runargs.format_time(timer() - start_time)))
@@ -36,6 +36,7 @@ import zarr
 import itertools
 import shutil
 import pathlib
+import lib.gimble
 
 DEGENERACIES = [0, 2, 3, 4]
 
@@ -253,7 +254,7 @@ def parse_vcf_file(parameterObj, sequence_ids, query_regions_by_sequence_id):
             if not vcf_data is None:
                 if sequence_id in query_regions_by_sequence_id:
                     pos_array = np.array(vcf_data[pos_key]) - 1 # port to BED (0-based) coordinates
-                    cds_mask = np.isin(pos_array, query_regions_by_sequence_id[sequence_id])
+                    cds_mask, _ = lib.gimble.sorted_join(pos_array, query_regions_by_sequence_id[sequence_id])
                     pos = pos_array[cds_mask]
                     zstore.create_dataset("seqs/%s/variants/pos" % sequence_id, data=pos)
                     ref = vcf_data[ref_key][cds_mask]
@@ -363,7 +364,7 @@ def infer_degeneracy(parameterObj, transcriptObjs, zstore):
                     data[start:end]['degeneracy'] = transcriptObj.degeneracy
                 else:
                     #pos_in_cds_mask = np.isin(pos, transcriptObj.positions, assume_unique=True) # will crash if non-unique pos
-                    cds_in_pos_mask = np.isin(transcriptObj.positions, pos, assume_unique=True) # will crash if non-unique pos
+                    cds_in_pos_mask, _ = lib.gimble.sorted_join(transcriptObj.positions, pos) # pos is sorted and unique
                     for i in range(0, len(transcriptObj.sequence), 3):
                         codon_start = start+i
                         if not np.any(cds_in_pos_mask[codon_start:codon_start+3]):
@@ -386,7 +387,7 @@ def get_query_regions(transcriptObjs):
         _query_regions_by_sequence_id[transcriptObj.sequence_id].append(transcriptObj.positions)
     query_regions_by_sequence_id = {}
     for sequence_id, regions in _query_regions_by_sequence_id.items():
-        query_regions_by_sequence_id[sequence_id] = np.concatenate(regions)
+        query_regions_by_sequence_id[sequence_id] = np.unique(np.concatenate(regions)) # sorted and unique for sorted_join()
     return query_regions_by_sequence_id
 
 def main(params):
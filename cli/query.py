@@ -47,7 +47,7 @@ def main(params):
         print("[+] Running 'gimble query' ...")
         parameterObj = QueryParameterObj(params, args)
         import lib.gimble
-        gimbleStore = lib.gimble.Store(path=parameterObj.zstore)
+        gimbleStore = lib.gimble.Store(path=parameterObj.zstore, read_only=True)
         gimbleStore.query(
             parameterObj._VERSION,
             parameterObj.data_key,
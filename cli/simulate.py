@@ -120,33 +120,36 @@ def main(params):
             path=parameterObj.zstore, 
             prefix=parameterObj.prefix, 
             create=(True if parameterObj.prefix else False))
-        gimble_store.simulate(
-            zstore=parameterObj.zstore,
-            prefix=parameterObj.prefix,
-            processes=parameterObj.processes,
-            simulate_label=parameterObj.simulate_label,
-            overwrite=parameterObj.overwrite,
-            seed=parameterObj.seed,
-            samples_A=parameterObj.samples_A,
-            samples_B=parameterObj.samples_B,
-            replicates=parameterObj.replicates,
-            windows=parameterObj.windows,
-            blocks=parameterObj.blocks,
-            block_length=parameterObj.block_length,
-            continuous_genome=parameterObj.continuous_genome,
-            kmax=parameterObj.kmax,
-            Ne_A=parameterObj.Ne_A,
-            Ne_B=parameterObj.Ne_B,
-            Ne_A_B=parameterObj.Ne_A_B,
-            T=parameterObj.T,
-            me=parameterObj.me,
-            mu=parameterObj.mu,
-            model=parameterObj.model,
-            gridsearch_key=parameterObj.gridsearch_key,
-            constraint=parameterObj.constraint,
-            rec_rate=parameterObj.rec_rate,
-            rec_map=parameterObj.rec_map
-            )
+        try:
+            gimble_store.simulate(
+                zstore=parameterObj.zstore,
+                prefix=parameterObj.prefix,
+                processes=parameterObj.processes,
+                simulate_label=parameterObj.simulate_label,
+                overwrite=parameterObj.overwrite,
+                seed=parameterObj.seed,
+                samples_A=parameterObj.samples_A,
+                samples_B=parameterObj.samples_B,
+                replicates=parameterObj.replicates,
+                windows=parameterObj.windows,
+                blocks=parameterObj.blocks,
+                block_length=parameterObj.block_length,
+                continuous_genome=parameterObj.continuous_genome,
+                kmax=parameterObj.kmax,
+                Ne_A=parameterObj.Ne_A,
+                Ne_B=parameterObj.Ne_B,
+                Ne_A_B=parameterObj.Ne_A_B,
+                T=parameterObj.T,
+                me=parameterObj.me,
+                mu=parameterObj.mu,
+                model=parameterObj.model,
+                gridsearch_key=parameterObj.gridsearch_key,
+                constraint=parameterObj.constraint,
+                rec_rate=parameterObj.rec_rate,
+                rec_map=parameterObj.rec_map
+                )
+        finally:
+            gimble_store.consolidate_metadata()
         print("[*] Total runtime: %s" % lib.runargs.format_time(timer() - start_time))
     except KeyboardInterrupt:
         print("\n[X] Interrupted by user after %s !\n" % lib.runargs.format_time(timer() - start_time))
@@ -1,5 +1,5 @@
 """
-usage: gimble tally                     -z <z> -t <t> -l <l> [-k <k>] [-s <s>] [-f] [-h]
+usage: gimble tally                     -z <z> -t <t> -l <l> [-k <k>] [-s <s>] [-u <u> -i <i>] [-b <b>] [-f] [-h]
                                            
     [Options]
         -z, --zarr=<z>                  Path to existing GimbleStore
@@ -12,6 +12,11 @@ usage: gimble tally                     -z <z> -t <t> -l <l> [-k <k>] [-s <s>] [
                                             types is (hetB, hetA, hetAB, fixed)
                                             [default: 2,2,2,2]
         -s, --sequence_ids=<s>          Sequence IDs for which to tally blocks (comma-separated)
+        -u, --max_multiallelic=<u>      Max multiallelic variants per block (only for 'blocks')
+                                            (default: as in 'gimble blocks')
+        -i, --max_missing=<i>           Max missing variants per block (only for 'blocks')
+                                            (default: as in 'gimble blocks')
+        -b, --blocks_label=<b>          Label of blocks dataset (only for 'blocks', see 'gimble blocks -b')
         -f, --overwrite                 Overwrite results in GimbleStore
         -h, --help                      Show this
 """
@@ -33,7 +38,10 @@ class TallyParameterObj(lib.runargs.RunArgs):
         self.overwrite = args['--overwrite']
         self.sample_sets = 'X'
         self.sequence_ids = args['--sequence_ids']
+        self.max_multiallelic = self._get_int(args['--max_multiallelic']) if args['--max_multiallelic'] is not None else None
+        self.max_missing = self._get_int(args['--max_missing']) if args['--max_missing'] is not None else None
         self.genome_file = None
+        self.blocks_label = args['--blocks_label']
     
     def _check_label(self, label):
         invalid_chars = set([c for c in label if not c.isalnum() and not c in set([".", "-", "_"])])
@@ -55,15 +63,21 @@ def main(params):
         parameterObj = TallyParameterObj(params, args)
         import lib.gimble
         gimbleStore = lib.gimble.Store(path=parameterObj.zstore, create=False)
-        tally_key = gimbleStore.tally(
-            data_type=parameterObj.data_type,
-            data_label=parameterObj.data_label,
-            max_k=parameterObj.max_k,
-            sample_sets=parameterObj.sample_sets,
-            sequence_ids=parameterObj.sequence_ids,
-            genome_file=parameterObj.genome_file,
-            overwrite=parameterObj.overwrite
-            )
+        try:
+            tally_key = gimbleStore.tally(
+                data_type=parameterObj.data_type,
+                data_label=parameterObj.data_label,
+                max_k=parameterObj.max_k,
+                sample_sets=parameterObj.sample_sets,
+                sequence_ids=parameterObj.sequence_ids,
+                genome_file=parameterObj.genome_file,
+                overwrite=parameterObj.overwrite,
+                max_missing=parameterObj.max_missing,
+                max_multiallelic=parameterObj.max_multiallelic,
+                blocks_label=parameterObj.blocks_label
+                )
+        finally:
+            gimbleStore.consolidate_metadata()
         print("[+] Tally is accessible with the key %r." % tally_key)
         print("[*] Total runtime was %s" % (lib.runargs.format_time(timer() - start_time)))
     except KeyboardInterrupt:
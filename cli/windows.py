@@ -1,10 +1,21 @@
 """
-usage: gimble windows                    -z <z> [-w <w> -s <s>] [-f] [-h]
+usage: gimble windows                    -z <z> [-w <w> -s <s> | -x <x> [-y <y>] [-n <n>]] [-u <u> -i <i>] [-b <b>] [-t <t>] [-p <p>] [-f] [-h]
 
     [Options]
         -z, --zarr_file=<z>              Path to existing GimbleStore
         -w, --blocks=<w>                 Number of blocks in windows [default: 500]
         -s, --steps=<s>                  Number of steps (blocks) by which windows are shifted [default: 50]
+        -x, --window_bp=<x>              Length of windows in bases (instead of '-w', needs '-t index')
+        -y, --step_bp=<y>                Number of bases by which windows are shifted (default: '-x')
+        -n, --min_blocks=<n>             Min number of blocks in windows of '-x' bases [default: 1]
+        -u, --max_multiallelic=<u>       Max multiallelic variants per block (default: as in 'gimble blocks')
+        -i, --max_missing=<i>            Max missing variants per block (default: as in 'gimble blocks')
+        -b, --blocks_label=<b>           Label of blocks dataset (see 'gimble blocks -b')
+        -t, --layout=<t>                 Storage layout of windows (default: 'variation', 'index' for '-x')
+                                            variation: variation of blocks in each window
+                                            index: order of blocks and bounds of windows 
+                                                (disk use does not scale with '-w'/'-s')
+        -p, --processes=<p>              Number of processes (sequences are windowed in parallel) [default: 1]
         -f, --force                      Force overwrite of existing data
         -h, --help                       show this
 
@@ -22,8 +33,17 @@ class WindowsParameterObj(lib.runargs.RunArgs):
         self.zstore = self._get_path(args['--zarr_file'])
         self.window_size = self._get_int((args['--blocks']))
         self.window_step = self._get_int((args['--steps']))
+        self.window_bp = self._get_int(args['--window_bp']) if args['--window_bp'] is not None else None
+        self.step_bp = self._get_int(args['--step_bp']) if args['--step_bp'] is not None else None
+        self.min_blocks = self._get_int(args['--min_blocks'])
+        self.processes = self._get_int(args['--processes'])
         self.overwrite = args['--force']
-        self.check_block_steps()
+        self.max_multiallelic = self._get_int(args['--max_multiallelic']) if args['--max_multiallelic'] is not None else None
+        self.max_missing = self._get_int(args['--max_missing']) if args['--max_missing'] is not None else None
+        self.blocks_label = args['--blocks_label']
+        self.layout = args['--layout'] if args['--layout'] is not None else ('variation' if self.window_bp is None else 'index')
+        if self.window_bp is None:
+            self.check_block_steps()
 
     def check_block_steps(self):
         if not self.window_size % self.window_step == 0:
@@ -38,11 +58,22 @@ def main(params):
         parameterObj = WindowsParameterObj(params, args)
         import lib.gimble
         gimbleStore = lib.gimble.Store(path=parameterObj.zstore, create=False)
-        gimbleStore.windows(
-            window_size=parameterObj.window_size, 
-            window_step=parameterObj.window_step, 
-            overwrite=parameterObj.overwrite)
-        gimbleStore.log_action(module=parameterObj._MODULE, command=parameterObj._get_cmd())
+        try:
+            gimbleStore.windows(
+                window_size=parameterObj.window_size, 
+                window_step=parameterObj.window_step, 
+                overwrite=parameterObj.overwrite,
+                max_missing=parameterObj.max_missing,
+                max_multiallelic=parameterObj.max_multiallelic,
+                blocks_label=parameterObj.blocks_label,
+                layout=parameterObj.layout,
+                window_bp=parameterObj.window_bp,
+                step_bp=parameterObj.step_bp,
+                min_blocks=parameterObj.min_blocks,
+                processes=parameterObj.processes)
+            gimbleStore.log_action(module=parameterObj._MODULE, command=parameterObj._get_cmd())
+        finally:
+            gimbleStore.consolidate_metadata()
         print("[*] Total runtime was %s" % (lib.runargs.format_time(timer() - start_time)))
     except KeyboardInterrupt:
         print("\n[X] Interrupted by user after %s !\n" % (lib.runargs.format_time(timer() - start_time)))
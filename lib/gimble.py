@@ -47,6 +47,15 @@ SPACING = 16
 GRIDSEARCH_DTYPE = np.float32  # -3.4028235e+38 ... 3.4028235e+38
 AGEMO_VERSION = pkg_resources.get_distribution("agemo").version
 MIN_AGEMO_VERSION = '0.0.2'
+VARIANTS_CHUNK_LENGTH = 2 ** 16  # variants per chunk of 'seqs/<seq>/variants/{pos,matrix}'
+BLOCKS_LAYOUTS = ["arrays", "table"]  # 'blocks/<seq>/<sample_set_idx>/<field>' or 'blocks/<seq>/{<field>,bounds}'
+BLOCKS_TABLE_CHUNKSIZE = 2 ** 16  # rows per chunk of blocks tables (to which blocks of sample sets are appended)
+BLOCKS_FIELDS = ["starts", "ends", "variation", "missing", "multiallelic"]
+WINDOWS_STATS = ["starts", "ends", "pos_mean", "pos_median", "balance", "mse_sample_set_cov"]
+WINDOWS_LAYOUTS = ["variation", "index"]  # 'windows/<seq>/variation' or 'windows/<seq>/{order,bounds}' (blocks are read on demand)
+TALLY_DENSE_CODES = 2 ** 20  # codes of mutuples are counted with np.bincount up to this radix (see unique_mutuples)
+BLOCKS_SAMPLE_SETS = ["X", "A", "B"]  # classes of sample sets for which blocks can be made ('all' => all of them)
+VARIANTS_COMPRESSOR = numcodecs.Blosc(cname='zstd', clevel=5, shuffle=numcodecs.Blosc.BITSHUFFLE)
 # GRIDSEARCH_DTYPE=np.float64 # -1.7976931348623157e+308 ... 1.7976931348623157e+308
 ###
 
@@ -71,6 +80,30 @@ def poolcontext(*args, **kwargs):
     yield pool
     pool.terminate()
 
+def read_intervals_call(read_intervals_job):
+    """parse call for intervals of 1 sequence, returns count of bases per sample"""
+    store_path, idx, *sequence_intervals = read_intervals_job
+    gimbleStore = Store(path=store_path, worker=True)
+    return (idx, gimbleStore._read_sequence_intervals(*sequence_intervals))
+
+def make_blocks_call(make_blocks_job):
+    """blocks call for 1 sequence, counts of blocks are saved in checkpoint of sequence"""
+    store_path, seq_name, configs = make_blocks_job
+    gimbleStore = Store(path=store_path, worker=True)
+    return gimbleStore._make_sequence_blocks(seq_name, configs)
+
+def make_windows_call(make_windows_job):
+    """windows call for 1 sequence, returns count of windows"""
+    store_path, seq_name, sequence_length, sample_set_idxs, config = make_windows_job
+    gimbleStore = Store(path=store_path, worker=True)
+    return gimbleStore._make_sequence_windows(seq_name, sequence_length, sample_set_idxs, config)
+
+def read_variants_call(read_variants_job):
+    """parse call for variants of 1 sequence, returns genotype counts"""
+    store_path, vcf_f, idx, seq_name, query_samples = read_variants_job
+    gimbleStore = Store(path=store_path, worker=True)
+    return (idx, gimbleStore._read_sequence_variants(vcf_f, seq_name, query_samples))
+
 def get_fgv_idxs(kmax):
     # DOES NOT WORK FOR ndim=4 (only for ndim=(5 or 6)) !!! needs to be extended!
     # - get indices of FGVs (hetAB>0 & fixed>0) in bsfs based on kmax
@@ -408,10 +441,8 @@ def format_query_meta(meta, ignore_long=False):
     for key, value in meta.items():
         if isinstance(value, int):
             formatted_value = format_count(value)
-        elif isinstance(value, list):
-            formatted_value = str(value)
         else:
-            formatted_value = value
+            formatted_value = str(value)
         if ignore_long:
             if len(formatted_value) < LONG_THRESHOLD:
                 lines.append("[+]\t%s: %s" % (key, formatted_value))
@@ -462,6 +493,11 @@ def get_n50_from_lengths(lengths):
     return length_sorted[int(n50_idx[0][0])]
 
 def parse_intervals(bed_f, target_sequences, target_samples):
+    """Returns intervals_df and boolean matrix of shape (len(intervals_df["samples"].cat.categories), len(target_samples)).
+
+    Sample membership is resolved once per distinct samples-string (category) of BED_FILE
+    instead of expanding the samples column of every interval. Row intervals_df["samples"].cat.codes[i]
+    of the matrix holds the membership of interval i."""
     intervals_df = parse_csv(
         csv_f=bed_f,
         sep="\t",
@@ -480,30 +516,38 @@ def parse_intervals(bed_f, target_sequences, target_samples):
         .sort_values(["sequence", "start"], ascending=[True, True])
         .reset_index(drop=True)
     )
-    # Convert samples column to sample-matrix
-    intervals_df = pd.concat(
-        [
-            intervals_df,
-            intervals_df.samples.str.get_dummies(sep=",").filter(target_samples),
-        ],
-        axis=1,
-    ).drop(columns=["samples"])
-    # Subset target samples
-    samples_in_df = [sample for sample in intervals_df.columns[3:]]
-    target_samples_in_df = ordered_intersect(
-        a=samples_in_df, b=target_samples, order="a"
-    )
-    target_samples_not_in_df = set(target_samples).difference(set(target_samples_in_df))
+    # Convert samples categories to sample-matrix (target samples only)
+    sample_idx_by_sample = {sample: idx for idx, sample in enumerate(target_samples)}
+    samples_categories = intervals_df["samples"].cat.categories
+    samples_matrix = np.zeros((len(samples_categories), len(target_samples)), dtype=bool)
+    for category_idx, samples_string in enumerate(samples_categories):
+        for sample in samples_string.split(","):
+            if sample in sample_idx_by_sample:
+                samples_matrix[category_idx, sample_idx_by_sample[sample]] = True
+    # Check target samples
+    samples_codes = np.unique(intervals_df["samples"].cat.codes)
+    samples_in_df = np.any(samples_matrix[samples_codes], axis=0)
+    target_samples_not_in_df = [
+        sample for sample, in_df in zip(target_samples, samples_in_df) if not in_df
+    ]
     if target_samples_not_in_df:
         sys.exit(
             "[X] Samples in SAMPLE_FILE not found in BED_FILE: %s"
-            % ", ".join(list(target_samples_not_in_df))
+            % ", ".join(target_samples_not_in_df)
         )
-    non_target_samples_in_df = set(target_samples).difference(set(samples_in_df))
-    intervals_df = intervals_df.drop(non_target_samples_in_df, axis=1)
     # Add length column
     intervals_df["length"] = intervals_df["end"] - intervals_df["start"]
-    return intervals_df
+    return (intervals_df, samples_matrix)
+
+def get_packed_sample_mask(packed_matrix, sample_idxs):
+    """Returns boolean mask of rows of np.packbits(axis=1)-matrix in which all sample_idxs are set.
+
+    Only the bytes holding the bits of sample_idxs are read (i.e. two columns for a pair)."""
+    mask = np.ones(packed_matrix.shape[0], dtype=bool)
+    for sample_idx in sample_idxs:
+        byte_idx, bit_idx = divmod(int(sample_idx), 8)
+        mask &= (packed_matrix[:, byte_idx] & (0x80 >> bit_idx)).astype(bool)
+    return mask
 
 def bsfs_to_2d(bsfs):
     """Converts 4D bsfs to 2D array with counts, mutuples.
@@ -599,7 +643,7 @@ def get_popgen_metrics(array, sites=0):
     D) window-bsfs  := ndim (5); shape (w, maxk_m1, maxk_m2, maxk_m3, maxk_m4)
     sites = (block_length * block_count)
     """
-    assert sites > 0, "sites must be positive integer"
+    assert np.all(sites > 0), "sites must be positive integer (or array of positive integers)"
     array = array if array.ndim == 2 else bsfs_to_2d(np.array(array))
     if array.shape[1] == 5:  # block tally
         mutype_array = np.array(
@@ -631,15 +675,17 @@ def get_popgen_metrics(array, sites=0):
     )
     return np.vstack([heterozygosity_A, heterozygosity_B, d_xy, f_st])
 
-def check_unique_pos(pos_array):
+def check_unique_pos(pos_array, last_pos=None):
+    """De-duplicates sorted positions (see fix_pos_array). If given, last_pos is the last (de-duplicated)
+    position before pos_array (i.e. of previous chunk of VCF records), positions up to last_pos collide."""
     unique_pos, counts_pos = np.unique(pos_array, return_counts=True)
-    duplicates = unique_pos[counts_pos > 1]
-    if duplicates.any():
+    duplicates = unique_pos[(counts_pos > 1) | (False if last_pos is None else unique_pos <= last_pos)]
+    if duplicates.size:
         print(
             "\n[-] %s VCF records with non-unique positions found. Rescuing records by shifting position... (abort if this is not desired)"
             % (len(duplicates))
         )
-        pos_array = fix_pos_array(pos_array)
+        pos_array = fix_pos_array(pos_array) if last_pos is None else fix_pos_array_after(pos_array, last_pos)
     return pos_array
 
 def fix_pos_array(pos_array):
@@ -660,6 +706,15 @@ def fix_pos_array(pos_array):
     # if there are no duplicated values
     return pos_array
 
+def fix_pos_array_after(pos_array, last_pos):
+    """
+    De-duplicates sorted array following positions that have been de-duplicated up to last_pos (as
+    fix_pos_array would de-duplicate both, i.e. pos[i] = max(pos[i], pos[i - 1] + 1), so positions
+    are never changed by positions that follow them)
+    """
+    offsets = np.arange(pos_array.shape[0])
+    return offsets + np.maximum.accumulate(np.maximum(pos_array - offsets, last_pos + 1))
+
 def szudzik_pairing(folded_minor_allele_counts):
     # adapted from: https://drhagen.com/blog/superior-pairing-function/
     return np.where(
@@ -686,44 +741,143 @@ def harmonic(n):
     return _harmonic(1, n + 1)
 
 
-def chisq(sample_set_idxs, window_samples_set_idxs):
-    if window_samples_set_idxs.size == 0:
+def chisq(sample_set_counts):
+    """sample_set_counts : blocks of each sample set (columns) in each window (rows)"""
+    if sample_set_counts.size == 0:
         return 0.0
-    spacer = np.max(window_samples_set_idxs) + 1
-    window_count = window_samples_set_idxs.shape[0]
-    window_size = window_samples_set_idxs.shape[1]
-    temp_sites = window_samples_set_idxs + (
-        spacer * np.arange(window_count, dtype=np.int64).reshape(window_count, 1)
-    )
-    obs = np.bincount(temp_sites.ravel(), minlength=(window_count * spacer)).reshape(
-        -1, spacer
-    )[:, sample_set_idxs]
-    # print(obs)
-    exp = np.full(obs.shape, window_size / sample_set_idxs.shape[0])
+    obs = sample_set_counts
+    window_size = np.sum(obs, axis=1, keepdims=True)
+    exp = np.broadcast_to(window_size / obs.shape[1], obs.shape)
     return np.sum((((obs - exp) ** 2) / exp), axis=1)  # / sample_sets.shape[0]
 
 
-def mse(sample_set_idxs, window_samples_set_idxs):
-    """measure of eveness"""
-    if window_samples_set_idxs.size == 0:
+def mse(sample_set_counts):
+    """measure of eveness
+    sample_set_counts : blocks of each sample set (columns) in each window (rows)"""
+    if sample_set_counts.size == 0:
         return 0.0
-    spacer = np.max(window_samples_set_idxs) + 1
-    window_count = window_samples_set_idxs.shape[0]
-    window_size = window_samples_set_idxs.shape[1]
-    temp_sites = window_samples_set_idxs + (
-        spacer * np.arange(window_count, dtype=np.int64).reshape(window_count, 1)
-    )
-    obs = np.bincount(temp_sites.ravel(), minlength=(window_count * spacer)).reshape(
-        -1, spacer
-    )[:, sample_set_idxs]
-    exp = np.full(obs.shape, window_size / sample_set_idxs.shape[0])
+    obs = sample_set_counts
+    window_size = np.sum(obs, axis=1, keepdims=True)
+    exp = np.broadcast_to(window_size / obs.shape[1], obs.shape)
     # Gertjan: scale by max
-    max_mse_obs = np.zeros(sample_set_idxs.shape[0])
-    max_mse_obs[0] = window_size
+    max_mse_obs = np.zeros(obs.shape)
+    max_mse_obs[:, 0] = window_size[:, 0]
     max_mse = np.sum(((max_mse_obs - exp) ** 2), axis=1)
     return np.sum((((obs - exp) ** 2)), axis=1) / max_mse
 
 
+def blocks_to_window_index(end_array, window_size, window_step):
+    """Returns order of blocks in windows and bounds of windows in that order, i.e. blocks of
+    window i are order[bounds[i, 0]:bounds[i, 1]]"""
+    # order of blocks is defined by end_array
+    # coordinate_sorted_idx is the order of blocks if one were to sort them by end_array
+    coordinate_sorted_idx = np.argsort(end_array)
+    window_lo = np.arange(coordinate_sorted_idx.shape[0] - window_size + 1)[::window_step]
+    bounds = np.stack([window_lo, window_lo + window_size], axis=1)
+    return (coordinate_sorted_idx, bounds)
+
+
+def blocks_to_bp_window_index(end_array, sequence_length, window_bp, step_bp, min_blocks=1):
+    """Returns order of blocks in windows, bounds of windows in that order (see
+    blocks_to_window_index) and coordinates (starts, ends) of windows of window_bp bases,
+    shifted by step_bp bases along the sequence (the last window is cut at the end of the sequence).
+
+    Blocks belong to the window that contains their end, i.e. windows are ranges of the sorted
+    ends of blocks, found with searchsorted. Windows with fewer than min_blocks blocks are dropped."""
+    coordinate_sorted_idx = np.argsort(end_array)
+    sorted_ends = end_array.take(coordinate_sorted_idx, axis=0)
+    window_starts = np.arange(0, sequence_length, step_bp, dtype=np.int64)
+    window_ends = np.minimum(window_starts + window_bp, sequence_length)
+    # ends of blocks are exclusive, so blocks ending at window start belong to previous window
+    bounds = np.stack(
+        [
+            np.searchsorted(sorted_ends, window_starts, side="right"),
+            np.searchsorted(sorted_ends, window_ends, side="right"),
+        ],
+        axis=1,
+    )
+    valid = (bounds[:, 1] - bounds[:, 0]) >= max(min_blocks, 1)
+    return (coordinate_sorted_idx, bounds[valid], window_starts[valid], window_ends[valid])
+
+
+def window_sums(values, bounds):
+    """Returns sums of values (in order of blocks in windows) in windows, as differences of
+    cumulative sums at bounds of windows"""
+    cumsum = np.zeros((values.shape[0] + 1,) + values.shape[1:], dtype=values.dtype)
+    np.cumsum(values, axis=0, out=cumsum[1:])
+    return cumsum[bounds[:, 1]] - cumsum[bounds[:, 0]]
+
+
+def window_medians(values, bounds):
+    """Returns medians of values (in order of blocks in windows) in windows. Windows are taken from
+    values, padded to the largest window and sorted, i.e. memory is windows x largest window and
+    cost is O(windows x window_size x log(window_size)), not O(blocks) (there is no rolling order
+    statistic). Medians are taken for chunks of windows (see window_index_to_stats)."""
+    window_sizes = bounds[:, 1] - bounds[:, 0]
+    offsets = np.arange(np.max(window_sizes))
+    window_values = np.where(
+        offsets < window_sizes[:, None],
+        values[np.minimum(bounds[:, 0, None] + offsets, values.shape[0] - 1)],
+        np.inf,
+    )
+    window_values.sort(axis=1)
+    rows = np.arange(bounds.shape[0])
+    # median is the mean of the two middle values if window size is even
+    return (window_values[rows, (window_sizes - 1) // 2] + window_values[rows, window_sizes // 2]) / 2
+
+
+def window_index_to_stats(
+    sample_set_idxs,
+    start_array,
+    end_array,
+    block_sample_set_idxs,
+    order,
+    bounds,
+    chunksize=1000,
+):
+    """Returns (starts, ends, pos_mean, pos_median, balance, mse_sample_set_cov) of windows (see
+    blocks_to_window_index) without taking blocks into windows (except for medians, which are
+    taken for chunksize windows at a time, see window_medians).
+
+    Sums of midpoints and counts of sample sets are differences of cumulative sums at bounds of
+    windows (see window_sums and sliding_window_histograms), i.e. O(blocks). Medians are not, they
+    cost O(windows x window_size x log(window_size))."""
+    block_starts = start_array.take(order, axis=0)
+    block_ends = end_array.take(order, axis=0)
+    sample_set_idxs = np.sort(sample_set_idxs)
+    window_sizes = bounds[:, 1] - bounds[:, 0]
+    # minimum of starts of blocks in each window (bounds are interleaved for reduceat)
+    window_starts = np.minimum.reduceat(np.append(block_starts, 0), bounds.ravel())[::2]
+    # blocks are sorted by ends
+    window_ends = block_ends[bounds[:, 1] - 1]
+    # midpoints are (starts + ends) / 2, summed as integers
+    window_pos_mean = window_sums(block_starts + block_ends, bounds) / 2 / window_sizes
+    block_midpoints = (block_starts / 2) + (block_ends / 2)
+    window_pos_median = np.zeros(bounds.shape[0], dtype=np.float64)
+    balance = np.zeros(bounds.shape[0], dtype=np.float64)
+    mse_sample_set_cov = np.zeros(bounds.shape[0], dtype=np.float64)
+    for chunk_start, sample_set_counts in sliding_window_histograms(
+        np.searchsorted(sample_set_idxs, block_sample_set_idxs.take(order, axis=0)),
+        sample_set_idxs.shape[0],
+        bounds,
+        chunksize,
+    ):
+        chunk_end = chunk_start + sample_set_counts.shape[0]
+        balance[chunk_start:chunk_end] = chisq(sample_set_counts)
+        mse_sample_set_cov[chunk_start:chunk_end] = mse(sample_set_counts)
+        window_pos_median[chunk_start:chunk_end] = window_medians(
+            block_midpoints, bounds[chunk_start:chunk_end]
+        )
+    return (
+        window_starts,
+        window_ends,
+        np.rint(window_pos_mean),
+        np.rint(window_pos_median),
+        balance,
+        mse_sample_set_cov,
+    )
+
+
 def blocks_to_windows(
     sample_set_idxs,
     block_variation,
@@ -733,50 +887,45 @@ def blocks_to_windows(
     window_size,
     window_step,
 ):
-    # order of blocks is defined by end_array
-    # coordinate_sorted_idx is the order of blocks if one were to sort them by end_array
-    coordinate_sorted_idx = np.argsort(end_array)
+    coordinate_sorted_idx, bounds = blocks_to_window_index(end_array, window_size, window_step)
     # elements in windows are defined by window_idxs -> shape(n, window_size)
-    window_idxs = np.arange(coordinate_sorted_idx.shape[0] - window_size + 1)[
-        ::window_step, None
-    ] + np.arange(window_size)
-    # window_idxs_alt = np.arange((block_variation.shape[0] - window_size) + 1)[::window_step, None] + np.arange(window_size)
-    # all taking is done with coordinate_sorted_idx and window_idxs
+    window_idxs = bounds[:, 0, None] + np.arange(window_size)
     window_variation = block_variation.take(coordinate_sorted_idx, axis=0).take(
         window_idxs, axis=0
     )
-    block_starts = start_array.take(coordinate_sorted_idx, axis=0).take(
-        window_idxs, axis=0
-    )
-    window_starts = np.min(
-        start_array.take(coordinate_sorted_idx, axis=0).take(window_idxs, axis=0),
-        axis=1,
-    ).T
-    block_ends = end_array.take(coordinate_sorted_idx, axis=0).take(window_idxs, axis=0)
-    window_ends = np.max(
-        end_array.take(coordinate_sorted_idx, axis=0).take(window_idxs, axis=0), axis=1
-    ).T
-    # needs some solution for chisq-calculation by window ...
-    window_samples_set_idxs = block_sample_set_idxs.take(
-        coordinate_sorted_idx, axis=0
-    ).take(window_idxs, axis=0)
-    # np.set_printoptions(threshold=sys.maxsize)
-    balance = chisq(sample_set_idxs, window_samples_set_idxs)
-    mse_sample_set_cov = mse(sample_set_idxs, window_samples_set_idxs)
-    block_midpoints = (block_starts / 2) + (block_ends / 2)
-    window_pos_mean = np.rint(np.mean(block_midpoints, axis=1).T)
-    window_pos_median = np.rint(np.median(block_midpoints, axis=1).T)
-    return (
-        window_variation,
-        window_starts,
-        window_ends,
-        window_pos_mean,
-        window_pos_median,
-        balance,
-        mse_sample_set_cov,
+    return (window_variation,) + window_index_to_stats(
+        sample_set_idxs,
+        start_array,
+        end_array,
+        block_sample_set_idxs,
+        coordinate_sorted_idx,
+        bounds,
     )
 
 
+def sliding_window_histograms(categories, category_count, bounds, chunksize=1000):
+    """Yields (idx of first window, histograms) for chunks of windows, histograms are counts of
+    categories (ints in [0, category_count) of blocks in order of windows) in each window of chunk.
+
+    Histograms are differences of cumulative histograms at bounds of windows (as in window_sums),
+    which are only built at the distinct bounds of a chunk: blocks between consecutive bounds are
+    counted once by bincount, i.e. cost is O(blocks + windows x category_count) for windows that
+    overlap by less than a chunk."""
+    for chunk_start in range(0, bounds.shape[0], chunksize):
+        chunk_bounds = bounds[chunk_start : chunk_start + chunksize]
+        points, point_idxs = np.unique(chunk_bounds, return_inverse=True)
+        point_idxs = point_idxs.reshape(chunk_bounds.shape)  # shape of inverse differs between numpy versions
+        # blocks between consecutive bounds
+        segments = np.repeat(np.arange(points.shape[0] - 1), np.diff(points))
+        segment_histograms = np.bincount(
+            segments * category_count + categories[points[0] : points[-1]],
+            minlength=(points.shape[0] - 1) * category_count,
+        ).reshape(-1, category_count)
+        cumulative = np.zeros((points.shape[0], category_count), dtype=np.int64)
+        np.cumsum(segment_histograms, axis=0, out=cumulative[1:])
+        yield (chunk_start, cumulative[point_idxs[:, 1]] - cumulative[point_idxs[:, 0]])
+
+
 def block_sites_to_variation_arrays(
     block_sites, cols=np.array([1, 2, 3]), max_type_count=7
 ):
@@ -852,115 +1001,320 @@ def gt2fmac(genotype_array):
     return folded_minor_allele_counts
 
 
-def intervals_to_sites(intervals):
-    """starts = np.array([0, 5, 8, 11, 15])
-       ends   = np.array([2, 8, 9, 13, 18])
-    clens : array([2, 5, 6, 8, 11])
-    _sites: array([1, 1, 1, 1, 1, 1,  1, 1, 1, 1, 1])
-    _sites: array([0, 1, 1, 1, 1, 1,  1, 1, 1, 1, 1])
-    _sites: array([1, 1, 4, 1, 1, 1,  3, 1, 3, 1, 1])
-    sites : array([0, 1, 5, 6, 7, 8, 11,12,15,16,17])"""
-    starts, ends = intervals
-    if starts is None or ends is None:
-        return None
-    clens = np.cumsum(ends - starts)
-    if np.any(clens):
-        sites = np.ones(clens[-1], dtype=np.int64)
-        sites[0] = starts[0]
-        sites[clens[:-1]] = starts[1:] - ends[:-1] + 1
-        sites = sites.cumsum()
-        return sites
-    return None
-
+def get_biallelic_mutypes_lut():
+    """Returns lookup table of mutype codes of diploid biallelic sites, indexed by 4 * state_A + state_B, 
+    with state := count of allele 1 in genotype (0, 1, 2) or 3 if genotype is missing. 
+    Table is derived from szudzik_pairing(gt2fmac(...)) + 2 of the representative genotypes."""
+    genotype_by_state = np.array([[0, 0], [0, 1], [1, 1], [-1, -1]], dtype=np.int8)
+    return np.array(
+        [
+            szudzik_pairing(
+                gt2fmac(np.array([[genotype_by_state[state_A], genotype_by_state[state_B]]]))
+            )[0]
+            + 2
+            for state_A, state_B in itertools.product(range(4), repeat=2)
+        ],
+        dtype=np.int8,
+    )
 
-def sites_to_blocks(sites, block_length, block_span, sample_set, debug=False):
-    # block_sites are 0-based, but they are SITES (numbering the bases) as opposed to coordinates (numbering between the bases)
-    # 0 1 2 3 4 5 6 BED
-    # A T G C A G
-    # 1 2 3 4 5 6  VCF
-    # 0 1 2 3 4 5  Scikit allel, sites
-    if sites is None:
-        return None
-    max_gap = block_span - block_length
-    if max_gap == 0:  # no gaps within blocks
-        block_sites = sites[: block_length * (sites.shape[0] // block_length)].reshape(
-            -1, block_length
-        )
-    else:  # gaps within blocks are allowed
-        block_sites = np.concatenate(
-            [
-                x[: block_length * (x.shape[0] // block_length)].reshape(
-                    -1, block_length
-                )
-                for x in np.split(sites, np.where(np.diff(sites) > max_gap)[0] + 1)
+def gt_matrix_to_mutypes(gt_matrix, sample_idx_pairs):
+    """Returns mutype codes of shape (sites, pairs) for pairs of sample indices (A, B) of gt_matrix (sites, samples, 2).
+    Codes equal szudzik_pairing(gt2fmac(gt_matrix[:, pair])) + 2 (as bincounted in block_coordinates_to_arrays):
+        0 = multiallelic, 1 = missing, 2 = monomorphic, 3 = hetB, 4 = hetA, 5 = hetAB, 6 = fixed
+    Biallelic sites (alleles 0/1) are classified by lookup of the genotype states of each pair 
+    in BIALLELIC_MUTYPES_LUT. All other sites are classified once for all pairs: the four alleles 
+    of each pair are reduced to their low/high allele (> 2 distinct alleles => multiallelic, 
+    any allele < 0 => missing), the minor allele is the less frequent one (ties: major allele 
+    is the lower allele of sample A) and the minor allele counts of both samples are paired."""
+    sample_idx_pairs = np.array(sample_idx_pairs, dtype=np.int64).reshape(-1, 2)
+    gt_matrix = np.asarray(gt_matrix)
+    mutypes = np.zeros((gt_matrix.shape[0], sample_idx_pairs.shape[0]), dtype=np.int8)
+    chunk_length = max(1, 2 ** 22 // max(1, sample_idx_pairs.shape[0]))
+    for chunk_start in range(0, gt_matrix.shape[0], chunk_length):
+        gts = gt_matrix[chunk_start : chunk_start + chunk_length].astype(np.int32)
+        chunk_mutypes = np.zeros((gts.shape[0], sample_idx_pairs.shape[0]), dtype=np.int8)
+        biallelic = np.all(gts <= 1, axis=(1, 2))
+        if np.any(biallelic):
+            # fast path: genotype state per sample, mutype per pair by table lookup
+            gts_biallelic = gts[biallelic]
+            states = np.where(
+                np.any(gts_biallelic < 0, axis=2), 3, np.sum(gts_biallelic, axis=2)
+            )
+            chunk_mutypes[biallelic] = BIALLELIC_MUTYPES_LUT[
+                4 * states[:, sample_idx_pairs[:, 0]] + states[:, sample_idx_pairs[:, 1]]
             ]
+        if not np.all(biallelic):
+            chunk_mutypes[~biallelic] = gts_to_mutypes(gts[~biallelic], sample_idx_pairs)
+        mutypes[chunk_start : chunk_start + chunk_length] = chunk_mutypes
+    return mutypes
+
+def gts_to_mutypes(gts, sample_idx_pairs):
+    """General path of gt_matrix_to_mutypes(), for sites with any number of alleles"""
+    gts_A, gts_B = gts[:, sample_idx_pairs[:, 0], :], gts[:, sample_idx_pairs[:, 1], :]
+    alleles = np.sort(np.concatenate([gts_A, gts_B], axis=2), axis=2)  # (sites, pairs, 4)
+    missing = alleles[..., 0] < 0
+    # count of distinct alleles (missing does not count as allele)
+    is_distinct = np.ones(alleles.shape, dtype=bool)
+    is_distinct[..., 1:] = alleles[..., 1:] != alleles[..., :-1]
+    multiallelic = np.sum(is_distinct & (alleles >= 0), axis=2) > 2
+    allele_lo, allele_hi = alleles[..., 0], alleles[..., 3]
+    count_hi = np.sum(alleles == allele_hi[..., np.newaxis], axis=2)
+    minor_is_hi = (count_hi < (4 - count_hi)) | (
+        (count_hi == 2) & (np.min(gts_A, axis=2) == allele_lo)
+    )
+    allele_minor = np.where(minor_is_hi, allele_hi, allele_lo)[..., np.newaxis]
+    monomorphic = allele_lo == allele_hi
+    minor_A = np.where(monomorphic, 0, np.sum(gts_A == allele_minor, axis=2))
+    minor_B = np.where(monomorphic, 0, np.sum(gts_B == allele_minor, axis=2))
+    mutypes = (
+        np.where(
+            minor_A >= minor_B,
+            np.square(minor_A) + minor_A + minor_B,
+            np.square(minor_B) + minor_A,
         )
-    ## no splitting
-    # block_sites = sites[:block_length * (sites.shape[0] // block_length)].reshape(-1, block_length)
-    ## yes splitting
-    # block_sites = np.concatenate([
-    #    x[:block_length * (x.shape[0] // block_length)].reshape(-1, block_length)
-    #        for x in np.split(sites, np.where(np.diff(sites) > max_gap)[0] + 1)])
-    block_sites_valid_mask = (
-        (block_sites[:, -1] - block_sites[:, 0] + 1)
-    ) <= block_span  # +1 is needed because block sites are sites (not coordinates)
-    if debug:
-        print("[+] sample_set", sample_set)
-        print("[+] sites", sites)
-        success = (
-            (block_sites[block_sites_valid_mask].shape[0] * block_length)
-            / sites.shape[0]
-            if np.count_nonzero(block_sites[block_sites_valid_mask])
-            else 0
+        + 2
+    )
+    mutypes[missing] = 1
+    mutypes[multiallelic] = 0  # multiallelics take precedence over missing
+    return mutypes
+
+BIALLELIC_MUTYPES_LUT = get_biallelic_mutypes_lut()
+
+def pos_in_intervals(pos_array, intervals):
+    """Returns boolean mask of positions that lie within (sorted, non-overlapping) BED intervals.
+    Equivalent to np.isin() of positions and all sites of intervals, without expanding intervals to sites.
+       starts = np.array([0, 5, 8])
+       ends   = np.array([2, 8, 9])
+       pos    = np.array([1, 2, 5, 8, 9])
+    mask    : array([True, False, True, True, False])"""
+    starts, ends = intervals
+    interval_idxs = np.searchsorted(ends, pos_array, side="right")
+    in_range = interval_idxs < ends.shape[0]
+    mask = np.zeros(pos_array.shape[0], dtype=bool)
+    mask[in_range] = starts[interval_idxs[in_range]] <= pos_array[in_range]
+    return mask
+
+
+def sorted_join(query, reference):
+    """Joins coordinates in query against sorted, unique coordinates in reference (merge via searchsorted).
+    Returns boolean mask of query values found in reference and the index in reference of each of those (in query order).
+    query_mask is equivalent to np.isin(query, reference), reference[reference_idxs] to query[query_mask].
+       query     = np.array([7, 1, 4, 9])
+       reference = np.array([1, 2, 4, 7])
+    query_mask     : array([True, True, True, False])
+    reference_idxs : array([3, 0, 2])"""
+    idxs = np.searchsorted(reference, query, side="left")
+    in_range = idxs < reference.shape[0]
+    query_mask = np.zeros(query.shape[0], dtype=bool)
+    query_mask[in_range] = reference[idxs[in_range]] == query[in_range]
+    return query_mask, idxs[query_mask]
+
+
+def get_interval_mask(interval_matrix, intervals_idx_by_sample, sample_set, packed=False):
+    """Returns boolean mask of intervals in which all samples of sample_set are callable"""
+    try:
+        sample_set_key = np.array(
+            [intervals_idx_by_sample[sample] for sample in sample_set]
         )
-        print("[+] blocks", block_sites[block_sites_valid_mask])
-        print("[+] block_sites_valid_mask", block_sites_valid_mask)
-        print("[+] block_sites_valid", (block_sites[:, -1] - block_sites[:, 0] + 1))
-        print(
-            "[+] sites=%s : blocks=%s success=%.2f"
-            % (sites.shape[0], block_sites[block_sites_valid_mask].shape[0], success)
+    except KeyError:
+        sys.exit(
+            "_get_interval_coordinates: sample_set %s not found in store. Existing samples: %s"
+            % (sample_set, list(intervals_idx_by_sample.keys()))
         )
-    if np.any(block_sites_valid_mask):
-        return block_sites[block_sites_valid_mask]
-    return None
+    if packed:
+        return get_packed_sample_mask(interval_matrix, sample_set_key)
+    return np.all(interval_matrix[:, sample_set_key], axis=1)
+
+def get_working_set_intervals(working_set, sample_set):
+    """Returns BED starts/ends of sample_set from working set of a sequence (see Store._get_sequence_working_set)"""
+    if working_set["interval_matrix"] is None:
+        return (None, None)
+    mask = get_interval_mask(
+        working_set["interval_matrix"],
+        working_set["intervals_idx_by_sample"],
+        sample_set,
+        packed=working_set["intervals_packed"],
+    )
+    return (working_set["interval_starts"][mask], working_set["interval_ends"][mask])
 
+def get_blocks_key(blocks_label=None):
+    """Returns key of blocks dataset with label (None => default dataset 'blocks')"""
+    return "blocks" if blocks_label is None else "blocks_%s" % blocks_label
 
-def subset_gt_matrix(meta_seqs, sample_set, indices, gt_matrix):
-    if gt_matrix is not None:
-        sample_set_vcf_idxs = np.array(
-            [meta_seqs["variants_idx_by_sample"][sample] for sample in sample_set]
-        )
-        return gt_matrix.subset(indices, sample_set_vcf_idxs)
-    return None
+def get_blocks_checkpoint(config):
+    """Returns parameters of blocks config which have to match for an interrupted run to be resumed
+    (JSON-compatible, as saved in meta of blocks dataset)"""
+    return {
+        "length": config["block_length"],
+        "span": config["block_span"],
+        "max_missing": config["block_max_missing"],
+        "max_multiallelic": config["block_max_multiallelic"],
+        "layout": config["layout"],
+        "sample_sets": list(config["sample_sets"]),
+        "filter_deferred": config["defer_filter"],
+        "sample_set_idxs": [str(idx) for idx in config["sample_set_idxs"]],
+    }
 
+def format_blocks_parameters(meta):
+    """Returns parameters of blocks dataset as options of 'gimble blocks' (meta or checkpoint of blocks dataset)"""
+    return "-l %s -m %s -u %s -i %s%s%s" % (
+        meta["length"],
+        meta["span"],
+        meta["max_multiallelic"],
+        meta["max_missing"],
+        " -d" if meta.get("filter_deferred", False) else "",
+        (
+            " -n %s -e %s%s"
+            % (
+                meta["max_pairs"],
+                meta["seed"],
+                " -r" if meta["stratified"] else "",
+            )
+            if "max_pairs" in meta
+            else ""
+        ),
+    )
 
-def blocks_to_arrays(blocks, gts, pos):
-    starts = np.array(blocks[:, 0], dtype=np.int64)
-    ends = np.array(blocks[:, -1] + 1, dtype=np.int64)  # BED: end+1
-    pos_in_block_sites = np.isin(pos, blocks, assume_unique=True)
-    if np.any(pos_in_block_sites):  # if variants in blocks
-        folded_minor_allele_counts = gt2fmac(gts)
-        block_sites_in_pos = np.isin(blocks, pos, assume_unique=True)
-        blocks[block_sites_in_pos] = (
-            szudzik_pairing(folded_minor_allele_counts) + 2
-        )  # add 2 so that not negative for bincount
-        blocks[
-            ~block_sites_in_pos
-        ] = 2  # monomorphic = 2 (0 = multiallelic, 1 = missing)
-        temp_sites = blocks + (
-            7 * np.arange(blocks.shape[0], dtype=np.int64).reshape(blocks.shape[0], 1)
+def filter_blocks(starts, ends, multiallelic, missing, variation, block_max_missing, block_max_multiallelic):
+    """Returns dict of arrays of valid blocks (by BLOCKS_FIELDS), count of blocks and count of valid blocks"""
+    valid = (
+        np.less_equal(missing, block_max_missing)
+        & np.less_equal(multiallelic, block_max_multiallelic)
+    ).flatten()
+    blocks = {
+        "starts": starts[valid],
+        "ends": ends[valid],
+        "variation": variation[valid],
+        "missing": missing[valid],
+        "multiallelic": multiallelic[valid],
+    }
+    return (blocks, valid.shape[0], int(np.count_nonzero(valid)))
+
+def select_sample_set_idxs(sample_sets, sample_set_idxs, max_pairs, seed, stratified=False):
+    """Returns sorted selection of at most max_pairs of sample_set_idxs (all if max_pairs is None).
+    Selection is random (reproducible based on seed). If stratified, pairs are picked greedily
+    (in random order) so that every sample is part of about the same number of selected pairs.
+    sample_sets : list of sample sets (pairs of samples), indexed by sample_set_idxs"""
+    sample_set_idxs = np.array(sample_set_idxs, dtype=np.int64)
+    if max_pairs is None or sample_set_idxs.shape[0] <= max_pairs:
+        return sorted(int(idx) for idx in sample_set_idxs)
+    rng = np.random.default_rng(seed)
+    if not stratified:
+        return sorted(int(idx) for idx in rng.choice(sample_set_idxs, max_pairs, replace=False))
+    candidate_idxs = rng.permutation(sample_set_idxs)
+    samples = sorted(set(sample for idx in candidate_idxs for sample in sample_sets[idx]))
+    sample_idx_by_sample = {sample: sample_idx for sample_idx, sample in enumerate(samples)}
+    pairs = np.array(
+        [[sample_idx_by_sample[sample] for sample in sample_sets[idx]] for idx in candidate_idxs]
+    )
+    pair_counts = np.zeros(len(samples), dtype=np.int64)
+    available = np.ones(candidate_idxs.shape[0], dtype=bool)
+    selected_idxs = []
+    for _ in range(max_pairs):
+        counts = pair_counts[pairs]
+        # pair whose samples are part of fewest selected pairs (first in random order if tied)
+        score = np.where(
+            available, np.max(counts, axis=1) * 2 * max_pairs + np.sum(counts, axis=1), np.iinfo(np.int64).max
         )
+        pick = np.argmin(score)
+        available[pick] = False
+        pair_counts[pairs[pick]] += 1
+        selected_idxs.append(int(candidate_idxs[pick]))
+    return sorted(selected_idxs)
+
+def intervals_to_blocks(intervals, block_length, block_span):
+    """Returns BED starts/ends of valid blocks (or None), computed from BED intervals without
+    expanding them to sites. Blocks are identical to those of splitting the array of all sites of intervals
+    (see tests/legacy_blocks.py).
+    
+    Sites are numbered by their index along the concatenated intervals (cumulative lengths).
+    Runs of sites are split between intervals separated by more than max_gap (if max_gap > 0),
+    each run is cut into blocks of block_length sites (remainder is discarded) and blocks
+    spanning more than block_span bases are dropped.
+       starts = np.array([0, 5, 8, 11, 15]), ends = np.array([2, 8, 9, 13, 18]), block_length=3, block_span=4
+    runs        : [0, 6) [6, 11) (site indices, gap between 8 and 11 is > max_gap)
+    block sites : [0, 3) [3, 6) [6, 9)  
+    positions   : [0, 5] [6, 8] [11, 15]
+    valid       : [False, True, False] => (array([6]), array([9]))"""
+    starts, ends = intervals
+    if starts is None or ends is None or not starts.shape[0]:
+        return None
+    lengths = ends - starts
+    clens = np.cumsum(lengths)
+    if not clens[-1]:
+        return None
+    max_gap = block_span - block_length
+    # site index at which each run starts
+    if max_gap == 0:  # no gaps within blocks
+        run_starts = np.array([0], dtype=np.int64)
+    else:  # gaps within blocks are allowed, split between intervals
+        split_idxs = np.where((starts[1:] - ends[:-1] + 1) > max_gap)[0]
+        run_starts = np.concatenate([[0], clens[split_idxs]])
+    run_lengths = np.diff(np.append(run_starts, clens[-1]))
+    run_block_counts = run_lengths // block_length
+    if not np.any(run_block_counts):
+        return None
+    # first/last site index of each block
+    block_run_idxs = np.repeat(np.arange(run_starts.shape[0]), run_block_counts)
+    block_run_offsets = np.arange(block_run_idxs.shape[0]) - np.repeat(
+        np.cumsum(run_block_counts) - run_block_counts, run_block_counts
+    )
+    first_sites = run_starts[block_run_idxs] + block_run_offsets * block_length
+    last_sites = first_sites + block_length - 1
+    # site index => position
+    first_interval_idxs = np.searchsorted(clens, first_sites, side="right")
+    last_interval_idxs = np.searchsorted(clens, last_sites, side="right")
+    block_starts = starts[first_interval_idxs] + (
+        first_sites - (clens - lengths)[first_interval_idxs]
+    )
+    block_lasts = starts[last_interval_idxs] + (
+        last_sites - (clens - lengths)[last_interval_idxs]
+    )
+    # +1 is needed because block sites are sites (not coordinates)
+    block_valid_mask = (block_lasts - block_starts + 1) <= block_span
+    if np.any(block_valid_mask):
+        return (
+            block_starts[block_valid_mask],
+            block_lasts[block_valid_mask] + 1,  # BED: end+1
+        )
+    return None
+
+def pos_to_block_idxs(pos_array, intervals, block_starts, block_ends):
+    """Returns index of block in which each position lies (-1 if not a site of a block).
+    Sites of blocks are positions within BED intervals between BED start/end of the block."""
+    if pos_array is None:
+        return np.zeros(0, dtype=np.int64)
+    block_idxs = np.searchsorted(block_starts, pos_array, side="right") - 1
+    in_block = (block_idxs >= 0)
+    in_block[in_block] = pos_array[in_block] < block_ends[block_idxs[in_block]]
+    in_block &= pos_in_intervals(pos_array, intervals)
+    block_idxs[~in_block] = -1
+    return block_idxs
+
+def block_coordinates_to_arrays(block_starts, block_ends, block_length, mutypes, block_idxs):
+    """Returns (starts, ends, multiallelic, missing, monomorphic, variation) arrays of blocks.
+    mutypes : mutype codes of variants in blocks (see gt_matrix_to_mutypes)
+    block_idxs : block index of each of those variants"""
+    block_count = block_starts.shape[0]
+    starts = np.array(block_starts, dtype=np.int64)
+    ends = np.array(block_ends, dtype=np.int64)
+    if block_idxs.shape[0]:  # if variants in blocks
         multiallelic, missing, monomorphic, variation = np.hsplit(
-            np.bincount(temp_sites.ravel(), minlength=(blocks.shape[0] * 7)).reshape(
-                -1, 7
-            ),
+            np.bincount(
+                (mutypes.astype(np.int64) + 7 * block_idxs).ravel(),
+                minlength=(block_count * 7),
+            ).reshape(-1, 7),
             np.array([1, 2, 3]),
         )
+        # sites without variants are monomorphic = 2 (0 = multiallelic, 1 = missing)
+        monomorphic += block_length - np.bincount(
+            block_idxs, minlength=block_count
+        ).reshape(-1, 1)
     else:
-        multiallelic = np.zeros((blocks.shape[0], 1), dtype=np.int64)
-        missing = np.zeros((blocks.shape[0], 1), dtype=np.int64)
-        monomorphic = np.full((blocks.shape[0], 1), blocks.shape[1], dtype=np.int64)
-        variation = np.zeros((blocks.shape[0], 4), dtype=np.int64)
+        multiallelic = np.zeros((block_count, 1), dtype=np.int64)
+        missing = np.zeros((block_count, 1), dtype=np.int64)
+        monomorphic = np.full((block_count, 1), block_length, dtype=np.int64)
+        variation = np.zeros((block_count, 4), dtype=np.int64)
     return (starts, ends, multiallelic, missing, monomorphic, variation)
 
 def tally_to_bsfs(tally, max_k, data="blocks"):
@@ -1001,10 +1355,7 @@ def tally_variation(variation, form="bsfs", max_k=None):
           ndim (4 or 5) if form == 'bsfs'
           ndim (2 or 3) if form == 'tally'
     """
-    if max_k is None:
-        max_k = np.array([8, 8, 8, 8]) if form == "bsfs" else None
-    else:
-        max_k = max_k + 1  # for clipping
+    max_k = get_tally_clip(form, max_k)
     if variation.ndim == 2:
         mutuples = np.clip(variation, 0, max_k)
     elif variation.ndim == 3:
@@ -1021,28 +1372,26 @@ def tally_variation(variation, form="bsfs", max_k=None):
             % variation.ndim
         )
     try:
-        #print("mutuples", mutuples)
-        mutuples_unique, counts = np.unique(mutuples, return_counts=True, axis=0)
-        #print("mutuples_unique", mutuples_unique.shape)
-        #print("counts", counts.shape)
-        #print("form", form)
-        #print("variation", variation.shape, variation)
-        dtype = _return_np_type(counts)
-        if form == "bsfs":
-            out = np.zeros(tuple(max_k + 1), dtype) if variation.ndim == 2 else np.zeros(tuple([variation.shape[0]]) + tuple(max_k + 1), dtype)
-            #print("out", out.shape)
-            out[tuple(mutuples_unique.T)] = counts
-        elif form == "tally":
-            out = np.concatenate(
-                (counts.reshape(counts.shape[0], 1), mutuples_unique), axis=1
-            )
-            if variation.ndim == 3:
-                out[:, [0, 1]] = out[
-                    :, [1, 0]
-                ]  # for window variation, order must be [idx, count, mutuple]
-            out = out.astype(dtype)
+        window_count = variation.shape[0] if variation.ndim == 3 else None
+        radix = (
+            None
+            if max_k is None
+            else (tuple(max_k + 1) if window_count is None else (window_count,) + tuple(max_k + 1))
+        )
+        # dense bsfs is counted directly from codes of mutuples (see get_mutuple_codes)
+        codes = get_mutuple_codes(mutuples, radix) if form == "bsfs" else None
+        if codes is not None:
+            counts = np.bincount(codes, minlength=int(np.prod(radix)))
+            out = counts.reshape(radix).astype(_return_np_type(counts))
         else:
-            raise ValueError("form must be %r or %r, was %r" % ("bsfs", "tally", form))
+            mutuples_unique, counts = unique_mutuples(mutuples, radix=radix)
+            out = mutuples_to_tally(
+                mutuples_unique,
+                counts,
+                form=form,
+                max_k=max_k,
+                window_count=window_count,
+            )
     except MemoryError as e:
         sys.exit(
             "[X] tally_variation() ran out of memory. Try specifying lower k-max values. %s."
@@ -1050,6 +1399,87 @@ def tally_variation(variation, form="bsfs", max_k=None):
         )
     return out
 
+def get_mutuple_codes(mutuples, radix):
+    """Returns codes of rows of mutuples (ints, 0 <= mutuples[:, i] < radix[i]) as integers in
+    mixed radix, or None if codes would not fit into int64. Order of codes is that of rows."""
+    if np.prod([int(base) for base in radix], dtype=object) > np.iinfo(np.int64).max:
+        return None
+    return np.ravel_multi_index(tuple(np.asarray(mutuples, dtype=np.int64).T), tuple(int(base) for base in radix))
+
+def unique_mutuples(mutuples, radix=None, return_inverse=False):
+    """Returns (mutuples_unique, counts) or (mutuples_unique, counts, inverse) of rows of mutuples
+    (as np.unique(mutuples, axis=0)). Rows are counted by their codes in mixed radix (see
+    get_mutuple_codes): with np.bincount if the radix is small (i.e. for clipped mutuples), otherwise
+    (radix defaults to max + 1 of columns, i.e. unclipped mutuples) as a sparse map of codes to counts."""
+    if mutuples.shape[0] == 0 or mutuples.shape[1] == 0:
+        return np.unique(mutuples, return_counts=True, return_inverse=return_inverse, axis=0)
+    if radix is None:
+        radix = np.max(mutuples, axis=0).astype(np.int64) + 1
+    codes = get_mutuple_codes(mutuples, radix)
+    if codes is None:
+        return np.unique(mutuples, return_counts=True, return_inverse=return_inverse, axis=0)
+    space = int(np.prod([int(base) for base in radix], dtype=object))
+    if space <= max(2 * codes.shape[0], TALLY_DENSE_CODES):
+        counts = np.bincount(codes, minlength=space)
+        codes_unique = np.flatnonzero(counts)
+        counts = counts[codes_unique]
+        if return_inverse:
+            rank = np.zeros(space, dtype=np.int64)
+            rank[codes_unique] = np.arange(codes_unique.shape[0])
+            inverse = rank[codes]
+    elif return_inverse:
+        codes_unique, inverse, counts = np.unique(codes, return_inverse=True, return_counts=True)
+    else:
+        codes_unique, counts = np.unique(codes, return_counts=True)
+    mutuples_unique = np.stack(
+        np.unravel_index(codes_unique, tuple(int(base) for base in radix)), axis=-1
+    ).astype(mutuples.dtype)
+    if return_inverse:
+        return (mutuples_unique, inverse, counts)
+    return (mutuples_unique, counts)
+
+def get_tally_clip(form="bsfs", max_k=None):
+    """Returns values at which mutuples are clipped in tally (see tally_variation)"""
+    if max_k is None:
+        return np.array([8, 8, 8, 8]) if form == "bsfs" else None
+    return max_k + 1  # for clipping
+
+def clip_bsfs(bsfs, max_k):
+    """Returns bsfs (of blocks or windows, mutation types are last axes) clipped at max_k (values at
+    which mutuples are clipped, see get_tally_clip), i.e. counts beyond max_k are summed into marginals.
+    bsfs has to be clipped at max_k or beyond."""
+    out = np.asarray(bsfs, dtype=np.int64)
+    for axis, clip in zip(range(-len(max_k), 0), max_k):
+        out = np.concatenate(
+            [
+                np.take(out, np.arange(clip), axis=axis),
+                np.sum(np.take(out, np.arange(clip, out.shape[axis]), axis=axis), axis=axis, keepdims=True),
+            ],
+            axis=axis,
+        )
+    return out.astype(_return_np_type(out))
+
+def mutuples_to_tally(mutuples_unique, counts, form="bsfs", max_k=None, window_count=None):
+    """Returns tally (see tally_variation) of unique (clipped) mutuples and their counts.
+    Rows of mutuples_unique are [window_idx, mutuple] if window_count is not None.
+    max_k : clipping values (i.e. kmax + 1), only needed for form 'bsfs'"""
+    dtype = _return_np_type(counts)
+    if form == "bsfs":
+        out = np.zeros(tuple(max_k + 1), dtype) if window_count is None else np.zeros(tuple([window_count]) + tuple(max_k + 1), dtype)
+        out[tuple(mutuples_unique.T)] = counts
+    elif form == "tally":
+        out = np.concatenate(
+            (counts.reshape(counts.shape[0], 1), mutuples_unique), axis=1
+        )
+        if window_count is not None:
+            out[:, [0, 1]] = out[
+                :, [1, 0]
+            ]  # for window variation, order must be [idx, count, mutuple]
+        out = out.astype(dtype)
+    else:
+        raise ValueError("form must be %r or %r, was %r" % ("bsfs", "tally", form))
+    return out
+
 def calculate_marginality_of_variation(data, max_k=None):
     """to be run on variation arrays of ndim = 2 or 3"""
     assert data.shape[-1] == 4 and (
@@ -1094,13 +1524,45 @@ def gridsearch_dask(tally=None, grid=None, num_cores=1, chunksize=500, desc=None
             #print(np.sum(out))
             return out
           
+class GimbleDirectoryStore(zarr.storage.DirectoryStore):
+    """DirectoryStore of writable Gimble stores. Consolidated metadata ('.zmetadata') is stale once the 
+    store is modified: it is deleted before the first modification (unless invalidate is False, i.e. in 
+    pool workers, whose parent process has modified the store) and rewritten by Store.consolidate_metadata()"""
+    def __init__(self, path, invalidate=True):
+        super().__init__(path)
+        self.invalidate = invalidate
+        self.modified = False
+
+    def _modify(self, key=None):
+        if key == ".zmetadata":
+            return
+        if not self.modified and self.invalidate and ".zmetadata" in self:
+            super().__delitem__(".zmetadata")
+        self.modified = True
+
+    def __setitem__(self, key, value):
+        self._modify(key)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._modify(key)
+        super().__delitem__(key)
+
+    def rmdir(self, path=None):
+        self._modify()
+        super().rmdir(path)
+
 class Store(object):
-    def __init__(self, prefix=None, path=None, create=False, overwrite=False):
+    def __init__(self, prefix=None, path=None, create=False, overwrite=False, read_only=False, worker=False):
         self.prefix = (
             prefix if not prefix is None else str(pathlib.Path(path).resolve().stem)
         )
         self.path = path if not path is None else "%s.z" % prefix
+        self.read_only = read_only
+        self.worker = worker  # store is opened by pool worker (see GimbleDirectoryStore)
         self.data = self._init_store(create, overwrite)
+        # metadata by key: live (cached) zarr attrs, or dict snapshots if read_only
+        self._meta_cache = {}
 
     def tree(self):
         print(self.data.tree())
@@ -1135,12 +1597,14 @@ class Store(object):
             "optimize": "optimize",
             "gridsearch": "gridsearch",
         }
+        # labelled blocks datasets (see get_blocks_key) are listed as blocks
+        blocks_keys = set(self._get_blocks_keys())
         def data_key_finder(path):
             key_list = str(path).split("/")
-            module = key_list[0]
+            module = "blocks" if key_list[0] in blocks_keys else key_list[0]
             if len(key_list) == max_depth_by_key.get(module, None):
                 available_keys_by_category[category_by_module[module]].add(
-                    "/".join(key_list[0 : max_depth_by_key.get(key_list[0], 0)])
+                    "/".join(key_list[0 : max_depth_by_key.get(module, 0)])
                 )
         self.data.visit(data_key_finder)
         if available_keys_by_category:
@@ -1150,7 +1614,9 @@ class Store(object):
             else:
                 for category, available_keys in available_keys_by_category.items():
                     if category == "tally":
-                        available_keys = [key for key in available_keys if key not in set(['tally/blocks_raw', 'tally/windows_raw'])]
+                        raw_tally_keys = set(['tally/blocks_raw', 'tally/windows_raw']) | set(
+                            self._get_meta(blocks_key).get("blocks_raw_tally_key") for blocks_key in self._get_blocks_keys())
+                        available_keys = [key for key in available_keys if key not in raw_tally_keys]
                     print("[#] %s" % category)
                     print("\t- %s" % "\n\t- ".join(sorted(available_keys)))
         else:
@@ -1164,7 +1630,7 @@ class Store(object):
         print("[X] Label %r not found in store. Available labels:" % str(key))
         self.list_keys(key)
 
-    def measure(self, genome_f=None, sample_f=None, bed_f=None, vcf_f=None):
+    def measure(self, genome_f=None, sample_f=None, bed_f=None, vcf_f=None, chunk_length=None, processes=1):
         measure_key = "seqs/"
         self._set_meta(measure_key)
         print("[#] Processing GENOME_FILE %r." % genome_f)
@@ -1172,9 +1638,12 @@ class Store(object):
         print("[#] Processing SAMPLE_FILE %r." % sample_f)
         self._read_samples(measure_key, sample_f)
         print("[#] Processing BED_FILE %r." % bed_f)
-        self._read_intervals(measure_key, bed_f)
+        self._read_intervals(measure_key, bed_f, processes=processes)
         print("[#] Processing VCF_FILE %r." % vcf_f)
-        self._read_variants(measure_key, vcf_f)
+        if chunk_length:
+            self._read_variants_streaming(measure_key, vcf_f, chunk_length)
+        else:
+            self._read_variants(measure_key, vcf_f, processes=processes)
         # print(self.data.tree())
 
     def _read_sequences(self, measure_key, genome_f):
@@ -1266,21 +1735,132 @@ class Store(object):
         # longest_sample_string = max([len(", ".join(sample_set)) for sample_set in meta['sample_sets']]) + 2
         # meta['spacing'] = longest_sample_string if longest_sample_string > meta['spacing'] else meta['spacing']
 
-    def _read_variants(self, measure_key, vcf_f):
+    def _get_query_samples(self, vcf_f, samples):
+        samples_gt_order = allel.read_vcf(vcf_f, fields=["samples"])["samples"]
+        query_samples = ordered_intersect(a=samples_gt_order, b=samples, order="a")
+        # Check if all samples were found
+        if set(query_samples) != set(samples):
+            sys.exit(
+                "[X] The following samples in SAMPLE_FILE were not found in VCF_FILE: %s"
+                % (", ".join(list(set(samples).difference(set(query_samples)))))
+            )
+        return query_samples
+
+    def _read_variants(self, measure_key, vcf_f, processes=1):
         meta = self._get_meta(measure_key)
         seq_names = meta["seq_names"]
         samples = meta["samples"]
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
-            gt_key, pos_key, sample_key = "calldata/GT", "variants/POS", "samples"
-            samples_gt_order = allel.read_vcf(vcf_f, fields=[sample_key])[sample_key]
-            query_samples = ordered_intersect(a=samples_gt_order, b=samples, order="a")
-            # Check if all samples were found
-            if set(query_samples) != set(samples):
-                sys.exit(
-                    "[X] The following samples in SAMPLE_FILE were not found in VCF_FILE: %s"
-                    % (", ".join(list(set(samples).difference(set(query_samples)))))
-                )
+            query_samples = self._get_query_samples(vcf_f, samples)
+        # Set up counts arrays
+        count_shape = (len(meta["seq_names"]), len(query_samples))
+        count_records = np.zeros(count_shape[0], dtype=np.int64)
+        count_called = np.zeros(count_shape, dtype=np.int64)
+        count_hom_ref = np.zeros(count_shape, dtype=np.int64)
+        count_hom_alt = np.zeros(count_shape, dtype=np.int64)
+        count_het = np.zeros(count_shape, dtype=np.int64)
+        count_missing = np.zeros(count_shape, dtype=np.int64)
+        read_variants_jobs = [
+            (self.path, vcf_f, idx, seq_name, query_samples)
+            for idx, seq_name in enumerate(seq_names)
+        ]
+        with tqdm(
+            total=len(seq_names), desc="[%] Reading variants", ncols=100
+        ) as pbar:
+            read_variants_results = []
+            if processes > 1:
+                with poolcontext(processes=processes) as pool:
+                    for read_variants_result in pool.imap_unordered(
+                        read_variants_call, read_variants_jobs
+                    ):
+                        read_variants_results.append(read_variants_result)
+                        pbar.update(1)
+            else:
+                # workers (and their stores) are only needed by pool
+                for idx, seq_name in enumerate(seq_names):
+                    read_variants_results.append(
+                        (idx, self._read_sequence_variants(vcf_f, seq_name, query_samples))
+                    )
+                    pbar.update(1)
+        for idx, counts in read_variants_results:
+            if counts is not None:
+                count_records[idx] = counts["records"]
+                count_called[idx, :] = counts["called"]
+                count_hom_ref[idx, :] = counts["hom_ref"]
+                count_hom_alt[idx, :] = counts["hom_alt"]
+                count_het[idx, :] = counts["het"]
+                count_missing[idx, :] = counts["missing"]
+        self._set_variants_meta(
+            meta,
+            vcf_f,
+            query_samples,
+            count_records,
+            count_called,
+            count_hom_ref,
+            count_hom_alt,
+            count_het,
+            count_missing,
+        )
+
+    def _read_sequence_variants(self, vcf_f, seq_name, query_samples):
+        """Reads, masks and saves the variants of one sequence.
+
+        Returns dict of per-sample genotype counts (or None if sequence has no
+        variants/intervals). Touches only 'seqs/<seq_name>/variants', which allows
+        sequences to be processed in parallel (see read_variants_call)."""
+        gt_key, pos_key = "calldata/GT", "variants/POS"
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            vcf_data = allel.read_vcf(
+                vcf_f,
+                region=seq_name,
+                samples=query_samples,
+                fields=[gt_key, pos_key],
+            )
+        if not vcf_data:
+            return None
+        # genotypes
+        gt_matrix_raw = vcf_data[gt_key]
+        # counts
+        intervals = self._get_interval_coordinates(seq_name=seq_name)
+        starts, ends = intervals
+        if starts is None or ends is None or not np.any(ends - starts):
+            return None
+        # positions in VCF
+        pos_array_raw = check_unique_pos(
+            (vcf_data[pos_key] - 1)
+        )  # port to BED (0-based) coordinates
+        # intersection of VCF and BED intervals
+        interval_mask = pos_in_intervals(pos_array_raw, intervals)
+        gt_matrix = gt_matrix_raw[interval_mask]
+        pos_array = pos_array_raw[interval_mask]
+        sa_genotype_matrix = allel.GenotypeArray(gt_matrix)
+        counts = {
+            "records": gt_matrix.shape[0],
+            "called": sa_genotype_matrix.count_called(axis=0),
+            "hom_ref": sa_genotype_matrix.count_hom_ref(axis=0),
+            "hom_alt": sa_genotype_matrix.count_hom_alt(axis=0),
+            "het": sa_genotype_matrix.count_het(axis=0),
+            "missing": sa_genotype_matrix.count_missing(axis=0),
+        }
+        self._save_variants(seq_name, pos_array, gt_matrix)
+        return counts
+
+    def _read_variants_streaming(self, measure_key, vcf_f, chunk_length):
+        """Reads VCF_FILE in a single pass, chunk by chunk.
+
+        Records are routed to their sequence, masked by the BED intervals of that
+        sequence and appended to 'seqs/<seq>/variants/{pos,matrix}'. Assumes VCF_FILE
+        is sorted (as required for indexing), so that records of a sequence are contiguous.
+        """
+        meta = self._get_meta(measure_key)
+        seq_idx_by_name = {seq_name: idx for idx, seq_name in enumerate(meta["seq_names"])}
+        samples = meta["samples"]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            chrom_key, gt_key, pos_key = "variants/CHROM", "calldata/GT", "variants/POS"
+            query_samples = self._get_query_samples(vcf_f, samples)
             # Set up counts arrays
             count_shape = (len(meta["seq_names"]), len(query_samples))
             count_records = np.zeros(count_shape[0], dtype=np.int64)
@@ -1289,46 +1869,88 @@ class Store(object):
             count_hom_alt = np.zeros(count_shape, dtype=np.int64)
             count_het = np.zeros(count_shape, dtype=np.int64)
             count_missing = np.zeros(count_shape, dtype=np.int64)
-            for idx, seq_name in tqdm(
-                enumerate(seq_names),
-                total=len(seq_names),
-                desc="[%] Reading variants",
+            _, _, _, vcf_chunks = allel.iter_vcf_chunks(
+                vcf_f,
+                samples=query_samples,
+                fields=[chrom_key, gt_key, pos_key],
+                chunk_length=chunk_length,
+            )
+            seq_name, idx, intervals, last_pos = None, None, (None, None), None
+            streamed_seq_names = set()
+            for vcf_chunk, _, _, _ in tqdm(
+                vcf_chunks,
+                desc="[%] Streaming variants",
                 ncols=100,
+                unit=" chunks",
             ):
-                vcf_data = allel.read_vcf(
-                    vcf_f,
-                    region=seq_name,
-                    samples=query_samples,
-                    fields=[gt_key, pos_key],
+                chroms = vcf_chunk[chrom_key]
+                # split chunk into runs of records on the same sequence
+                run_bounds = np.concatenate(
+                    [[0], np.flatnonzero(chroms[1:] != chroms[:-1]) + 1, [chroms.shape[0]]]
                 )
-                if vcf_data:
-                    # genotypes
-                    gt_matrix_raw = vcf_data[gt_key]
-                    # counts
-                    intervals = self._get_interval_coordinates(seq_name=seq_name)
-                    sites = intervals_to_sites(intervals)
-                    if sites is not None:
-                        # positions in VCF
-                        pos_array_raw = check_unique_pos(
-                            (vcf_data[pos_key] - 1)
-                        )  # port to BED (0-based) coordinates
-                        # intersection of VCF and BED intervals
-                        interval_mask = np.isin(
-                            pos_array_raw, sites, assume_unique=True
+                for run_start, run_end in zip(run_bounds[:-1], run_bounds[1:]):
+                    if chroms[run_start] != seq_name:
+                        seq_name = chroms[run_start]
+                        if seq_name in streamed_seq_names:
+                            sys.exit(
+                                "[X] Records of sequence %r are not contiguous in VCF_FILE %r. Please sort VCF_FILE."
+                                % (seq_name, vcf_f)
+                            )
+                        streamed_seq_names.add(seq_name)
+                        idx = seq_idx_by_name.get(seq_name, None)
+                        intervals = (
+                            self._get_interval_coordinates(seq_name=seq_name)
+                            if idx is not None
+                            else (None, None)
                         )
-                        gt_matrix = gt_matrix_raw[interval_mask]
-                        count_records[idx] = gt_matrix.shape[0]
-                        pos_array = pos_array_raw[interval_mask]
-                        sa_genotype_matrix = allel.GenotypeArray(gt_matrix)
-                        count_called[idx, :] = sa_genotype_matrix.count_called(axis=0)
-                        count_hom_ref[idx, :] = sa_genotype_matrix.count_hom_ref(axis=0)
-                        count_hom_alt[idx, :] = sa_genotype_matrix.count_hom_alt(axis=0)
-                        count_het[idx, :] = sa_genotype_matrix.count_het(axis=0)
-                        count_missing[idx, :] = sa_genotype_matrix.count_missing(axis=0)
-                        self._save_variants(seq_name, pos_array, gt_matrix)
-            meta["variants_idx_by_sample"] = {
-                query_sample: idx for idx, query_sample in enumerate(query_samples)
-            }
+                        last_pos = None
+                    if intervals[0] is None:
+                        continue
+                    # positions in VCF, ported to BED (0-based) coordinates
+                    pos_array_raw = np.array(vcf_chunk[pos_key][run_start:run_end], dtype=np.int64) - 1
+                    # last (shifted) position of previous chunk is needed to rescue duplicates across chunks
+                    pos_array_raw = check_unique_pos(pos_array_raw, last_pos)
+                    if pos_array_raw.shape[0]:
+                        last_pos = pos_array_raw[-1]
+                    # intersection of VCF and BED intervals
+                    interval_mask = pos_in_intervals(pos_array_raw, intervals)
+                    gt_matrix = vcf_chunk[gt_key][run_start:run_end][interval_mask]
+                    pos_array = pos_array_raw[interval_mask]
+                    count_records[idx] += gt_matrix.shape[0]
+                    sa_genotype_matrix = allel.GenotypeArray(gt_matrix)
+                    count_called[idx, :] += sa_genotype_matrix.count_called(axis=0)
+                    count_hom_ref[idx, :] += sa_genotype_matrix.count_hom_ref(axis=0)
+                    count_hom_alt[idx, :] += sa_genotype_matrix.count_hom_alt(axis=0)
+                    count_het[idx, :] += sa_genotype_matrix.count_het(axis=0)
+                    count_missing[idx, :] += sa_genotype_matrix.count_missing(axis=0)
+                    self._append_variants(seq_name, pos_array, gt_matrix)
+        self._set_variants_meta(
+            meta,
+            vcf_f,
+            query_samples,
+            count_records,
+            count_called,
+            count_hom_ref,
+            count_hom_alt,
+            count_het,
+            count_missing,
+        )
+
+    def _set_variants_meta(
+        self,
+        meta,
+        vcf_f,
+        query_samples,
+        count_records,
+        count_called,
+        count_hom_ref,
+        count_hom_alt,
+        count_het,
+        count_missing,
+    ):
+        meta["variants_idx_by_sample"] = {
+            query_sample: idx for idx, query_sample in enumerate(query_samples)
+        }
         meta["vcf_f"] = vcf_f
         meta["variants_counts"] = int(
             np.sum(count_records)
@@ -1351,41 +1973,78 @@ class Store(object):
         # QC plots
 
     def _save_variants(self, sequence, pos_array, gt_matrix):
+        # positions are delta-encoded, genotypes stored as int8 (as read by allel),
+        # both chunked by ranges of VARIANTS_CHUNK_LENGTH variants and compressed
         self.data.create_dataset(
-            "seqs/%s/variants/pos" % sequence, data=pos_array, dtype=np.int64
+            "seqs/%s/variants/pos" % sequence,
+            data=pos_array,
+            dtype=np.int64,
+            chunks=(VARIANTS_CHUNK_LENGTH,),
+            filters=[numcodecs.Delta(dtype=np.int64)],
+            compressor=VARIANTS_COMPRESSOR,
         )
         self.data.create_dataset(
-            "seqs/%s/variants/matrix" % sequence, data=gt_matrix, dtype=np.int64
+            "seqs/%s/variants/matrix" % sequence,
+            data=gt_matrix,
+            dtype=np.int8,
+            chunks=(VARIANTS_CHUNK_LENGTH,) + gt_matrix.shape[1:],
+            compressor=VARIANTS_COMPRESSOR,
         )
 
+    def _append_variants(self, sequence, pos_array, gt_matrix):
+        pos_key = "seqs/%s/variants/pos" % sequence
+        if pos_key in self.data:
+            self.data[pos_key].append(pos_array)
+            self.data["seqs/%s/variants/matrix" % sequence].append(gt_matrix)
+        else:
+            self._save_variants(sequence, pos_array, gt_matrix)
+
     def _save_variants_meta(self):
         pass
 
-    def _read_intervals(self, measure_key, bed_f):
+    def _read_intervals(self, measure_key, bed_f, processes=1):
         meta = self._get_meta(measure_key)
         target_sequences, target_samples = set(meta["seq_names"]), list(meta["samples"])
-        intervals_df = parse_intervals(bed_f, target_sequences, target_samples)
+        intervals_df, samples_matrix = parse_intervals(bed_f, target_sequences, target_samples)
         valid_sequences = intervals_df["sequence"].unique()
         intervals_idx_by_sample = {
-            sample: idx for idx, sample in enumerate(intervals_df.columns[3:-1])
+            sample: idx for idx, sample in enumerate(target_samples)
         }
         intervals_count = len(intervals_df.index)
         intervals_span = int(intervals_df["length"].sum())
         count_bases_samples = np.zeros(
             (len(valid_sequences), len(target_samples)), dtype=np.int64
         )
-        for idx, (sequence, _df) in tqdm(
-            enumerate(intervals_df.groupby(["sequence"], observed=True)),
-            total=len(valid_sequences),
-            desc="[%] Reading intervals",
-            ncols=100,
-        ):
-            interval_matrix = _df[target_samples].to_numpy()
-            starts = _df["start"].to_numpy()
-            ends = _df["end"].to_numpy()
-            self._set_intervals(sequence, interval_matrix, starts, ends)
-            length_matrix = interval_matrix * _df["length"].to_numpy().reshape(-1, 1)
-            count_bases_samples[idx, :] = np.sum(length_matrix, axis=0)
+        read_intervals_jobs = [
+            (
+                self.path,
+                idx,
+                sequence,
+                samples_matrix,
+                _df["samples"].cat.codes.to_numpy(),
+                _df["start"].to_numpy(),
+                _df["end"].to_numpy(),
+                _df["length"].to_numpy(),
+            )
+            for idx, (sequence, _df) in enumerate(
+                intervals_df.groupby(["sequence"], observed=True)
+            )
+        ]
+        with tqdm(
+            total=len(valid_sequences), desc="[%] Reading intervals", ncols=100
+        ) as pbar:
+            if processes > 1:
+                with poolcontext(processes=processes) as pool:
+                    for idx, count_bases in pool.imap_unordered(
+                        read_intervals_call, read_intervals_jobs
+                    ):
+                        count_bases_samples[idx, :] = count_bases
+                        pbar.update(1)
+            else:
+                # workers (and their stores) are only needed by pool
+                for _, idx, *sequence_intervals in read_intervals_jobs:
+                    count_bases_samples[idx, :] = self._read_sequence_intervals(*sequence_intervals)
+                    pbar.update(1)
         self._set_intervals_meta(
             bed_f,
             intervals_idx_by_sample,
@@ -1394,9 +2053,20 @@ class Store(object):
             intervals_span,
         )
 
+    def _read_sequence_intervals(self, sequence, samples_matrix, samples_codes, starts, ends, lengths):
+        """Saves intervals of a sequence, returns count of bases per sample. Touches only
+        'seqs/<sequence>/intervals', which allows sequences to be processed in parallel
+        (see read_intervals_call)."""
+        interval_matrix = np.packbits(samples_matrix, axis=1)[samples_codes]
+        self._set_intervals(sequence, interval_matrix, starts, ends)
+        length_by_category = np.zeros(samples_matrix.shape[0], dtype=np.int64)
+        np.add.at(length_by_category, samples_codes, lengths)
+        return length_by_category @ samples_matrix.astype(np.int64)
+
     def _set_intervals(self, sequence, interval_matrix, starts, ends):
+        # interval_matrix: sample membership as bits, i.e. np.packbits(axis=1)
         self.data.create_dataset(
-            "seqs/%s/intervals/matrix" % sequence, data=interval_matrix
+            "seqs/%s/intervals/matrix" % sequence, data=interval_matrix, dtype=np.uint8
         )
         self.data.create_dataset("seqs/%s/intervals/starts" % sequence, data=starts)
         self.data.create_dataset("seqs/%s/intervals/ends" % sequence, data=ends)
@@ -1412,6 +2082,7 @@ class Store(object):
         meta_intervals = self._get_meta("seqs")
         meta_intervals["bed_f"] = bed_f
         meta_intervals["intervals_idx_by_sample"] = intervals_idx_by_sample
+        meta_intervals["intervals_packed"] = True
         meta_intervals["intervals_span_sample"] = [
             int(x) for x in np.sum(count_bases_samples, axis=0)
         ]  # JSON encoder does not like numpy dtypes
@@ -1425,38 +2096,120 @@ class Store(object):
         block_max_multiallelic,
         block_max_missing,
         overwrite,
+        layout="arrays",
+        processes=1,
+        sample_sets="all",
+        max_pairs=None,
+        seed=19,
+        stratified=False,
+        defer_filter=False,
+        blocks_key="blocks",
+        resume=False,
     ):
-        """
-        [TODO]: allow for multiple block datasets
-        """
+        """Returns config of blocks dataset 'blocks_key' (see get_blocks_key).
+        If resume, blocks of an interrupted run (with the same parameters) are kept (see _make_blocks)"""
+        if not layout in BLOCKS_LAYOUTS:
+            sys.exit("[X] Blocks layout must be one of %s, not %r." % (", ".join(BLOCKS_LAYOUTS), layout))
+        if not sample_sets in BLOCKS_SAMPLE_SETS + ["all"]:
+            sys.exit("[X] Blocks sample sets must be one of %s, not %r." % (", ".join(BLOCKS_SAMPLE_SETS + ["all"]), sample_sets))
+        if max_pairs is not None and max_pairs < 1:
+            sys.exit("[X] Max pairs must be at least 1, not %r." % max_pairs)
         if not self.has_stage("measure") and not self.has_stage("parse"):
             sys.exit(
                 "[X] Gimble store %r has no data to block. Please run 'gimble parse'." % self.path
             )
-        if self.has_stage("blocks"):
+        config = self._get_blocks_config(
+            block_length,
+            block_span,
+            block_max_multiallelic,
+            block_max_missing,
+            overwrite,
+            layout,
+            processes,
+            BLOCKS_SAMPLE_SETS if sample_sets == "all" else [sample_sets],
+            max_pairs,
+            seed,
+            stratified,
+            defer_filter,
+            blocks_key,
+        )
+        checkpoint = get_blocks_checkpoint(config)
+        if self._has_key(blocks_key) and resume:
+            meta_checkpoint = (self._get_meta(blocks_key) or {}).get("checkpoint", None)
+            if meta_checkpoint is None:
+                sys.exit(
+                    "[X] Blocks %r in Gimble store %r are not from an interrupted run. Please specify '--force' to overwrite."
+                    % (blocks_key, self.path)
+                )
+            if meta_checkpoint != checkpoint:
+                sys.exit(
+                    "[X] Blocks %r of interrupted run were made with different parameters: %s\n[X] Please specify '--force' to overwrite."
+                    % (
+                        blocks_key,
+                        ", ".join(
+                            "%s=%s (not %s)" % (key, value, checkpoint.get(key, None))
+                            for key, value in meta_checkpoint.items()
+                            if checkpoint.get(key, None) != value
+                        ),
+                    )
+                )
+            print("[+] Resuming blocks %r of interrupted run ..." % blocks_key)
+            return config
+        if self._has_key(blocks_key):
+            blocks_meta = self._get_meta(blocks_key) or {}
             if not overwrite:
                 sys.exit(
-                    "[X] Gimble store %r already contains blocks.\n[X] These blocks => %r\n[X] Please specify '--force' to overwrite."
-                    % (self.path, self.get_stage("blocks"))
+                    "[X] Gimble store %r already contains blocks %r.\n[X] These blocks => %r%s\n[X] Please specify '--force' to overwrite%s."
+                    % (
+                        self.path,
+                        blocks_key,
+                        format_blocks_parameters(blocks_meta.get("checkpoint", blocks_meta)),
+                        "" if self._has_blocks(blocks_key) else " (interrupted run)",
+                        "" if self._has_blocks(blocks_key) else " (or '--resume' to continue the interrupted run)",
+                    )
                 )
             print(
-                "[-] Gimble store %r already contains blocks. But these will be overwritten..."
-                % (self.path)
+                "[-] Gimble store %r already contains blocks %r. But these will be overwritten..."
+                % (self.path, blocks_key)
             )
             # wipe bsfs, windows, AND meta, since new blocks...
-            blocks_meta = self._get_meta("blocks")
-            if blocks_meta:
-                self._del_data_and_meta("blocks")
-                if "blocks_raw_tally_key" in blocks_meta:
-                    self._del_data_and_meta(blocks_meta["blocks_raw_tally_key"])
+            if "blocks_raw_tally_key" in blocks_meta:
+                self._del_data_and_meta(blocks_meta["blocks_raw_tally_key"])
+            self._del_data_and_meta(blocks_key)
             windows_meta = self._get_meta("windows")
-            if windows_meta:
+            # windows are only wiped if they are based on these blocks
+            if windows_meta and windows_meta.get("blocks_key", "blocks") == blocks_key:
                 self._del_data_and_meta("windows")
                 if "windows_raw_tally_key" in windows_meta:
                     self._del_data_and_meta(windows_meta["windows_raw_tally_key"])
                     #self._del_data_and_meta(windows_meta["windowsum_raw_tally_key"])
+        # parameters are saved so that an interrupted run can be resumed (replaced by meta once complete)
+        self._set_meta(blocks_key, meta={"checkpoint": checkpoint})
+        return config
+
+    def _get_blocks_config(
+        self,
+        block_length,
+        block_span,
+        block_max_multiallelic,
+        block_max_missing,
+        overwrite,
+        layout,
+        processes,
+        sample_sets,
+        max_pairs=None,
+        seed=19,
+        stratified=False,
+        defer_filter=False,
+        blocks_key="blocks",
+    ):
+        """sample_sets : list of classes of sample sets (see BLOCKS_SAMPLE_SETS) for which blocks are made
+        max_pairs : max number of sample sets of each class (see select_sample_set_idxs)
+        defer_filter : save all blocks, max_missing/max_multiallelic are applied when blocks are read
+        blocks_key : key of blocks dataset (see get_blocks_key)"""
+        meta_seqs = self._get_meta("seqs")
         config = {
-            "blocks_key": "blocks",
+            "blocks_key": blocks_key,
             "block_length": block_length,
             "block_span": block_span,
             "block_max_multiallelic": block_max_multiallelic,
@@ -1464,7 +2217,27 @@ class Store(object):
             "blocks_raw_by_sample_set_idx": collections.Counter(),  # all possible blocks
             "blocks_by_sample_set_idx": collections.Counter(),  # all valid blocks => only these get saved to store
             "blocks_by_sequence": collections.Counter(),  # all valid blocks
+            "blocks_raw_by_sequence": collections.Counter(),  # all possible blocks
             "overwrite": overwrite,
+            "layout": layout,
+            "processes": processes,
+            "sample_sets": sample_sets,
+            "max_pairs": max_pairs,
+            "seed": seed,
+            "stratified": stratified,
+            "defer_filter": defer_filter,
+            # selection of each class is seeded by (seed, class), i.e. independent of other classes
+            "sample_set_idxs": sorted(
+                sample_set_idx
+                for sample_set in sample_sets
+                for sample_set_idx in select_sample_set_idxs(
+                    meta_seqs["sample_sets"],
+                    self._get_sample_set_idxs(query=sample_set, all_pairs=True),
+                    max_pairs,
+                    [seed, BLOCKS_SAMPLE_SETS.index(sample_set)],
+                    stratified,
+                )
+            ),
         }
         return config
 
@@ -1475,38 +2248,172 @@ class Store(object):
         block_max_multiallelic=3,
         block_max_missing=3,
         overwrite=False,
+        layout="arrays",
+        processes=1,
+        sample_sets="all",
+        max_pairs=None,
+        seed=19,
+        stratified=False,
+        defer_filter=False,
+        blocks_label=None,
+        resume=False,
     ):
-        config = self._preflight_blocks(
-            block_length,
-            block_span,
-            block_max_multiallelic,
-            block_max_missing,
-            overwrite,
+        self.blocks_sweep(
+            [block_length],
+            [block_span],
+            [block_max_multiallelic],
+            [block_max_missing],
+            overwrite=overwrite,
+            layout=layout,
+            processes=processes,
+            sample_sets=sample_sets,
+            max_pairs=max_pairs,
+            seed=seed,
+            stratified=stratified,
+            defer_filter=defer_filter,
+            blocks_labels=[blocks_label],
+            resume=resume,
         )
-        config = self._make_blocks(config)
-        if config["count_total"] == 0:
-            sys.exit("[X] No blocks could be generated from data given the parameters.")
+
+    def blocks_sweep(
+        self,
+        block_lengths,
+        block_spans,
+        block_max_multiallelics,
+        block_max_missings,
+        overwrite=False,
+        layout="arrays",
+        processes=1,
+        sample_sets="all",
+        max_pairs=None,
+        seed=19,
+        stratified=False,
+        defer_filter=False,
+        blocks_labels=None,
+        resume=False,
+    ):
+        """Makes one blocks dataset for each (block_length, block_span, block_max_multiallelic, block_max_missing)
+        in a single pass over the sequences (variants/intervals are read and mutypes are computed once).
+        blocks_labels : labels of blocks datasets (see get_blocks_key), default: 'l<block_length>_m<block_span>'
+        resume : continue interrupted run, i.e. only block (sequence, sample set) that are not on disk yet"""
+        if blocks_labels is None:
+            blocks_labels = [
+                "l%s_m%s" % (block_length, block_span)
+                for block_length, block_span in zip(block_lengths, block_spans)
+            ]
+        blocks_keys = [get_blocks_key(blocks_label) for blocks_label in blocks_labels]
+        if len(set(blocks_keys)) < len(blocks_keys):
+            sys.exit("[X] Labels of blocks datasets must be unique: %s" % ", ".join(blocks_keys))
+        configs = [
+            self._preflight_blocks(
+                block_length,
+                block_span,
+                block_max_multiallelic,
+                block_max_missing,
+                overwrite,
+                layout,
+                processes,
+                sample_sets,
+                max_pairs,
+                seed,
+                stratified,
+                defer_filter,
+                blocks_key,
+                resume,
+            )
+            for block_length, block_span, block_max_multiallelic, block_max_missing, blocks_key in zip(
+                block_lengths, block_spans, block_max_multiallelics, block_max_missings, blocks_keys
+            )
+        ]
+        configs = self._make_blocks(configs)
+        for config in configs:
+            if config["count_total"] == 0:
+                sys.exit(
+                    "[X] No blocks could be generated from data given the parameters (-l %s -m %s)."
+                    % (config["block_length"], config["block_span"])
+                )
+        for config, blocks_label in zip(configs, blocks_labels):
+            self._set_blocks_meta(config, blocks_label)
+
+    def _set_blocks_meta(self, config, blocks_label=None):
         meta = {
             "length": config["block_length"],
             "span": config["block_span"],
             "max_missing": config["block_max_missing"],
             "max_multiallelic": config["block_max_multiallelic"],
+            "layout": config["layout"],
+            "sample_sets": config["sample_sets"],  # classes of sample sets for which blocks were made
+            "filter_deferred": config["defer_filter"],  # if True, all blocks are saved (see _get_block_filter)
             "count_by_sample_set_idx": dict(config["blocks_by_sample_set_idx"]),  # keys are strings
             "count_by_sequence": dict(config["blocks_by_sequence"]),  # keys are strings
+            "count_raw_by_sequence": dict(config["blocks_raw_by_sequence"]),  # keys are strings
             "count_raw_by_sample_set_idx": dict(config["blocks_raw_by_sample_set_idx"]),  # keys are strings
             "count_total": config["count_total"],
             "count_total_raw": config["count_total_raw"],
         }
+        if blocks_label is not None:
+            meta["label"] = blocks_label
+        if config["max_pairs"] is not None:
+            # only selected sample sets are used downstream (see _get_sample_set_idxs)
+            meta["max_pairs"] = config["max_pairs"]
+            meta["seed"] = config["seed"]
+            meta["stratified"] = config["stratified"]
+            meta["sample_set_idxs"] = [str(idx) for idx in config["sample_set_idxs"]]
         self._set_meta(config["blocks_key"], meta=meta)
-        # after making blocks, make tally 'raw' without kmax. This is needed for heterozygosity, d_xy, F_sts metrics, etc
-        meta["blocks_raw_tally_key"] = self.tally(
-            "blocks", "blocks_raw", None, "X", None, None, overwrite=True, verbose=False
+        # blocks of 'X' are not made for tally 'raw' if other classes were requested (see _require_blocks)
+        if "X" in config["sample_sets"]:
+            self._set_blocks_raw_tally(config["blocks_key"])
+
+    def _set_blocks_raw_tally(self, blocks_key="blocks"):
+        """Makes tally 'raw' (without kmax) of blocks of 'X', from which tallies of blocks can be 
+        derived (see _get_raw_tally_key)"""
+        blocks_label = self._get_meta(blocks_key).get("label", None)
+        blocks_raw_tally_key = self.tally(
+            "blocks",
+            "blocks_raw" if blocks_label is None else "blocks_raw_%s" % blocks_label,
+            None,
+            "X",
+            None,
+            None,
+            overwrite=True,
+            verbose=False,
+            blocks_label=blocks_label,
         )
-        self._set_meta(config["blocks_key"], meta=meta)
-        meta_seqs = self._get_meta(config["blocks_key"])
+        meta = dict(self._get_meta(blocks_key))
+        meta["blocks_raw_tally_key"] = blocks_raw_tally_key
+        self._set_meta(blocks_key, meta=meta)
 
-    def windows(self, window_size=500, window_step=100, overwrite=False):
-        config = self._preflight_windows(window_size, window_step, overwrite)
+    def windows(
+        self,
+        window_size=500,
+        window_step=100,
+        overwrite=False,
+        max_missing=None,
+        max_multiallelic=None,
+        blocks_label=None,
+        layout="variation",
+        window_bp=None,
+        step_bp=None,
+        min_blocks=1,
+        processes=1,
+    ):
+        """Makes windows of window_size blocks shifted by window_step blocks or, if window_bp is
+        given, windows of window_bp bases shifted by step_bp bases with at least min_blocks blocks
+        (only for layout 'index', see blocks_to_bp_window_index). Sequences are windowed by
+        processes in parallel."""
+        config = self._preflight_windows(
+            window_size,
+            window_step,
+            overwrite,
+            max_missing,
+            max_multiallelic,
+            get_blocks_key(blocks_label),
+            layout,
+            window_bp,
+            step_bp,
+            min_blocks,
+            processes,
+        )
         config = self._make_windows(config)
         if config["window_count"] == 0:
             sys.exit("[X] No windows could be made.")
@@ -1517,7 +2424,15 @@ class Store(object):
                 "sample_sets": config["sample_sets"],
                 "windows_key": config["windows_key"],
                 "window_count": config["window_count"],
+                "max_missing": config["max_missing"],
+                "max_multiallelic": config["max_multiallelic"],
+                "blocks_key": config["blocks_key"],
+                "layout": config["layout"],
             }
+            if config["window_bp"] is not None:
+                meta["window_bp"] = config["window_bp"]
+                meta["step_bp"] = config["step_bp"]
+                meta["min_blocks"] = config["min_blocks"]
             self._set_meta(config["windows_key"], meta=meta)
             meta["windows_raw_tally_key"] = self.tally(
                 "windows",
@@ -1640,6 +2555,7 @@ class Store(object):
                     "ancestry_seeds": tuple([int(s) for s in kwargs["ancestry_seeds_by_replicate"][kwargs["idx"]]]),
                     "mutation_seeds": tuple([int(s) for s in kwargs["mutation_seeds_by_replicate"][kwargs["idx"]]])
                 }
+                self._invalidate_meta(replicate_key)
                 self.data[replicate_key].attrs.put(replicate_meta)
         simulate_meta = {
             'simulate_key': kwargs['simulate_key'],
@@ -1670,6 +2586,7 @@ class Store(object):
             'overwrite': kwargs['overwrite'],
             'grid_dict': {k: list(v) for k, v in LOD_to_DOL(get_parameter_dicts_from_user_parameters(Ne_A=[kwargs['Ne_A']], Ne_B=[kwargs['Ne_B']], Ne_A_B=[kwargs['Ne_A_B']], T=[kwargs['T']], me=[kwargs['me']])).items()},
         }
+        self._invalidate_meta(kwargs['simulate_key'])
         self.data[kwargs['simulate_key']].attrs.put(simulate_meta)
         print("[+] Tally of simulation can be accessed with %r" % kwargs['simulate_key'])
 
@@ -1874,9 +2791,9 @@ class Store(object):
         print("[#] Wrote file %r." % config["filename"])
 
     def _write_window_bed(self, config):
-        meta_blocks = self._get_meta("blocks")
-        # print(dict(meta_blocks))
         meta_windows = self._get_meta("windows")
+        meta_blocks = self._get_meta(meta_windows.get("blocks_key", "blocks"))
+        # print(dict(meta_blocks))
         query_meta_blocks = format_query_meta(meta_blocks, ignore_long=True)
         # print(query_meta_blocks)
         query_meta_windows = format_query_meta(meta_windows, ignore_long=True)
@@ -1896,9 +2813,17 @@ class Store(object):
         tally = self._get_data(meta_windows["windows_raw_tally_key"])
         meta_tally = self._get_meta(meta_windows["windows_raw_tally_key"])
 
-        pop_metrics = get_popgen_metrics(
-            tally, sites=(meta_tally["block_length"] * meta_windows["window_size"])
-        )
+        if meta_windows.get("window_bp", None) is None:
+            window_sites = meta_tally["block_length"] * meta_windows["window_size"]
+        else:
+            # number of blocks differs between windows of fixed length (bases)
+            window_bounds = [
+                self._get_window_bounds(seq_name) for seq_name in self._get_meta("seqs")["seq_names"]
+            ]
+            window_sites = meta_tally["block_length"] * np.concatenate(
+                [bounds[:, 1] - bounds[:, 0] for bounds in window_bounds if bounds is not None]
+            )
+        pop_metrics = get_popgen_metrics(tally, sites=window_sites)
         int_bed = np.vstack(
             [
                 starts,
@@ -2851,6 +3776,9 @@ class Store(object):
         sequence_ids,
         genome_file,
         overwrite,
+        max_missing=None,
+        max_multiallelic=None,
+        blocks_label=None,
     ):
         config = {
             "data_ndims": 0,
@@ -2868,12 +3796,36 @@ class Store(object):
             "marginalty": "0.0%",
             "block_length": 0,
         }
+        # blocks dataset
+        if config["data_type"] == "windows":
+            if blocks_label is not None:
+                sys.exit("[X] Blocks of windows are chosen by 'gimble windows' (not by 'gimble tally').")
+            meta_windows = self._get_meta("windows")
+            config["blocks_key"] = (
+                meta_windows.get("blocks_key", "blocks") if meta_windows else "blocks"
+            )
+        else:
+            config["blocks_key"] = get_blocks_key(blocks_label)
+            config["data_key"] = config["blocks_key"]
         # check data is there
-        if not self._has_key(config["data_key"]):
-            sys.exit("[X] gimbleStore has no %r." % config["data_key"])
-        config["block_length"] = self._get_meta("blocks")[
-            "length"
-        ]  # needs fixing if multiple block-datasets
+        if not self._has_key(config["data_key"]) or not self._has_blocks(config["blocks_key"]):
+            sys.exit("[X] gimbleStore has no (complete) %r." % config["data_key"])
+        meta_blocks = self._get_meta(config["blocks_key"])
+        config["block_length"] = meta_blocks["length"]
+        # filters of blocks
+        if config["data_type"] == "windows":
+            if max_missing is not None or max_multiallelic is not None:
+                sys.exit(
+                    "[X] Blocks in windows are filtered by 'gimble windows' (not by 'gimble tally')."
+                )
+            config["max_missing"] = meta_windows.get("max_missing", meta_blocks["max_missing"])
+            config["max_multiallelic"] = meta_windows.get(
+                "max_multiallelic", meta_blocks["max_multiallelic"]
+            )
+        else:
+            config["max_missing"], config["max_multiallelic"], _ = self._get_block_filter(
+                max_missing, max_multiallelic, config["blocks_key"]
+            )
         # check tally key
         if self._has_key(config["tally_key"]):
             if not overwrite:
@@ -2904,6 +3856,9 @@ class Store(object):
         overwrite,
         verbose=True,
         tally_form="bsfs",
+        max_missing=None,
+        max_multiallelic=None,
+        blocks_label=None,
     ):
         config = self._preflight_tally(
             data_type,
@@ -2913,22 +3868,40 @@ class Store(object):
             sequence_ids,
             genome_file,
             overwrite,
+            max_missing,
+            max_multiallelic,
+            blocks_label,
         )
-        variation = self._get_variation(
-            data_type=config["data_type"],
-            sample_sets=config["sample_sets"],
-            sequences=config["sequences"],
-            progress=verbose,
-        )
-        config["windows"] = variation.shape[0] if variation.ndim == 3 else 0
-        config["blocks"] = (
-            (variation.shape[0] * variation.shape[1])
-            if variation.ndim == 3
-            else variation.shape[0]
-        )
-        config["marginality"] = format_percentage(
-            calculate_marginality_of_variation(variation, max_k=config["max_k"])
-        )
+        # bsfs are clipped from raw tallies if possible (instead of reading all blocks)
+        raw_tally_key = self._get_raw_tally_key(config) if tally_form == "bsfs" else None
+        if raw_tally_key is not None and config["data_type"] == "windows":
+            variation_tally = self._tally_windows_from_raw(config, raw_tally_key)
+        elif raw_tally_key is not None:
+            variation_tally = self._tally_blocks_from_raw(config, raw_tally_key)
+        elif config["data_type"] == "windows":
+            # windows are tallied one sequence at a time, bsfs are written to store directly
+            variation_tally = self._tally_windows(config, tally_form=tally_form, progress=verbose)
+        else:
+            variation = self._get_variation(
+                data_type=config["data_type"],
+                sample_sets=config["sample_sets"],
+                sequences=config["sequences"],
+                progress=verbose,
+                max_missing=(config["max_missing"] if config["data_type"] == "blocks" else None),
+                max_multiallelic=(
+                    config["max_multiallelic"] if config["data_type"] == "blocks" else None
+                ),
+                blocks_key=config["blocks_key"],
+            )
+            config["windows"] = variation.shape[0] if variation.ndim == 3 else 0
+            config["blocks"] = (
+                (variation.shape[0] * variation.shape[1])
+                if variation.ndim == 3
+                else variation.shape[0]
+            )
+            config["marginality"] = format_percentage(
+                calculate_marginality_of_variation(variation, max_k=config["max_k"])
+            )
         if verbose:
             if config["data_type"] == "blocks":
                 print(
@@ -2944,17 +3917,23 @@ class Store(object):
                     % (
                         format_count(config["blocks"]),
                         format_count(config["windows"]),
-                        format_count(variation.shape[1]),
+                        format_count(config["blocks"] // config["windows"]),
                         format_count(len(config["sequences"]))))
             print(
                 "[+] Percentage of blocks treated as marginals (w/ kmax = %s) = %s"
                 % (config["max_k"], config["marginality"])
             )
-            print("[+] Tally'ing variation data ... ")
+            if raw_tally_key is not None:
+                print("[+] Tally'ing variation data (from %r) ... " % raw_tally_key)
+            else:
+                print("[+] Tally'ing variation data ... ")
         #if config["data_source"] == "windowsum":  # data_source, NOT data_type
         #    variation = variation.reshape(-1, variation.shape[-1])
-        variation_tally = tally_variation(variation, form=tally_form, max_k=config["max_k"])
-        config["data_ndims"] = variation_tally.ndim
+        if config["data_type"] == "blocks" and raw_tally_key is None:
+            variation_tally = tally_variation(variation, form=tally_form, max_k=config["max_k"])
+        config["data_ndims"] = (
+            variation_tally.ndim if variation_tally is not None else self.data[config["tally_key"]].ndim
+        )
         self.save_tally(config, variation_tally, verbose)
         return config["tally_key"]
 
@@ -2974,8 +3953,15 @@ class Store(object):
             "windows": config.get("windows", 0),
             "marginality": config.get("marginality", "NA"),
             "block_length": config["block_length"],
+            "max_missing": config.get("max_missing", None),
+            "max_multiallelic": config.get("max_multiallelic", None),
+            "blocks_key": config.get("blocks_key", None),
         }
-        self._set_meta_and_data(tally_key, tally_meta, tally)
+        if tally is None:  # tally has been written to store (see _tally_windows)
+            self._invalidate_meta(tally_key)
+            self.data[tally_key].attrs.put(tally_meta)
+        else:
+            self._set_meta_and_data(tally_key, tally_meta, tally)
 
     def _has_key(self, key):
         return (key in self.data) if key else False
@@ -2983,10 +3969,12 @@ class Store(object):
     def _set_data(self, key, array, overwrite=True, compression=False):
         #print("array", array.shape, array.nbytes)
         compressor = numcodecs.Blosc(cname='zstd', clevel=5, shuffle=numcodecs.Blosc.BITSHUFFLE) if compression else None
+        self._invalidate_meta(key)
         self.data.create_dataset(key, data=array, overwrite=overwrite, compressor=compressor)
         #print(self.data[key].info)
 
     def _set_meta_and_data(self, key, meta, array, overwrite=True):
+        self._invalidate_meta(key)
         self.data.create_dataset(key, data=array, overwrite=overwrite)
         self.data[key].attrs.put(meta)
 
@@ -3000,6 +3988,7 @@ class Store(object):
                     print("[+] Deletion cancelled.")
                     return 1
                 elif choice in set(["y", "yes", "ye"]):
+                    self._invalidate_meta(data_key)
                     del self.data[data_key]
                     print("[+] %r deleted." % data_key)
                     return 1
@@ -3009,6 +3998,7 @@ class Store(object):
 
     def _del_data_and_meta(self, key):
         if self._has_key(key):
+            self._invalidate_meta(key)
             del self.data[key]
 
     def _get_data(self, key, dtype=None):
@@ -3024,14 +4014,33 @@ class Store(object):
         return None
 
     def _get_meta(self, key):
+        """Returns metadata of key (or None), served from self._meta_cache after first access.
+
+        Writable stores return the zarr attrs of key, which cache their JSON document and
+        write through to the store. Read-only stores return a dict snapshot."""
+        meta_key = key.strip("/")
+        if meta_key in self._meta_cache:
+            return self._meta_cache[meta_key]
         if self._has_key(key):
-            return self.data[key].attrs
+            meta = self.data[key].attrs
+            if self.read_only:
+                meta = meta.asdict()
+            self._meta_cache[meta_key] = meta
+            return meta
         return None
 
     def _set_meta(self, key, meta={}):
+        self._invalidate_meta(key)
         self.data.require_group(key)
         self.data[key].attrs.put(meta)
 
+    def _invalidate_meta(self, key):
+        """Drops cached metadata of key and of keys below it"""
+        meta_key = key.strip("/")
+        for cached_key in list(self._meta_cache.keys()):
+            if cached_key == meta_key or cached_key.startswith("%s/" % meta_key):
+                del self._meta_cache[cached_key]
+
     def makegrid(self, Ne_A, Ne_B, Ne_A_B, T, me, makegrid_label, model, block_length, ref_pop, mu, kmax, processes, seed, overwrite):
         makegrid_key = "makegrid/%s" % (makegrid_label)
         if self._has_key(makegrid_key):
@@ -3191,7 +4200,7 @@ class Store(object):
             % (", ".join(sequences), ", ".join(meta["seq_names"]))
         )
 
-    def _get_sample_set_idxs(self, query="X"):
+    def _get_sample_set_idxs(self, query="X", all_pairs=False, blocks_key="blocks"):
         """Returns list of sample_set_idxs.
 
         Parameters
@@ -3201,6 +4210,10 @@ class Store(object):
                 'A' - intra-population sample_sets of population A
                 'B' - intra-population sample_sets of population B
                 None - all sample_sets
+        all_pairs : bool
+            If False, only sample_sets selected by 'gimble blocks --max_pairs' (if any)
+        blocks_key : string
+            Key of blocks dataset by which sample_sets were selected (see get_blocks_key)
 
         Returns
         -------
@@ -3209,27 +4222,32 @@ class Store(object):
         """
         meta = self._get_meta("seqs")
         if query is None:
-            return [str(idx) for idx in range(len(meta["sample_sets"]))]
+            sample_set_idxs = [str(idx) for idx in range(len(meta["sample_sets"]))]
         elif query == "X":
-            return [
+            sample_set_idxs = [
                 str(idx)
                 for (idx, is_cartesian) in enumerate(meta["sample_sets_inter"])
                 if is_cartesian
             ]
         elif query == "A":
-            return [
+            sample_set_idxs = [
                 str(idx)
                 for (idx, is_intra_A) in enumerate(meta["sample_sets_intra_A"])
                 if is_intra_A
             ]
         elif query == "B":
-            return [
+            sample_set_idxs = [
                 str(idx)
                 for (idx, is_intra_B) in enumerate(meta["sample_sets_intra_B"])
                 if is_intra_B
             ]
         else:
             raise ValueError("'query' must be 'X', 'A', 'B', or None")
+        meta_blocks = self._get_meta(blocks_key)
+        if not all_pairs and meta_blocks and "sample_set_idxs" in meta_blocks:
+            selected_idxs = set(meta_blocks["sample_set_idxs"])
+            sample_set_idxs = [idx for idx in sample_set_idxs if idx in selected_idxs]
+        return sample_set_idxs
 
     def _get_variation(
         self,
@@ -3238,6 +4256,9 @@ class Store(object):
         sequences=None,
         population_by_letter=None,
         progress=False,
+        max_missing=None,
+        max_multiallelic=None,
+        blocks_key="blocks",
     ):
         """Returns variation array of 2 (blocks) or 3 (windows) dimensions.
 
@@ -3254,10 +4275,16 @@ class Store(object):
             If supplied, array is based only on those sequences
         population_by_letter : dict (string -> string) or None
             Mapping of population IDs to population letter in model (from INI file)
+        max_missing, max_multiallelic : int or None
+            only needed for data_type 'blocks'. Filters of blocks (see _get_block_filter)
+        blocks_key : string
+            only needed for data_type 'blocks'. Key of blocks dataset (see get_blocks_key)
 
         Returns
         -------
         out : ndarray, int, ndim (mutypes)
+            or list of ndarrays of 2 dimensions (one per window) for windows of fixed length
+            (bases), which vary in number of blocks
         """
         meta = self._get_meta("seqs")
         sequences = self._validate_seq_names(sequences)
@@ -3268,35 +4295,49 @@ class Store(object):
                 "population_by_letter %r does not equal populations in ZARR store (%r)"
                 % (population_by_letter, meta["population_by_letter"])
             )
-        keys = []
+        variations = []
         if data_type == "blocks":
-            sample_set_idxs = self._get_sample_set_idxs(query=sample_sets)
-            keys = [
-                "blocks/%s/%s/variation" % (seq_name, sample_set_idx)
-                for seq_name, sample_set_idx in list(
-                    itertools.product(sequences, sample_set_idxs)
+            self._require_blocks(sample_sets, blocks_key)
+            sample_set_idxs = self._get_sample_set_idxs(query=sample_sets, blocks_key=blocks_key)
+            variations = [
+                variation
+                for _, _, variation in self._get_blocks_arrays(
+                    "variation",
+                    sequences,
+                    sample_set_idxs,
+                    max_missing,
+                    max_multiallelic,
+                    blocks_key,
                 )
             ]
-            # print('variation keys', keys)
         elif data_type == "windows":
+            meta_windows = self._get_meta("windows")
             keys = ["windows/%s/variation" % (seq_name) for seq_name in sequences]
+            for seq_name, key in tqdm(
+                zip(sequences, keys),
+                total=len(keys),
+                desc="[%] Preparing data",
+                ncols=100,
+                unit_scale=True,
+                disable=(not progress),
+            ):
+                # variations.append(np.array(self.data[key], dtype=np.int64))
+                if self._has_key(key):
+                    variations.append(self.data[key])
+                elif self._has_key("windows/%s/order" % seq_name):
+                    # windows of layout 'index' are taken from blocks
+                    variation, bounds = self._get_window_index_variation(seq_name, meta_windows)
+                    if meta_windows["window_size"] is None:
+                        # windows of fixed length (bases) vary in number of blocks
+                        variations.extend(variation[window_lo:window_hi] for window_lo, window_hi in bounds)
+                    else:
+                        variations.append(
+                            variation[bounds[:, 0, None] + np.arange(meta_windows["window_size"])]
+                        )
         else:
             raise ValueError("Invalid datatype: %s" % data_type)
-        variations = []
-        for key in tqdm(
-            keys,
-            total=len(keys),
-            desc="[%] Preparing data",
-            ncols=100,
-            unit_scale=True,
-            disable=(not progress),
-        ):
-            # variations.append(np.array(self.data[key], dtype=np.int64))
-            if self._has_key(key):
-                variations.append(self.data[key])
         if not variations:
             sys.exit("[X] Not enough blocks in Gimble datastore.")
-        variation = np.concatenate(variations, axis=0)
         polarise_true = (
             (
                 (population_by_letter["A"] == meta["population_by_letter"]["B"])
@@ -3305,6 +4346,11 @@ class Store(object):
             if population_by_letter
             else False
         )
+        if data_type == "windows" and meta_windows["window_size"] is None:
+            if polarise_true:
+                variations = [window_variation[:, [1, 0, 2, 3]] for window_variation in variations]
+            return variations
+        variation = np.concatenate(variations, axis=0)
         if polarise_true:
             variation[..., [0, 1]] = variation[..., [1, 0]]
         return variation
@@ -3319,9 +4365,23 @@ class Store(object):
                 print("[+] Deleting existing Gimble datastore %r" % self.path)
                 shutil.rmtree(self.path)
             print("[+] Creating Gimble datastore in %r" % self.path)
-            return zarr.open(str(self.path), mode="w")
+            return zarr.open(GimbleDirectoryStore(str(self.path)), mode="w")
         # print("[+] Loading Gimble store from %r" % self.path)
-        return zarr.open(str(self.path), mode="r+")
+        if self.read_only:
+            if os.path.isfile(os.path.join(str(self.path), ".zmetadata")):
+                return zarr.open_consolidated(str(self.path), mode="r")
+            return zarr.open(str(self.path), mode="r")
+        return zarr.open(GimbleDirectoryStore(str(self.path), invalidate=not self.worker), mode="r+")
+
+    def consolidate_metadata(self):
+        """Writes metadata of all keys into '.zmetadata', through which read-only stores are opened.
+        Has to be called at the end (in 'finally') of each stage that writes to the store. Skipped if
+        store was not modified and has consolidated metadata."""
+        if self.read_only:
+            return
+        if self.data.store.modified or not ".zmetadata" in self.data.store:
+            zarr.consolidate_metadata(self.data.store)
+            self.data.store.modified = False
 
     def _get_window_bed(self):
         meta_seqs = self._get_meta("seqs")
@@ -3386,16 +4446,48 @@ class Store(object):
             mse_sample_set_cov,
         )
 
-    def _preflight_windows(self, window_size, window_step, overwrite=False):
+    def _preflight_windows(
+        self,
+        window_size,
+        window_step,
+        overwrite=False,
+        max_missing=None,
+        max_multiallelic=None,
+        blocks_key="blocks",
+        layout="variation",
+        window_bp=None,
+        step_bp=None,
+        min_blocks=1,
+        processes=1,
+    ):
+        if not layout in WINDOWS_LAYOUTS:
+            sys.exit("[X] Windows layout must be one of %s, not %r." % (", ".join(WINDOWS_LAYOUTS), layout))
+        if window_bp is not None:
+            if layout != "index":
+                sys.exit("[X] Windows of fixed length (bases) vary in number of blocks and need layout 'index'.")
+            step_bp = window_bp if step_bp is None else step_bp
+            if window_bp < 1 or step_bp < 1 or min_blocks < 1:
+                sys.exit("[X] Window length, step (bases) and min blocks must be at least 1.")
+            # window_size/window_step are not defined for windows of fixed length
+            window_size, window_step = None, None
         config = {
             "window_size": window_size,
             "window_step": window_step,
+            "window_bp": window_bp,
+            "step_bp": step_bp,
+            "min_blocks": min_blocks,
             "sample_sets": "X",
+            "blocks_key": blocks_key,
+            "layout": layout,
+            "processes": processes,
         }
-        if not self.has_stage("blocks"):
+        if not self._has_blocks(blocks_key):
             sys.exit(
-                "[X] Gimble store %r has no blocks. Please run 'gimble blocks'." % self.path
+                "[X] Gimble store %r has no (complete) blocks %r. Please run 'gimble blocks'." % (self.path, blocks_key)
             )
+        config["max_missing"], config["max_multiallelic"], _ = self._get_block_filter(
+            max_missing, max_multiallelic, blocks_key
+        )
         if self.has_stage("windows"):
             if not overwrite:
                 sys.exit(
@@ -3422,25 +4514,41 @@ class Store(object):
             if sample_set is None:
                 return (np.array(self.data[start_key]), np.array(self.data[end_key]))
             meta_seqs = self._get_meta("seqs")
-            try:
-                sample_set_key = np.array(
-                    [
-                        meta_seqs["intervals_idx_by_sample"][sample]
-                        for sample in sample_set
-                    ]
-                )
-            except KeyError:
-                sys.exit(
-                    "_get_interval_coordinates: sample_set %s not found in store. Existing samples: %s"
-                    % (sample_set, list(meta_seqs["intervals_idx_by_sample"].keys()))
-                )
-            mask = np.all(np.array(self.data[matrix_key])[:, sample_set_key], axis=1)
+            mask = get_interval_mask(
+                np.array(self.data[matrix_key]),
+                meta_seqs["intervals_idx_by_sample"],
+                sample_set,
+                packed=meta_seqs.get("intervals_packed", False),
+            )
             return (
                 np.array(self.data[start_key])[mask],
                 np.array(self.data[end_key])[mask],
             )
         return (None, None)
 
+    def _get_sequence_working_set(self, seq_name, meta_seqs):
+        """Loads intervals, sample index maps and variants of a sequence once, so that
+        they can be reused for all sample sets of that sequence (see _make_blocks)."""
+        working_set = {
+            "intervals_idx_by_sample": dict(meta_seqs["intervals_idx_by_sample"]),
+            "intervals_packed": meta_seqs.get("intervals_packed", False),
+            "variants_idx_by_sample": dict(meta_seqs.get("variants_idx_by_sample", {})),
+            "interval_matrix": None,
+            "interval_starts": None,
+            "interval_ends": None,
+        }
+        matrix_key = "seqs/%s/intervals/matrix" % seq_name
+        if matrix_key in self.data:
+            working_set["interval_matrix"] = np.array(self.data[matrix_key])
+            working_set["interval_starts"] = np.array(
+                self.data["seqs/%s/intervals/starts" % seq_name]
+            )
+            working_set["interval_ends"] = np.array(
+                self.data["seqs/%s/intervals/ends" % seq_name]
+            )
+        working_set["pos"], working_set["gt_matrix"] = self._get_variants(seq_name)
+        return working_set
+
     def _get_variants(self, seq_name):
         pos_key = "seqs/%s/variants/pos" % (seq_name)
         gt_key = "seqs/%s/variants/matrix" % (seq_name)
@@ -3460,111 +4568,355 @@ class Store(object):
             )  # check whether they are the same length ...
         return (pos, gt_matrix)
 
-    def _make_blocks(self, config):
+    def _make_blocks(self, configs):
+        """Makes blocks of all blocks datasets (one config each, see _get_blocks_config) in one pass.
+        Configs have to share sample sets, layout and processes."""
         meta_seqs = self._get_meta("seqs")
+        seq_names, sample_set_idxs = meta_seqs["seq_names"], configs[0]["sample_set_idxs"]
+        # parent groups have to exist before sequences are blocked in parallel
+        for config in configs:
+            self.data.require_group(config["blocks_key"])
+        make_blocks_jobs = [(self.path, seq_name, configs) for seq_name in seq_names]
         with tqdm(
-            total=(len(meta_seqs["seq_names"]) * len(meta_seqs["sample_sets"])),
+            total=(len(seq_names) * len(sample_set_idxs)),
             desc="[%] Making pair-blocks",
             ncols=100,
             unit_scale=True,
         ) as pbar:
-            for seq_name in meta_seqs["seq_names"]:
-                pos, gt_matrix = self._get_variants(seq_name)  # arrays or None
-                for sample_set_idx, sample_set in enumerate(meta_seqs["sample_sets"]):
-                    # get BED starts/ends from store
-                    intervals = self._get_interval_coordinates(
-                        seq_name=seq_name, sample_set=sample_set
-                    )
-                    # turn BED starts/ends into sites-array
-                    sites = intervals_to_sites(intervals)
-                    # turn sites-array into 2D np.array with block sites (or None)
-                    block_sites = sites_to_blocks(
-                        sites, config["block_length"], config["block_span"], sample_set
-                    )
-                    if block_sites is not None:
-                        # subset gts of sample_set from gt_matrix (or None)
-                        gts = subset_gt_matrix(
-                            meta_seqs,
-                            sample_set,
-                            np.isin(pos, block_sites, assume_unique=True),
-                            gt_matrix,
-                        )
-                        # get block arrays
-                        (
-                            starts,
-                            ends,
-                            multiallelic,
-                            missing,
-                            monomorphic,
-                            variation,
-                        ) = blocks_to_arrays(block_sites, gts, pos)
-                        # save block arrays
-                        blocks_raw, blocks_valid = self._set_blocks(
-                            seq_name,
-                            sample_set_idx,
-                            starts,
-                            ends,
-                            multiallelic,
-                            missing,
-                            monomorphic,
-                            variation,
-                            config["block_max_missing"],
-                            config["block_max_multiallelic"],
-                        )
-                        # record counts
-                        config["blocks_raw_by_sample_set_idx"][
-                            sample_set_idx
-                        ] += blocks_raw
-                        config["blocks_by_sample_set_idx"][
-                            sample_set_idx
-                        ] += blocks_valid
-                        config["blocks_by_sequence"][seq_name] += blocks_valid
-                    pbar.update(1)
-        config["count_total"] = sum(
-            [count for count in config["blocks_by_sample_set_idx"].values()]
+            make_blocks_results = []
+            if configs[0]["processes"] > 1:
+                with poolcontext(processes=configs[0]["processes"]) as pool:
+                    for make_blocks_result in pool.imap_unordered(
+                        make_blocks_call, make_blocks_jobs
+                    ):
+                        make_blocks_results.append(make_blocks_result)
+                        pbar.update(len(sample_set_idxs))
+            else:
+                # workers (and their stores) are only needed by pool
+                for seq_name in seq_names:
+                    make_blocks_results.append(self._make_sequence_blocks(seq_name, configs))
+                    pbar.update(len(sample_set_idxs))
+        # counts are read from checkpoints on disk, i.e. they include blocks of resumed runs
+        for config in configs:
+            self._invalidate_meta(config["blocks_key"])
+            for seq_name in seq_names:
+                checkpoint = self._get_sequence_blocks_checkpoint(seq_name, config["blocks_key"])
+                for sample_set_idx in config["sample_set_idxs"]:
+                    if not str(sample_set_idx) in checkpoint["count_by_sample_set_idx"]:
+                        continue  # no blocks of sample set on sequence
+                    blocks_raw = checkpoint["count_raw_by_sample_set_idx"][str(sample_set_idx)]
+                    blocks_valid = checkpoint["count_by_sample_set_idx"][str(sample_set_idx)]
+                    config["blocks_raw_by_sample_set_idx"][sample_set_idx] += blocks_raw
+                    config["blocks_by_sample_set_idx"][sample_set_idx] += blocks_valid
+                    config["blocks_by_sequence"][seq_name] += blocks_valid
+                    config["blocks_raw_by_sequence"][seq_name] += blocks_raw
+        for config in configs:
+            config["count_total"] = sum(
+                [count for count in config["blocks_by_sample_set_idx"].values()]
+            )
+            config["count_total_raw"] = sum(
+                [count for count in config["blocks_raw_by_sample_set_idx"].values()]
+            )
+        return configs
+
+    def _get_sequence_blocks_checkpoint(self, seq_name, blocks_key="blocks"):
+        """Returns checkpoint of blocks of a sequence: sample sets that have been blocked and their
+        counts of blocks (keys are strings), read from '<blocks_key>/<seq_name>' (bypassing meta cache
+        since sequences are blocked by other processes)"""
+        checkpoint = {
+            "sample_set_idxs": [],
+            "count_raw_by_sample_set_idx": {},
+            "count_by_sample_set_idx": {},
+        }
+        seq_key = "%s/%s" % (blocks_key, seq_name)
+        if self._has_key(seq_key):
+            checkpoint.update(self.data[seq_key].attrs.asdict().get("checkpoint", {}))
+        return checkpoint
+
+    def _make_sequence_blocks(self, seq_name, configs):
+        """Makes and saves blocks of sample sets (config['sample_set_idxs']) of a sequence for each
+        blocks dataset (config), records each sample set in checkpoint of sequence once its blocks are saved
+        (see _get_sequence_blocks_checkpoint).
+        Sample sets that are in the checkpoint already (i.e. of interrupted runs) are skipped.
+
+        Intervals/variants are read and mutypes computed once for all blocks datasets.
+        Touches only '<blocks_key>/<seq_name>', which allows sequences to be processed in parallel
+        (see make_blocks_call)."""
+        meta_seqs = self._get_meta("seqs")
+        sample_sets = meta_seqs["sample_sets"]
+        checkpoints = [
+            self._get_sequence_blocks_checkpoint(seq_name, config["blocks_key"]) for config in configs
+        ]
+        pending_sample_set_idxs_by_config = [
+            set(
+                sample_set_idx
+                for sample_set_idx in config["sample_set_idxs"]
+                if not str(sample_set_idx) in checkpoint["sample_set_idxs"]
+            )
+            for config, checkpoint in zip(configs, checkpoints)
+        ]
+        for config, pending_sample_set_idxs in zip(configs, pending_sample_set_idxs_by_config):
+            bounds_key = "%s/%s/bounds" % (config["blocks_key"], seq_name)
+            if config["layout"] == "table" and pending_sample_set_idxs and self._has_key(bounds_key):
+                # rows of sample sets that are not in checkpoint (i.e. of interrupted runs) are overwritten
+                bounds = np.array(self.data[bounds_key])
+                bounds[sorted(pending_sample_set_idxs)] = 0
+                self.data[bounds_key][:] = bounds
+        # sample sets of a class (X, A, B) are blocked in turn, i.e. their blocks are contiguous
+        # in layout 'table' (see _read_blocks_arrays)
+        sample_set_idxs = sorted(
+            set.union(*pending_sample_set_idxs_by_config),
+            key=lambda idx: (
+                not meta_seqs["sample_sets_inter"][idx],
+                not meta_seqs["sample_sets_intra_A"][idx],
+                idx,
+            ),
         )
-        config["count_total_raw"] = sum(
-            [count for count in config["blocks_raw_by_sample_set_idx"].values()]
+        if not sample_set_idxs:
+            return
+        # intervals/variants are read once per sequence and released afterwards
+        working_set = self._get_sequence_working_set(seq_name, meta_seqs)
+        pos, gt_matrix = working_set["pos"], working_set["gt_matrix"]  # arrays or None
+        # mutypes of sample sets (sites x sample sets) are computed once
+        mutypes = (
+            gt_matrix_to_mutypes(
+                gt_matrix,
+                [
+                    [
+                        working_set["variants_idx_by_sample"][sample]
+                        for sample in sample_sets[sample_set_idx]
+                    ]
+                    for sample_set_idx in sample_set_idxs
+                ],
+            )
+            if gt_matrix is not None
+            else None
         )
-        return config
+        for mutypes_idx, sample_set_idx in enumerate(sample_set_idxs):
+            sample_set = sample_sets[sample_set_idx]
+            # get BED starts/ends of sample_set from working set
+            intervals = get_working_set_intervals(working_set, sample_set)
+            for config, checkpoint, pending_sample_set_idxs in zip(
+                configs, checkpoints, pending_sample_set_idxs_by_config
+            ):
+                if not sample_set_idx in pending_sample_set_idxs:
+                    continue
+                # turn BED starts/ends into BED starts/ends of blocks (or None)
+                block_coordinates = intervals_to_blocks(
+                    intervals, config["block_length"], config["block_span"]
+                )
+                if block_coordinates is None:
+                    self._set_sequence_blocks_checkpoint(seq_name, sample_set_idx, checkpoint, config["blocks_key"])
+                    continue
+                block_starts, block_ends = block_coordinates
+                # block of each variant (-1 if not in block)
+                block_idxs = pos_to_block_idxs(pos, intervals, block_starts, block_ends)
+                variant_mask = block_idxs >= 0
+                # get block arrays
+                (
+                    starts,
+                    ends,
+                    multiallelic,
+                    missing,
+                    monomorphic,
+                    variation,
+                ) = block_coordinates_to_arrays(
+                    block_starts,
+                    block_ends,
+                    config["block_length"],
+                    mutypes[variant_mask, mutypes_idx] if mutypes is not None else None,
+                    block_idxs[variant_mask],
+                )
+                # filter block arrays
+                blocks, blocks_raw, blocks_valid = filter_blocks(
+                    starts,
+                    ends,
+                    multiallelic,
+                    missing,
+                    variation,
+                    config["block_max_missing"],
+                    config["block_max_multiallelic"],
+                )
+                if config["defer_filter"]:  # all blocks are saved
+                    blocks = {
+                        "starts": starts,
+                        "ends": ends,
+                        "variation": variation,
+                        "missing": missing,
+                        "multiallelic": multiallelic,
+                    }
+                # blocks are saved as soon as they are made (i.e. only blocks of one sample set are in memory)
+                self._set_blocks(
+                    seq_name,
+                    sample_set_idx,
+                    blocks,
+                    len(sample_sets),
+                    config["layout"],
+                    config["blocks_key"],
+                )
+                # record counts, checkpoint is saved after blocks (i.e. sample set is only skipped once its blocks are saved)
+                checkpoint["count_raw_by_sample_set_idx"][str(sample_set_idx)] = blocks_raw
+                checkpoint["count_by_sample_set_idx"][str(sample_set_idx)] = blocks_valid
+                self._set_sequence_blocks_checkpoint(seq_name, sample_set_idx, checkpoint, config["blocks_key"])
+
+    def _set_sequence_blocks_checkpoint(self, seq_name, sample_set_idx, checkpoint, blocks_key="blocks"):
+        """Records sample set as blocked in checkpoint of sequence and saves checkpoint
+        (see _get_sequence_blocks_checkpoint)"""
+        checkpoint["sample_set_idxs"] = sorted(
+            set(checkpoint["sample_set_idxs"]) | set([str(sample_set_idx)]), key=int
+        )
+        self.data.require_group("%s/%s" % (blocks_key, seq_name)).attrs["checkpoint"] = checkpoint
 
     def _set_blocks(
         self,
         seq_name,
         sample_set_idx,
-        starts,
-        ends,
-        multiallelic,
-        missing,
-        monomorphic,
-        variation,
-        block_max_missing,
-        block_max_multiallelic,
+        blocks,
+        sample_set_count,
+        layout="arrays",
+        blocks_key="blocks",
     ):
-        valid = (
-            np.less_equal(missing, block_max_missing)
-            & np.less_equal(multiallelic, block_max_multiallelic)
-        ).flatten()
-        blocks_starts_key = "blocks/%s/%s/starts" % (seq_name, sample_set_idx)
-        self.data.create_dataset(blocks_starts_key, data=starts[valid], overwrite=True)
-        blocks_ends_key = "blocks/%s/%s/ends" % (seq_name, sample_set_idx)
-        self.data.create_dataset(blocks_ends_key, data=ends[valid], overwrite=True)
-        blocks_variation_key = "blocks/%s/%s/variation" % (seq_name, sample_set_idx)
-        self.data.create_dataset(
-            blocks_variation_key, data=variation[valid], overwrite=True
+        """Saves blocks of a sample set of a sequence, blocks: {field: array}
+
+        'arrays' : one array per field in '<blocks_key>/<seq>/<sample_set_idx>/<field>'
+        'table'  : one array per field in '<blocks_key>/<seq>/<field>' to which blocks of sample sets are
+                   appended as they are saved, rows of sample_set_idx i are bounds[i, 0]:bounds[i, 1]
+                   of '<blocks_key>/<seq>/bounds'
+        """
+        if layout == "table":
+            bounds_key = "%s/%s/bounds" % (blocks_key, seq_name)
+            bounds = (
+                np.array(self.data[bounds_key])
+                if self._has_key(bounds_key)
+                else np.zeros((sample_set_count, 2), dtype=np.int64)
+            )
+            # rows beyond the last bounds (i.e. of interrupted runs) are overwritten
+            offset = int(np.max(bounds[:, 1]))
+            count = blocks["starts"].shape[0]
+            for field in BLOCKS_FIELDS:
+                key = "%s/%s/%s" % (blocks_key, seq_name, field)
+                if self._has_key(key):
+                    table = self.data[key]
+                    table.resize((offset + count,) + table.shape[1:])
+                    table[offset:] = blocks[field]
+                else:
+                    self.data.create_dataset(
+                        key,
+                        data=blocks[field],
+                        chunks=(BLOCKS_TABLE_CHUNKSIZE,) + blocks[field].shape[1:],
+                    )
+            bounds[sample_set_idx] = [offset, offset + count]
+            self.data.create_dataset(bounds_key, data=bounds, overwrite=True)
+        else:
+            for field in BLOCKS_FIELDS:
+                self.data.create_dataset(
+                    "%s/%s/%s/%s" % (blocks_key, seq_name, sample_set_idx, field),
+                    data=blocks[field],
+                    overwrite=True,
+                )
+
+    def _get_block_filter(self, max_missing=None, max_multiallelic=None, blocks_key="blocks"):
+        """Returns (max_missing, max_multiallelic, masked) of blocks that are read.
+
+        Thresholds default to those of 'gimble blocks'. masked is True if saved blocks have
+        to be masked, i.e. if filtering was deferred or thresholds are stricter. Thresholds
+        can only be more lenient than those of 'gimble blocks' if filtering was deferred."""
+        meta_blocks = self._get_meta(blocks_key)
+        max_missing = meta_blocks["max_missing"] if max_missing is None else max_missing
+        max_multiallelic = (
+            meta_blocks["max_multiallelic"] if max_multiallelic is None else max_multiallelic
         )
-        blocks_missing_key = "blocks/%s/%s/missing" % (seq_name, sample_set_idx)
-        self.data.create_dataset(
-            blocks_missing_key, data=missing[valid], overwrite=True
+        filter_deferred = meta_blocks.get("filter_deferred", False)
+        if not filter_deferred and (
+            max_missing > meta_blocks["max_missing"]
+            or max_multiallelic > meta_blocks["max_multiallelic"]
+        ):
+            sys.exit(
+                "[X] Blocks were saved with max_missing=%s and max_multiallelic=%s. Please run 'gimble blocks --defer_filter' to use higher thresholds."
+                % (meta_blocks["max_missing"], meta_blocks["max_multiallelic"])
+            )
+        masked = (
+            filter_deferred
+            or max_missing < meta_blocks["max_missing"]
+            or max_multiallelic < meta_blocks["max_multiallelic"]
         )
-        blocks_multiallelic_key = "blocks/%s/%s/multiallelic" % (
-            seq_name,
-            sample_set_idx,
+        return (max_missing, max_multiallelic, masked)
+
+    def _get_blocks_arrays(
+        self,
+        field,
+        sequences,
+        sample_set_idxs,
+        max_missing=None,
+        max_multiallelic=None,
+        blocks_key="blocks",
+    ):
+        """Returns list of (seq_name, sample_set_idx, array) of block field (one of BLOCKS_FIELDS)
+        in order of itertools.product(sequences, sample_set_idxs), for those for which blocks
+        were saved. Only blocks passing max_missing/max_multiallelic (see _get_block_filter)
+        are returned."""
+        arrays = self._read_blocks_arrays(field, sequences, sample_set_idxs, blocks_key)
+        max_missing, max_multiallelic, masked = self._get_block_filter(
+            max_missing, max_multiallelic, blocks_key
         )
-        self.data.create_dataset(
-            blocks_multiallelic_key, data=multiallelic[valid], overwrite=True
+        if not masked:
+            return arrays
+        missings = self._read_blocks_arrays("missing", sequences, sample_set_idxs, blocks_key)
+        multiallelics = self._read_blocks_arrays(
+            "multiallelic", sequences, sample_set_idxs, blocks_key
         )
-        return (valid.shape[0], valid[valid == True].shape[0])
+        return [
+            (
+                seq_name,
+                sample_set_idx,
+                np.array(array)[
+                    (
+                        np.less_equal(missing, max_missing)
+                        & np.less_equal(multiallelic, max_multiallelic)
+                    ).flatten()
+                ],
+            )
+            for (seq_name, sample_set_idx, array), (_, _, missing), (_, _, multiallelic) in zip(
+                arrays, missings, multiallelics
+            )
+        ]
+
+    def _read_blocks_arrays(self, field, sequences, sample_set_idxs, blocks_key="blocks"):
+        """Returns list of (seq_name, sample_set_idx, array) of block field (one of BLOCKS_FIELDS)
+        in order of itertools.product(sequences, sample_set_idxs), for those for which blocks
+        were saved. Access layer for all blocks layouts."""
+        meta_blocks = self._get_meta(blocks_key)
+        layout = meta_blocks.get("layout", "arrays") if meta_blocks else "arrays"
+        arrays = []
+        for seq_name in sequences:
+            if layout == "table":
+                bounds_key = "%s/%s/bounds" % (blocks_key, seq_name)
+                if not self._has_key(bounds_key) or not len(sample_set_idxs):
+                    continue
+                bounds = np.array(self.data[bounds_key])
+                table = self.data["%s/%s/%s" % (blocks_key, seq_name, field)]
+                idxs = [int(sample_set_idx) for sample_set_idx in sample_set_idxs]
+                blocked_idxs = [idx for idx in idxs if bounds[idx, 1] > bounds[idx, 0]]
+                lower = min([bounds[idx, 0] for idx in blocked_idxs], default=0)
+                upper = max([bounds[idx, 1] for idx in blocked_idxs], default=0)
+                if sum(bounds[idx, 1] - bounds[idx, 0] for idx in blocked_idxs) == upper - lower:
+                    # single contiguous read (blocks of a class of sample sets are contiguous)
+                    rows = table[lower:upper]
+                    for sample_set_idx, idx in zip(sample_set_idxs, idxs):
+                        rows_lower = max(bounds[idx, 0] - lower, 0)
+                        rows_upper = max(bounds[idx, 1] - lower, rows_lower)
+                        arrays.append((seq_name, sample_set_idx, rows[rows_lower:rows_upper]))
+                else:
+                    for sample_set_idx, idx in zip(sample_set_idxs, idxs):
+                        arrays.append(
+                            (seq_name, sample_set_idx, table[bounds[idx, 0] : bounds[idx, 1]])
+                        )
+            else:
+                for sample_set_idx in sample_set_idxs:
+                    key = "%s/%s/%s/%s" % (blocks_key, seq_name, sample_set_idx, field)
+                    if self._has_key(key):
+                        arrays.append((seq_name, sample_set_idx, self.data[key]))
+        return arrays
 
     # def _set_blocks_meta(self, block_length, block_span, block_max_missing, block_max_multiallelic,
     #        blocks_raw_by_sample_set_idx, blocks_by_sample_set_idx, blocks_by_sequence):
@@ -3583,153 +4935,501 @@ class Store(object):
     #    meta_blocks['count_total_raw'] = sum([count for count in blocks_raw_by_sample_set_idx.values()])
     #    print('meta_blocks', type(meta_blocks), dict(meta_blocks))
 
-    def _get_block_coordinates(self, sample_sets=None, sequences=None):
+    def _require_blocks(self, sample_sets=None, blocks_key="blocks"):
+        """Makes blocks of those classes of sample sets (query of _get_sample_set_idxs) that
+        have not been made by 'gimble blocks --sample_sets', using the parameters of the blocks
+        that have been made."""
+        meta_blocks = self._get_meta(blocks_key)
+        if not meta_blocks or not "sample_sets" in meta_blocks:
+            return  # no blocks or blocks made before '--sample_sets' (i.e. of all sample sets)
+        missing_sample_sets = [
+            sample_set
+            for sample_set in (BLOCKS_SAMPLE_SETS if sample_sets is None else [sample_sets])
+            if not sample_set in meta_blocks["sample_sets"]
+        ]
+        if not missing_sample_sets:
+            return
+        if self.read_only:
+            sys.exit(
+                "[X] Gimble store %r has no blocks of sample sets %s. Please run 'gimble blocks --sample_sets all -f'."
+                % (self.path, ", ".join(missing_sample_sets))
+            )
+        print(
+            "[+] Making blocks of sample sets %s (not made by 'gimble blocks') ..."
+            % ", ".join(missing_sample_sets)
+        )
+        config = self._get_blocks_config(
+            meta_blocks["length"],
+            meta_blocks["span"],
+            meta_blocks["max_multiallelic"],
+            meta_blocks["max_missing"],
+            False,
+            meta_blocks["layout"],
+            1,
+            missing_sample_sets,
+            meta_blocks.get("max_pairs", None),
+            meta_blocks.get("seed", 19),
+            meta_blocks.get("stratified", False),
+            meta_blocks.get("filter_deferred", False),
+            blocks_key,
+        )
+        config = self._make_blocks([config])[0]
+        meta = dict(meta_blocks)
+        meta["sample_sets"] = [
+            sample_set
+            for sample_set in BLOCKS_SAMPLE_SETS
+            if sample_set in meta_blocks["sample_sets"] or sample_set in missing_sample_sets
+        ]
+        for meta_key, config_key in [
+            ("count_by_sample_set_idx", "blocks_by_sample_set_idx"),
+            ("count_by_sequence", "blocks_by_sequence"),
+            ("count_raw_by_sample_set_idx", "blocks_raw_by_sample_set_idx"),
+            ("count_raw_by_sequence", "blocks_raw_by_sequence"),
+        ]:
+            counter = collections.Counter(meta_blocks.get(meta_key, {}))
+            counter.update({str(k): v for k, v in config[config_key].items()})
+            meta[meta_key] = dict(counter)  # keys are strings
+        if "sample_set_idxs" in meta_blocks:
+            meta["sample_set_idxs"] = meta_blocks["sample_set_idxs"] + [
+                str(idx) for idx in config["sample_set_idxs"]
+            ]
+        meta["count_total"] = meta_blocks["count_total"] + config["count_total"]
+        meta["count_total_raw"] = meta_blocks["count_total_raw"] + config["count_total_raw"]
+        self._set_meta(blocks_key, meta=meta)
+        if "X" in missing_sample_sets:
+            self._set_blocks_raw_tally(blocks_key)
+
+    def _get_block_coordinates(
+        self,
+        sample_sets=None,
+        sequences=None,
+        max_missing=None,
+        max_multiallelic=None,
+        blocks_key="blocks",
+    ):
+        self._require_blocks(sample_sets, blocks_key)
         sequences = self._validate_seq_names(sequences)
-        sample_set_idxs = self._get_sample_set_idxs(query=sample_sets)
-        keys_start_end = [
-            (
-                "blocks/%s/%s/starts" % (seq_name, sample_set_idx),
-                "blocks/%s/%s/ends" % (seq_name, sample_set_idx),
+        sample_set_idxs = self._get_sample_set_idxs(query=sample_sets, blocks_key=blocks_key)
+        block_starts = [
+            np.array(starts, dtype=np.int64)
+            for _, _, starts in self._get_blocks_arrays(
+                "starts", sequences, sample_set_idxs, max_missing, max_multiallelic, blocks_key
             )
-            for seq_name, sample_set_idx in list(
-                itertools.product(sequences, sample_set_idxs)
+        ]
+        block_ends = [
+            np.array(ends, dtype=np.int64)
+            for _, _, ends in self._get_blocks_arrays(
+                "ends", sequences, sample_set_idxs, max_missing, max_multiallelic, blocks_key
             )
         ]
-        block_starts, block_ends = [], []
-        for start_key, end_key in keys_start_end:
-            block_starts.append(np.array(self.data[start_key], dtype=np.int64))
-            block_ends.append(np.array(self.data[end_key], dtype=np.int64))
         block_start = np.concatenate(block_starts, axis=0)
         block_end = np.concatenate(block_ends, axis=0)
         return (block_start, block_end)
 
-    def _get_block_sample_set_idxs(self, sample_sets=None, sequences=None):
+    def _get_block_sample_set_idxs(
+        self,
+        sample_sets=None,
+        sequences=None,
+        max_missing=None,
+        max_multiallelic=None,
+        blocks_key="blocks",
+    ):
+        self._require_blocks(sample_sets, blocks_key)
         sequences = self._validate_seq_names(sequences)
-        sample_set_idxs = self._get_sample_set_idxs(query=sample_sets)
-        key_by_sample_set_idx = {
-            sample_set_idx: "blocks/%s/%s/starts" % (seq_name, sample_set_idx)
-            for seq_name, sample_set_idx in list(
-                itertools.product(sequences, sample_set_idxs)
-            )
-        }
-        block_sample_set_idxs = []
-        for sample_set_idx, key in key_by_sample_set_idx.items():
-            block_sample_set_idxs.append(
-                np.full(self.data[key].shape[0], int(sample_set_idx))
+        sample_set_idxs = self._get_sample_set_idxs(query=sample_sets, blocks_key=blocks_key)
+        block_sample_set_idxs = [
+            np.full(starts.shape[0], int(sample_set_idx))
+            for _, sample_set_idx, starts in self._get_blocks_arrays(
+                "starts", sequences, sample_set_idxs, max_missing, max_multiallelic, blocks_key
             )
+        ]
         block_sample_set_idxs = np.concatenate(block_sample_set_idxs, axis=0)
         return block_sample_set_idxs
 
     def _make_windows(self, config):
         ### meta_seqs['seq_names'] => order
-        meta_blocks = self._get_meta("blocks")
+        self._require_blocks(config["sample_sets"], config["blocks_key"])
+        meta_blocks = self._get_meta(config["blocks_key"])
         if not meta_blocks:
             sys.exit("[X] No blocks found.")
         meta_seqs = self._get_meta("seqs")
         sample_set_idxs = np.array(
-            self._get_sample_set_idxs(query=config["sample_sets"]), dtype=np.int64
+            self._get_sample_set_idxs(
+                query=config["sample_sets"], blocks_key=config["blocks_key"]
+            ),
+            dtype=np.int64,
+        )
+        # if filtering was deferred, blocks that pass filters of windows are not counted
+        count_by_sequence_key = (
+            "count_raw_by_sequence"
+            if meta_blocks.get("filter_deferred", False)
+            else "count_by_sequence"
         )
+        # blocks needed by a window
+        min_blocks = config["window_size"] if config["window_bp"] is None else config["min_blocks"]
+        sequence_length_by_seq_name = dict(zip(meta_seqs["seq_names"], meta_seqs["seq_lengths"]))
         blockable_seqs, unblockable_seqs = [], []
         for seq_name in meta_seqs["seq_names"]:
             # problem here is that meta_blocks["count_by_sequence"] contains ALL blocks ... 
             # should contain only blocks from inter-pop sample-sets
-            if meta_blocks["count_by_sequence"].get(seq_name, 0) >= config["window_size"]:
+            if meta_blocks[count_by_sequence_key].get(seq_name, 0) >= min_blocks:
                 blockable_seqs.append(seq_name)
             else:
                 unblockable_seqs.append(seq_name)
         if not blockable_seqs:
             sys.exit(
                 "[X] Not enough blocks to make windows of this size (%s)."
-                % (config["window_size"])
+                % (min_blocks)
             )
         print(
             "[+] Making windows along %s sequences (%s sequences excluded)"
             % (len(blockable_seqs), len(unblockable_seqs))
         )
-        for seq_name in tqdm(
-            blockable_seqs, total=len(blockable_seqs), desc="[%] Progress", ncols=100,
-        ):
-            block_sample_set_idxs = self._get_block_sample_set_idxs(
-                sample_sets=config["sample_sets"], sequences=[seq_name]
-            )
-            if block_sample_set_idxs.size >= config["window_size"]:
-
-                block_variation = self._get_variation(
-                    data_type="blocks",
-                    sample_sets=config["sample_sets"],
-                    sequences=[seq_name],
-                )
-                block_starts, block_ends = self._get_block_coordinates(
-                    sample_sets=config["sample_sets"], sequences=[seq_name]
-                )
-                windows = blocks_to_windows(
-                    sample_set_idxs,
-                    block_variation,
-                    block_starts,
-                    block_ends,
-                    block_sample_set_idxs,
-                    config["window_size"],
-                    config["window_step"],
-                )
-                (
-                    window_variation,
-                    window_starts,
-                    window_ends,
-                    window_pos_mean,
-                    window_pos_median,
-                    balance,
-                    mse_sample_set_cov,
-                ) = windows
-                config["window_count"] += self._set_windows(
-                    seq_name,
-                    window_variation,
-                    window_starts,
-                    window_ends,
-                    window_pos_mean,
-                    window_pos_median,
-                    balance,
-                    mse_sample_set_cov,
-                )
+        # parent group has to exist before sequences are windowed in parallel
+        self.data.require_group(config["windows_key"])
+        make_windows_jobs = [
+            (self.path, seq_name, sequence_length_by_seq_name[seq_name], sample_set_idxs, config)
+            for seq_name in blockable_seqs
+        ]
+        with tqdm(
+            total=len(blockable_seqs), desc="[%] Progress", ncols=100,
+        ) as pbar:
+            if config["processes"] > 1:
+                with poolcontext(processes=config["processes"]) as pool:
+                    for window_count in pool.imap_unordered(
+                        make_windows_call, make_windows_jobs
+                    ):
+                        config["window_count"] += window_count
+                        pbar.update(1)
+            else:
+                # workers (and their stores) are only needed by pool
+                for seq_name in blockable_seqs:
+                    config["window_count"] += self._make_sequence_windows(
+                        seq_name, sequence_length_by_seq_name[seq_name], sample_set_idxs, config
+                    )
+                    pbar.update(1)
         print(
             "[+] Made %s window(s)." % format_count(config["window_count"])
         )
         return config
 
-    def _set_windows(
+    def _make_sequence_windows(self, seq_name, sequence_length, sample_set_idxs, config):
+        """Makes and saves windows of a sequence, returns count of windows. Blocks of the sequence
+        are read once (see _get_sequence_blocks). Touches only 'windows/<seq_name>', which allows
+        sequences to be processed in parallel (see make_windows_call)."""
+        min_blocks = config["window_size"] if config["window_bp"] is None else config["min_blocks"]
+        fields = ["starts", "ends"] if config["layout"] == "index" else ["starts", "ends", "variation"]
+        block_sample_set_idxs, blocks = self._get_sequence_blocks(
+            seq_name,
+            fields,
+            sample_set_idxs,
+            config["max_missing"],
+            config["max_multiallelic"],
+            config["blocks_key"],
+        )
+        if block_sample_set_idxs.size < min_blocks:
+            return 0
+        block_starts, block_ends = blocks["starts"], blocks["ends"]
+        if config["window_bp"] is not None:
+            order, bounds, window_starts, window_ends = blocks_to_bp_window_index(
+                block_ends,
+                sequence_length,
+                config["window_bp"],
+                config["step_bp"],
+                config["min_blocks"],
+            )
+            if bounds.shape[0] == 0:
+                return 0
+            windows = {"order": order, "bounds": bounds}
+            window_stats = window_index_to_stats(
+                sample_set_idxs,
+                block_starts,
+                block_ends,
+                block_sample_set_idxs,
+                order,
+                bounds,
+            )
+            # windows of fixed length are described by their coordinates (not those of their blocks)
+            window_stats = (window_starts, window_ends) + window_stats[2:]
+        elif config["layout"] == "index":
+            # only order of blocks and bounds of windows are saved (see _get_window_index_variation)
+            order, bounds = blocks_to_window_index(
+                block_ends, config["window_size"], config["window_step"]
+            )
+            windows = {"order": order, "bounds": bounds}
+            window_stats = window_index_to_stats(
+                sample_set_idxs,
+                block_starts,
+                block_ends,
+                block_sample_set_idxs,
+                order,
+                bounds,
+            )
+        else:
+            window_variation, *window_stats = blocks_to_windows(
+                sample_set_idxs,
+                blocks["variation"],
+                block_starts,
+                block_ends,
+                block_sample_set_idxs,
+                config["window_size"],
+                config["window_step"],
+            )
+            windows = {"variation": window_variation}
+        windows.update(zip(WINDOWS_STATS, window_stats))
+        return self._set_windows(seq_name, windows)
+
+    def _get_sequence_blocks(
         self,
         seq_name,
-        window_variation,
-        window_starts,
-        window_ends,
-        window_pos_mean,
-        window_pos_median,
-        balance,
-        mse_sample_set_cov,
+        fields,
+        sample_set_idxs,
+        max_missing=None,
+        max_multiallelic=None,
+        blocks_key="blocks",
     ):
-        self.data.create_dataset(
-            "windows/%s/variation" % seq_name, data=window_variation, overwrite=True
-        )
-        self.data.create_dataset(
-            "windows/%s/starts" % seq_name, data=window_starts, overwrite=True
+        """Returns (block_sample_set_idxs, {field: array}) of blocks of a sequence, concatenated
+        over sample sets as by _get_block_sample_set_idxs, _get_block_coordinates and _get_variation.
+        Each field (and the filter of blocks, see _get_block_filter) is read once."""
+        max_missing, max_multiallelic, masked = self._get_block_filter(
+            max_missing, max_multiallelic, blocks_key
         )
-        self.data.create_dataset(
-            "windows/%s/ends" % seq_name, data=window_ends, overwrite=True
-        )
-        self.data.create_dataset(
-            "windows/%s/pos_mean" % seq_name, data=window_pos_mean, overwrite=True
-        )
-        self.data.create_dataset(
-            "windows/%s/pos_median" % seq_name, data=window_pos_median, overwrite=True
+        masks = None
+        if masked:
+            masks = [
+                (np.less_equal(missing, max_missing) & np.less_equal(multiallelic, max_multiallelic)).flatten()
+                for (_, _, missing), (_, _, multiallelic) in zip(
+                    self._read_blocks_arrays("missing", [seq_name], sample_set_idxs, blocks_key),
+                    self._read_blocks_arrays("multiallelic", [seq_name], sample_set_idxs, blocks_key),
+                )
+            ]
+        blocks, block_sample_set_idxs = {}, None
+        for field in fields:
+            arrays = self._read_blocks_arrays(field, [seq_name], sample_set_idxs, blocks_key)
+            if not arrays:
+                return (np.zeros(0, dtype=np.int64), {})
+            if masks is None:
+                arrays = [(sample_set_idx, np.array(array)) for _, sample_set_idx, array in arrays]
+            else:
+                arrays = [
+                    (sample_set_idx, np.array(array)[mask])
+                    for (_, sample_set_idx, array), mask in zip(arrays, masks)
+                ]
+            if field in ["starts", "ends"]:
+                arrays = [(sample_set_idx, array.astype(np.int64)) for sample_set_idx, array in arrays]
+            blocks[field] = np.concatenate([array for _, array in arrays], axis=0)
+            if block_sample_set_idxs is None:
+                block_sample_set_idxs = np.concatenate(
+                    [np.full(array.shape[0], int(sample_set_idx)) for sample_set_idx, array in arrays],
+                    axis=0,
+                )
+        return (block_sample_set_idxs, blocks)
+
+    def _set_windows(self, seq_name, windows):
+        """Saves windows of a sequence, windows: {field: array} ('variation' or 'order'/'bounds',
+        see WINDOWS_LAYOUTS, and WINDOWS_STATS), returns count of windows"""
+        for field, array in windows.items():
+            self.data.create_dataset(
+                "windows/%s/%s" % (seq_name, field), data=array, overwrite=True
+            )
+        return windows["starts"].shape[0]
+
+    def _get_window_index_variation(self, seq_name, meta_windows):
+        """Returns variation of blocks of a sequence in order of windows and bounds of windows
+        (windows of layout 'index', see blocks_to_window_index)"""
+        order = np.array(self.data["windows/%s/order" % seq_name])
+        bounds = np.array(self.data["windows/%s/bounds" % seq_name])
+        variation = self._get_variation(
+            data_type="blocks",
+            sample_sets=meta_windows["sample_sets"],
+            sequences=[seq_name],
+            max_missing=meta_windows["max_missing"],
+            max_multiallelic=meta_windows["max_multiallelic"],
+            blocks_key=meta_windows.get("blocks_key", "blocks"),
         )
-        self.data.create_dataset(
-            "windows/%s/balance" % seq_name, data=balance, overwrite=True
+        return (variation.take(order, axis=0), bounds)
+
+    def _get_window_blocks(self, seq_name, meta_windows):
+        """Returns variation of blocks of a sequence in order of windows and bounds of windows
+        (see blocks_to_window_index) for windows of both layouts. Blocks of layout 'variation' are
+        read from the first window_step blocks of each window (and the rest of the last window)."""
+        if self._has_key("windows/%s/order" % seq_name):
+            return self._get_window_index_variation(seq_name, meta_windows)
+        window_variation = self.data["windows/%s/variation" % seq_name]
+        window_step = meta_windows["window_step"]
+        variation = np.concatenate(
+            [
+                np.array(window_variation[:, :window_step]).reshape(-1, window_variation.shape[-1]),
+                np.array(window_variation[-1, window_step:]),
+            ],
+            axis=0,
         )
-        self.data.create_dataset(
-            "windows/%s/mse_sample_set_cov" % seq_name,
-            data=mse_sample_set_cov,
+        return (variation, self._get_window_bounds(seq_name))
+
+    def _get_window_bounds(self, seq_name):
+        """Returns bounds of windows of a sequence (see _get_window_blocks) or None"""
+        if self._has_key("windows/%s/bounds" % seq_name):
+            return np.array(self.data["windows/%s/bounds" % seq_name])
+        if self._has_key("windows/%s/variation" % seq_name):
+            meta_windows = self._get_meta("windows")
+            window_count, window_size = self.data["windows/%s/variation" % seq_name].shape[:2]
+            window_lo = np.arange(window_count) * meta_windows["window_step"]
+            return np.stack([window_lo, window_lo + window_size], axis=1)
+        return None
+
+    def _tally_windows(self, config, tally_form="bsfs", progress=False, chunksize=1000):
+        """Tallies windows one sequence at a time with sliding histograms of mutuples (see
+        sliding_window_histograms), i.e. without building the variation of blocks in windows.
+        Tallies of form 'bsfs' are written to store in chunks of windows (and None is returned),
+        tallies of form 'tally' (rows [window_idx, count, mutuple]) are returned."""
+        meta_windows = self._get_meta("windows")
+        clip = get_tally_clip(tally_form, config["max_k"])
+        bounds_by_seq_name = {
+            seq_name: bounds
+            for seq_name, bounds in (
+                (seq_name, self._get_window_bounds(seq_name)) for seq_name in config["sequences"]
+            )
+            if bounds is not None
+        }
+        if not bounds_by_seq_name:
+            sys.exit("[X] Not enough blocks in Gimble datastore.")
+        config["windows"] = int(sum(bounds.shape[0] for bounds in bounds_by_seq_name.values()))
+        max_window_size = max(np.max(bounds[:, 1] - bounds[:, 0]) for bounds in bounds_by_seq_name.values())
+        if tally_form == "bsfs":
+            tally = self._create_windows_tally(config, clip, max_window_size, chunksize)
+        rows = []
+        window_offset, block_count, marginal_count = 0, 0, 0
+        for seq_name, bounds in tqdm(
+            bounds_by_seq_name.items(),
+            total=len(bounds_by_seq_name),
+            desc="[%] Tallying windows",
+            ncols=100,
+            unit_scale=True,
+            disable=(not progress),
+        ):
+            variation, bounds = self._get_window_blocks(seq_name, meta_windows)
+            mutuples_unique, categories, _ = unique_mutuples(
+                np.clip(variation, 0, clip),
+                radix=(None if clip is None else clip + 1),
+                return_inverse=True,
+            )
+            categories = categories.reshape(-1)  # shape of inverse differs between numpy versions
+            if tally_form == "bsfs":
+                cells = np.ravel_multi_index(tuple(mutuples_unique.T), tuple(clip + 1))
+            for chunk_start, histograms in sliding_window_histograms(
+                categories, mutuples_unique.shape[0], bounds, chunksize
+            ):
+                window_idx = window_offset + chunk_start
+                if tally_form == "bsfs":
+                    chunk_tally = np.zeros((histograms.shape[0], np.prod(clip + 1)), dtype=tally.dtype)
+                    chunk_tally[:, cells] = histograms
+                    tally[window_idx : window_idx + histograms.shape[0]] = chunk_tally.reshape(
+                        (histograms.shape[0],) + tuple(clip + 1)
+                    )
+                else:
+                    window_idxs, category_idxs = np.nonzero(histograms)
+                    rows.append(
+                        np.concatenate(
+                            [
+                                (window_idxs + window_idx)[:, None],
+                                histograms[window_idxs, category_idxs][:, None],
+                                mutuples_unique[category_idxs],
+                            ],
+                            axis=1,
+                        )
+                    )
+            if config["max_k"] is not None:
+                marginal_count += np.sum(
+                    window_sums(np.any((variation - config["max_k"]) > 0, axis=-1).astype(np.int64), bounds)
+                )
+            block_count += np.sum(bounds[:, 1] - bounds[:, 0])
+            window_offset += bounds.shape[0]
+        config["blocks"] = int(block_count)
+        config["marginality"] = format_percentage(marginal_count / block_count)
+        if tally_form == "bsfs":
+            return None
+        rows = np.concatenate(rows, axis=0)
+        # dtype has to fit window_idx as well as counts
+        return rows.astype(_return_np_type(rows))
+
+    def _create_windows_tally(self, config, clip, max_window_size, chunksize=1000):
+        """Returns bsfs array of windows in store that is written in chunks of windows"""
+        # counts per window can't exceed the number of blocks in window
+        return self.data.create_dataset(
+            config["tally_key"],
+            shape=(config["windows"],) + tuple(clip + 1),
+            chunks=(chunksize,) + tuple(clip + 1),
+            dtype=_return_np_type(max_window_size),
             overwrite=True,
         )
-        return window_variation.shape[0]
+
+    def _get_raw_tally_key(self, config):
+        """Returns key of raw tally (made by 'gimble blocks'/'gimble windows') from which the bsfs
+        of config can be derived by clipping, or None. Raw tallies of blocks are bsfs clipped at
+        get_tally_clip('bsfs', None), i.e. kmax of bsfs can not exceed 7. Raw tallies of windows
+        are unclipped rows [window_idx, count, mutuple]. Blocks, filters, sample sets and sequences
+        of raw tally and bsfs have to be the same."""
+        meta = self._get_meta("windows" if config["data_type"] == "windows" else config["blocks_key"])
+        raw_tally_key = meta.get("%s_raw_tally_key" % config["data_type"], None) if meta else None
+        if not raw_tally_key or raw_tally_key == config["tally_key"] or not self._has_key(raw_tally_key):
+            return None
+        meta_raw = self._get_meta(raw_tally_key)
+        for key in ["data_type", "sample_sets", "max_missing", "max_multiallelic", "blocks_key"]:
+            if meta_raw.get(key, None) != config[key]:
+                return None
+        if meta_raw["max_k"] is not None or list(meta_raw["sequences"]) != list(config["sequences"]):
+            return None
+        if config["data_type"] == "windows":
+            return raw_tally_key if meta_raw["data_ndims"] == 2 else None
+        if meta_raw["data_ndims"] != 4 or np.any(
+            get_tally_clip("bsfs", config["max_k"]) > get_tally_clip("bsfs", None)
+        ):
+            return None
+        return raw_tally_key
+
+    def _tally_blocks_from_raw(self, config, raw_tally_key):
+        """Returns bsfs of blocks derived from raw bsfs of blocks (see _get_raw_tally_key)"""
+        raw_bsfs = np.array(self.data[raw_tally_key], dtype=np.int64)
+        config["windows"] = 0
+        config["blocks"] = int(np.sum(raw_bsfs))
+        marginal_count = 0
+        if config["max_k"] is not None:
+            marginal_count = config["blocks"] - np.sum(
+                raw_bsfs[tuple(slice(0, k + 1) for k in config["max_k"])]
+            )
+        config["marginality"] = format_percentage(marginal_count / config["blocks"])
+        return clip_bsfs(raw_bsfs, get_tally_clip("bsfs", config["max_k"]))
+
+    def _tally_windows_from_raw(self, config, raw_tally_key, chunksize=1000):
+        """Writes bsfs of windows derived from raw tally rows of windows (see _get_raw_tally_key)
+        to store in chunks of windows (as _tally_windows), returns None"""
+        clip = get_tally_clip("bsfs", config["max_k"])
+        rows = np.array(self.data[raw_tally_key], dtype=np.int64)
+        rows = rows[np.argsort(rows[:, 0], kind="stable")]
+        window_idxs, counts = rows[:, 0], rows[:, 1]
+        config["windows"] = int(self._get_meta(raw_tally_key)["windows"])
+        config["blocks"] = int(np.sum(counts))
+        marginal_count = 0
+        if config["max_k"] is not None:
+            marginal_count = np.sum(counts[np.any((rows[:, 2:] - config["max_k"]) > 0, axis=-1)])
+        config["marginality"] = format_percentage(marginal_count / config["blocks"])
+        tally = self._create_windows_tally(
+            config, clip, int(np.max(np.bincount(window_idxs, weights=counts))), chunksize
+        )
+        mutuples = np.clip(rows[:, 2:], 0, clip)
+        for chunk_start in range(0, config["windows"], chunksize):
+            shape = (min(chunksize, config["windows"] - chunk_start),) + tuple(clip + 1)
+            lo, hi = np.searchsorted(window_idxs, [chunk_start, chunk_start + shape[0]])
+            codes = get_mutuple_codes(
+                np.concatenate([(window_idxs[lo:hi] - chunk_start)[:, None], mutuples[lo:hi]], axis=1),
+                shape,
+            )
+            tally[chunk_start : chunk_start + shape[0]] = (
+                np.bincount(codes, weights=counts[lo:hi], minlength=int(np.prod(shape)))
+                .astype(np.int64)
+                .reshape(shape)
+            )
+        return None
 
     ####################### REPORTS ######################
 
@@ -3776,19 +5476,19 @@ class Store(object):
             prefix="[+]",
             branch="PT",
             left="INTER-population sample-sets (X)",
-            right=format_count(len(self._get_sample_set_idxs(query="X"))),
+            right=format_count(len(self._get_sample_set_idxs(query="X", all_pairs=True))),
         )
         reportObj.add_line(
             prefix="[+]",
             branch="PT",
             left="INTRA-population sample-sets (A)",
-            right=format_count(len(self._get_sample_set_idxs(query="A"))),
+            right=format_count(len(self._get_sample_set_idxs(query="A", all_pairs=True))),
         )
         reportObj.add_line(
             prefix="[+]",
             branch="PF",
             left="INTRA-population sample-sets (B)",
-            right=format_count(len(self._get_sample_set_idxs(query="B"))),
+            right=format_count(len(self._get_sample_set_idxs(query="B", all_pairs=True))),
         )
         reportObj.add_line(
             prefix="[+]",
@@ -3893,18 +5593,48 @@ class Store(object):
                 right="%s | %s" % (format_bytes(size), percentage.rjust(7)),
                 fill=".",
             )
+        variants_stored, variants_int64 = self._get_variants_storage()
+        if variants_int64:
+            reportObj.add_line(
+                prefix="[+]",
+                left="variants (vs. uncompressed int64)",
+                right="%s of %s | %s" % (
+                    format_bytes(variants_stored),
+                    format_bytes(variants_int64),
+                    format_percentage(variants_stored / variants_int64).rjust(7),
+                ),
+                fill=".",
+            )
         return reportObj
 
-    def _get_blocks_report_metrics(self):
-        meta_blocks = self._get_meta("blocks")
+    def _get_variants_storage(self):
+        """Returns stored bytes of variants and bytes they would take as uncompressed int64"""
+        variants_stored, variants_int64 = 0, 0
+        for seq_name in self._get_meta("seqs").get("seq_names", []):
+            for key in ["pos", "matrix"]:
+                variants_key = "seqs/%s/variants/%s" % (seq_name, key)
+                if variants_key in self.data:
+                    variants_stored += recursive_get_size(pathlib.Path(self.path) / variants_key)
+                    variants_int64 += self.data[variants_key].size * np.dtype(np.int64).itemsize
+        return (variants_stored, variants_int64)
+
+    def _get_blocks_report_metrics(self, blocks_key="blocks"):
+        meta_blocks = self._get_meta(blocks_key)
         block_length = meta_blocks["length"]
         meta_seqs = self._get_meta("seqs")
         intervals_span = meta_seqs["intervals_span"]
         BRMs = {}
         for sample_sets in ["X", "A", "B"]:
-            sample_sets_count = len(self._get_sample_set_idxs(sample_sets))
+            if not sample_sets in meta_blocks.get("sample_sets", BLOCKS_SAMPLE_SETS):
+                BRMs[sample_sets] = collections.defaultdict(lambda: "-")  # blocks not made
+                continue
+            sample_sets_count = len(
+                self._get_sample_set_idxs(sample_sets, blocks_key=blocks_key)
+            )
             tally = tally_variation(
-                self._get_variation(data_type="blocks", sample_sets=sample_sets),
+                self._get_variation(
+                    data_type="blocks", sample_sets=sample_sets, blocks_key=blocks_key
+                ),
                 form="tally",
             )
             BRM = calculate_blocks_report_metrics(
@@ -3932,25 +5662,31 @@ class Store(object):
             BRMs[sample_sets] = BRM
         return BRMs
 
+    def _get_blocks_keys(self):
+        """Returns keys of blocks datasets ('blocks' first, then labelled ones, see get_blocks_key)"""
+        return [
+            key
+            for key in sorted(self.data.group_keys(), key=lambda key: (key != "blocks", key))
+            if (key == "blocks" or key.startswith("blocks_")) and self._has_blocks(key)
+        ]
+
+    def _has_blocks(self, blocks_key="blocks"):
+        """Returns True if blocks dataset is complete (i.e. not of an interrupted run, see _preflight_blocks)"""
+        return "length" in (self._get_meta(blocks_key) or {})
+
     def _get_blocks_report(self, width):
         reportObj = ReportObj(width=width)
         reportObj.add_line(prefix="[+]", left="[", center="Blocks", right="]", fill="=")
-        if self.has_stage("blocks"):
+        for blocks_key in self._get_blocks_keys():
             column_just = 14
-            meta_blocks = self._get_meta("blocks")
-            BRMs = self._get_blocks_report_metrics()
-            reportObj.add_line(prefix="[+]", left="blocks/")
+            meta_blocks = self._get_meta(blocks_key)
+            BRMs = self._get_blocks_report_metrics(blocks_key)
+            reportObj.add_line(prefix="[+]", left="%s/" % blocks_key)
             reportObj.add_line(
                 prefix="[+]",
                 branch="T",
                 fill=".",
-                left="'-l %s -m %s -u %s -i %s'"
-                % (
-                    meta_blocks["length"],
-                    meta_blocks["span"],
-                    meta_blocks["max_missing"],
-                    meta_blocks["max_multiallelic"],
-                ),
+                left="'%s'" % format_blocks_parameters(meta_blocks),
                 right=" %s blocks (%s discarded)"
                 % (
                     format_count(meta_blocks["count_total"]),
@@ -4015,7 +5751,12 @@ class Store(object):
                 prefix="[+]",
                 branch="F",
                 fill=".",
-                left="'-w %s -s %s'" % (window_size, window_step),
+                left="'%s%s'" % (
+                    "-w %s -s %s" % (window_size, window_step)
+                    if meta_windows.get("window_bp", None) is None
+                    else "-x %s -y %s -n %s" % (meta_windows["window_bp"], meta_windows["step_bp"], meta_windows["min_blocks"]),
+                    "" if meta_windows.get("layout", "variation") == "variation" else " -t %s" % meta_windows["layout"],
+                ),
                 right="%s windows of inter-population (X) blocks"
                 % (format_count(window_count)),
             )
@@ -4028,7 +5769,10 @@ class Store(object):
         )
         reportObj.add_line(prefix="[+]", left="tally/")
         if "tally/" in self.data:
-            shape_by_tally = {tally_label: tally.shape for tally_label, tally in self.data["tally/"].arrays() if not tally_label in set(['blocks_raw', 'windows_raw'])}
+            raw_tally_labels = set(['blocks_raw', 'windows_raw']) | set(
+                self._get_meta(blocks_key)["blocks_raw_tally_key"].replace("tally/", "", 1)
+                for blocks_key in self._get_blocks_keys() if "blocks_raw_tally_key" in self._get_meta(blocks_key))
+            shape_by_tally = {tally_label: tally.shape for tally_label, tally in self.data["tally/"].arrays() if not tally_label in raw_tally_labels}
             for idx, (tally_label, tally_shape) in enumerate(shape_by_tally.items()):
                 branch = "F" if idx == (len(shape_by_tally)-1) else "T"
                 reportObj.add_line(
@@ -7,7 +7,9 @@ import collections
 import lib.gimble
 
 # needs
-#lib.gimble.blocks_to_arrays
+#lib.gimble.pos_to_block_idxs
+#lib.gimble.gt_matrix_to_mutypes
+#lib.gimble.block_coordinates_to_arrays
 #lib.gimble._return_np_type
 #lib.gimble.fix_pos_array
 
@@ -95,24 +97,26 @@ def simulate_call(simulate_job):
     return {'window_idx': window_idx, 'replicate_idx': replicate_idx, 'bsfs': bsfs}
 
 def generate_bsfs(genotype_matrix, positions, comparisons, max_k, blocks, total_length):
-    sa_genotype_array = allel.GenotypeArray(genotype_matrix)
     num_comparisons = len(comparisons)
     result = np.zeros((num_comparisons, blocks, len(max_k)), dtype=np.int64)
+    # contiguous blocks along [0, total_length)
+    block_length = total_length // blocks
+    block_starts = np.arange(blocks, dtype=np.int64) * block_length
+    block_ends = block_starts + block_length
+    block_idxs = lib.gimble.pos_to_block_idxs(
+        np.array(positions, dtype=np.int64), (block_starts[:1], block_ends[-1:]), block_starts, block_ends)
+    variant_mask = block_idxs >= 0
+    # mutypes of all comparisons (sites x comparisons) are computed once
+    mutypes = lib.gimble.gt_matrix_to_mutypes(genotype_matrix[variant_mask], comparisons) if np.any(variant_mask) else None
     # generate all comparisons
     for idx, pair in enumerate(comparisons):
-        block_sites = np.arange(total_length, dtype=np.int64).reshape(blocks, -1)
-        subset_genotype_array = sa_genotype_array.subset(sel0=None, sel1=pair) 
-        *_, variation = lib.gimble.blocks_to_arrays(block_sites, subset_genotype_array, positions)
+        *_, variation = lib.gimble.block_coordinates_to_arrays(
+            block_starts, block_ends, block_length, 
+            mutypes[:, idx] if mutypes is not None else None, block_idxs[variant_mask])
         result[idx] = variation
     result = result.reshape(-1, result.shape[-1])
-    # count mutuples (clipping at k_max, if supplied)
-    mutuples, counts = np.unique(np.clip(result, 0, max_k+1), return_counts=True, axis=0)
-    # define out based on max values for each column
-    dtype = lib.gimble._return_np_type(counts)
-    out = np.zeros(tuple(max_k + 2), dtype)
-    # assign values
-    out[tuple(mutuples.T)] = counts
-    return out
+    # count mutuples (clipping at k_max), see lib.gimble.tally_variation
+    return lib.gimble.tally_variation(result, form="bsfs", max_k=max_k)
 
 def infinite_sites(ts, blocks, total_length): 
     positions = np.array([int(site.position) for site in ts.sites()])
@@ -0,0 +1,57 @@
+import os
+import shutil
+import sys
+
+import numpy as np
+import pytest
+import zarr
+
+import cli.interface
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(REPO_DIR, "tests", "data")
+
+
+def run_gimble(*args):
+    """Runs gimble command line (as 'gimble <args>') in this process"""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(sys, "argv", ["gimble"] + [str(arg) for arg in args])
+        cli.interface.main(REPO_DIR)
+
+
+def assert_stores_equal(path_a, path_b, prefixes=("blocks", "windows", "tally")):
+    """Asserts that arrays and attributes below prefixes are identical in both zarr stores"""
+    store_a, store_b = zarr.open(path_a, mode="r"), zarr.open(path_b, mode="r")
+    names_a, names_b = [], []
+    store_a.visit(names_a.append)
+    store_b.visit(names_b.append)
+    names = [name for name in names_a if name.split("/")[0].startswith(prefixes)]
+    assert names == [name for name in names_b if name.split("/")[0].startswith(prefixes)]
+    assert names
+    for name in names:
+        assert store_a[name].attrs.asdict() == store_b[name].attrs.asdict(), name
+        if isinstance(store_a[name], zarr.Array):
+            assert np.array_equal(store_a[name][:], store_b[name][:]), name
+
+
+@pytest.fixture(scope="session")
+def parsed_store(tmp_path_factory):
+    """Path of gimble store of test data after 'gimble parse' (not to be modified)"""
+    prefix = tmp_path_factory.mktemp("parsed") / "test"
+    run_gimble(
+        "parse",
+        "-g", os.path.join(DATA_DIR, "test.genomefile"),
+        "-v", os.path.join(DATA_DIR, "test.vcf"),
+        "-b", os.path.join(DATA_DIR, "test.bed"),
+        "-s", os.path.join(DATA_DIR, "test.samples.csv"),
+        "-z", prefix,
+    )
+    return "%s.z" % prefix
+
+
+@pytest.fixture
+def store(parsed_store, tmp_path):
+    """Path of copy of parsed gimble store"""
+    path = str(tmp_path / "test.z")
+    shutil.copytree(parsed_store, path)
+    return path
@@ -0,0 +1,107 @@
+"""Blocking by per-site arrays (intervals_to_sites => sites_to_blocks => blocks_to_arrays), as done
+before blocks were made from interval arithmetic (intervals_to_blocks). Kept as oracle for tests."""
+import numpy as np
+
+import lib.gimble
+
+
+def intervals_to_sites(intervals):
+    """starts = np.array([0, 5, 8, 11, 15])
+       ends   = np.array([2, 8, 9, 13, 18])
+    clens : array([2, 5, 6, 8, 11])
+    _sites: array([1, 1, 1, 1, 1, 1,  1, 1, 1, 1, 1])
+    _sites: array([0, 1, 1, 1, 1, 1,  1, 1, 1, 1, 1])
+    _sites: array([1, 1, 4, 1, 1, 1,  3, 1, 3, 1, 1])
+    sites : array([0, 1, 5, 6, 7, 8, 11,12,15,16,17])"""
+    starts, ends = intervals
+    if starts is None or ends is None:
+        return None
+    clens = np.cumsum(ends - starts)
+    if np.any(clens):
+        sites = np.ones(clens[-1], dtype=np.int64)
+        sites[0] = starts[0]
+        sites[clens[:-1]] = starts[1:] - ends[:-1] + 1
+        sites = sites.cumsum()
+        return sites
+    return None
+
+
+def sites_to_blocks(sites, block_length, block_span):
+    if sites is None:
+        return None
+    max_gap = block_span - block_length
+    if max_gap == 0:  # no gaps within blocks
+        block_sites = sites[: block_length * (sites.shape[0] // block_length)].reshape(
+            -1, block_length
+        )
+    else:  # gaps within blocks are allowed
+        block_sites = np.concatenate(
+            [
+                x[: block_length * (x.shape[0] // block_length)].reshape(
+                    -1, block_length
+                )
+                for x in np.split(sites, np.where(np.diff(sites) > max_gap)[0] + 1)
+            ]
+        )
+    block_sites_valid_mask = (
+        (block_sites[:, -1] - block_sites[:, 0] + 1)
+    ) <= block_span  # +1 is needed because block sites are sites (not coordinates)
+    if np.any(block_sites_valid_mask):
+        return block_sites[block_sites_valid_mask]
+    return None
+
+
+def blocks_to_arrays(blocks, gts, pos):
+    starts = np.array(blocks[:, 0], dtype=np.int64)
+    ends = np.array(blocks[:, -1] + 1, dtype=np.int64)  # BED: end+1
+    pos_in_block_sites = np.isin(pos, blocks, assume_unique=True)
+    if np.any(pos_in_block_sites):  # if variants in blocks
+        folded_minor_allele_counts = lib.gimble.gt2fmac(gts)
+        block_sites_in_pos = np.isin(blocks, pos, assume_unique=True)
+        blocks[block_sites_in_pos] = (
+            lib.gimble.szudzik_pairing(folded_minor_allele_counts) + 2
+        )  # add 2 so that not negative for bincount
+        blocks[
+            ~block_sites_in_pos
+        ] = 2  # monomorphic = 2 (0 = multiallelic, 1 = missing)
+        temp_sites = blocks + (
+            7 * np.arange(blocks.shape[0], dtype=np.int64).reshape(blocks.shape[0], 1)
+        )
+        multiallelic, missing, monomorphic, variation = np.hsplit(
+            np.bincount(temp_sites.ravel(), minlength=(blocks.shape[0] * 7)).reshape(
+                -1, 7
+            ),
+            np.array([1, 2, 3]),
+        )
+    else:
+        multiallelic = np.zeros((blocks.shape[0], 1), dtype=np.int64)
+        missing = np.zeros((blocks.shape[0], 1), dtype=np.int64)
+        monomorphic = np.full((blocks.shape[0], 1), blocks.shape[1], dtype=np.int64)
+        variation = np.zeros((blocks.shape[0], 4), dtype=np.int64)
+    return (starts, ends, multiallelic, missing, monomorphic, variation)
+
+
+def subset_gt_matrix(working_set, sample_set, indices, gt_matrix):
+    if gt_matrix is not None:
+        sample_set_vcf_idxs = np.array(
+            [working_set["variants_idx_by_sample"][sample] for sample in sample_set]
+        )
+        return gt_matrix.subset(indices, sample_set_vcf_idxs)
+    return None
+
+
+def make_sample_set_blocks(working_set, sample_set, block_length, block_span):
+    """Returns (starts, ends, multiallelic, missing, monomorphic, variation) of all blocks of a
+    sample set in a sequence (see Store._get_sequence_working_set), or None if there are none"""
+    pos, gt_matrix = working_set["pos"], working_set["gt_matrix"]
+    intervals = lib.gimble.get_working_set_intervals(working_set, sample_set)
+    block_sites = sites_to_blocks(intervals_to_sites(intervals), block_length, block_span)
+    if block_sites is None:
+        return None
+    gts = subset_gt_matrix(
+        working_set,
+        sample_set,
+        np.isin(pos, block_sites, assume_unique=True),
+        gt_matrix,
+    )
+    return blocks_to_arrays(block_sites, gts, pos)
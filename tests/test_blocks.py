@@ -0,0 +1,104 @@
+import shutil
+
+import numpy as np
+import pytest
+import zarr
+
+import lib.gimble
+from conftest import run_gimble
+from legacy_blocks import intervals_to_sites, make_sample_set_blocks, sites_to_blocks
+
+BLOCKS_PARAMETERS = [  # (block_length, block_span, max_multiallelic, max_missing)
+    (8, 8, 0, 0),
+    (8, 16, 0, 0),
+    (16, 24, 1, 1),
+    (64, 128, 3, 2),
+    (64, 128, 0, 8),
+]
+
+
+def random_intervals(rng, count):
+    gaps = rng.choice([0, 0, 1, 2, 5, 20, 100], size=count)
+    lengths = rng.integers(1, 40, size=count)
+    starts = np.cumsum(gaps) + np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    return (starts, starts + lengths)
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("block_length,block_span", [(1, 1), (4, 4), (4, 5), (8, 16), (16, 100)])
+def test_intervals_to_blocks(seed, block_length, block_span):
+    intervals = random_intervals(np.random.default_rng(seed), 200)
+    block_sites = sites_to_blocks(intervals_to_sites(intervals), block_length, block_span)
+    block_coordinates = lib.gimble.intervals_to_blocks(intervals, block_length, block_span)
+    if block_sites is None:
+        assert block_coordinates is None
+    else:
+        assert np.array_equal(block_coordinates[0], block_sites[:, 0])
+        assert np.array_equal(block_coordinates[1], block_sites[:, -1] + 1)
+
+
+@pytest.mark.parametrize("block_length,block_span,max_multiallelic,max_missing", BLOCKS_PARAMETERS)
+def test_blocks_match_per_site_blocking(store, block_length, block_span, max_multiallelic, max_missing):
+    run_gimble(
+        "blocks", "-z", store,
+        "-l", block_length, "-m", block_span, "-u", max_multiallelic, "-i", max_missing,
+    )
+    gimbleStore = lib.gimble.Store(path=store)
+    meta_seqs = gimbleStore._get_meta("seqs")
+    block_count = 0
+    for seq_name in meta_seqs["seq_names"]:
+        working_set = gimbleStore._get_sequence_working_set(seq_name, meta_seqs)
+        for sample_set_idx, sample_set in enumerate(meta_seqs["sample_sets"]):
+            legacy_arrays = make_sample_set_blocks(working_set, sample_set, block_length, block_span)
+            if legacy_arrays is None:
+                expected = {field: [] for field in lib.gimble.BLOCKS_FIELDS}
+            else:
+                blocks, _, _ = lib.gimble.filter_blocks(
+                    *legacy_arrays[:4], legacy_arrays[5], max_missing, max_multiallelic
+                )
+                expected = {field: [blocks[field]] if blocks["starts"].shape[0] else [] for field in blocks}
+            for field in lib.gimble.BLOCKS_FIELDS:
+                arrays = [
+                    array
+                    for _, _, array in gimbleStore._get_blocks_arrays(field, [seq_name], [sample_set_idx])
+                    if array.shape[0]
+                ]
+                assert len(arrays) == len(expected[field]), (seq_name, sample_set_idx, field)
+                for array, expected_array in zip(arrays, expected[field]):
+                    assert np.array_equal(array, expected_array), (seq_name, sample_set_idx, field)
+                    block_count += array.shape[0] if field == "starts" else 0
+    assert block_count == gimbleStore._get_meta("blocks")["count_total"] > 0
+
+
+def test_blocks_of_sample_sets_on_demand(store, tmp_path):
+    complete = str(tmp_path / "complete.z")
+    shutil.copytree(store, complete)
+    run_gimble("blocks", "-z", complete, "-l", 8, "-s", "all")
+    run_gimble("blocks", "-z", store, "-l", 8, "-s", "A")
+    meta_seqs = lib.gimble.Store(path=store, read_only=True)._get_meta("seqs")
+    sample_set_idxs_A = [
+        str(idx) for idx, intra_A in enumerate(meta_seqs["sample_sets_intra_A"]) if intra_A
+    ]
+    blocks = zarr.open(store, mode="r")["blocks"]
+    # only blocks of 'A' are made (and no tally 'raw' of blocks of 'X')
+    assert blocks.attrs["sample_sets"] == ["A"]
+    assert sorted(blocks.attrs["count_by_sample_set_idx"]) == sorted(sample_set_idxs_A)
+    assert all(set(blocks[seq_name].group_keys()) <= set(sample_set_idxs_A) for seq_name in blocks.group_keys())
+    assert not "blocks_raw_tally_key" in blocks.attrs
+    assert not "tally/blocks_raw" in zarr.open(store, mode="r")
+    run_gimble("info", "-z", store)
+    assert zarr.open(store, mode="r")["blocks"].attrs["sample_sets"] == ["A"]
+    # blocks of 'X' (and tally 'raw') are made once they are tallied
+    for path in (store, complete):
+        run_gimble("tally", "-z", path, "-t", "blocks", "-l", "b", "-k", "2,2,2,2")
+    store_data, complete_data = zarr.open(store, mode="r"), zarr.open(complete, mode="r")
+    assert store_data["blocks"].attrs["sample_sets"] == ["X", "A"]
+    for key in ("tally/b", "tally/blocks_raw"):
+        assert np.array_equal(store_data[key][:], complete_data[key][:]), key
+    for seq_name in complete_data["blocks"].group_keys():
+        for sample_set_idx in complete_data["blocks/%s" % seq_name].group_keys():
+            if meta_seqs["sample_sets_intra_B"][int(sample_set_idx)]:
+                continue
+            for field in lib.gimble.BLOCKS_FIELDS:
+                key = "blocks/%s/%s/%s" % (seq_name, sample_set_idx, field)
+                assert np.array_equal(store_data[key][:], complete_data[key][:]), key
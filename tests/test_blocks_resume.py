@@ -0,0 +1,49 @@
+import shutil
+
+import pytest
+
+import lib.gimble
+from conftest import assert_stores_equal, run_gimble
+
+
+class Interrupted(Exception):
+    pass
+
+
+def interrupt_blocks(monkeypatch, after):
+    """Makes Store._set_blocks fail once blocks of 'after' sample sets have been saved"""
+    set_blocks = lib.gimble.Store._set_blocks
+    calls = []
+
+    def _set_blocks(self, *args, **kwargs):
+        if len(calls) == after:
+            raise Interrupted()
+        calls.append(args)
+        return set_blocks(self, *args, **kwargs)
+
+    monkeypatch.setattr(lib.gimble.Store, "_set_blocks", _set_blocks)
+
+
+@pytest.mark.parametrize("layout", ["arrays", "table"])
+@pytest.mark.parametrize("label", [None, "short"])
+def test_resume_interrupted_blocks(store, tmp_path, monkeypatch, capsys, layout, label):
+    blocks_args = ["-l", "8", "-u", "1", "-t", layout] + ([] if label is None else ["--label", label])
+    blocks_key = lib.gimble.get_blocks_key(label)
+    complete = str(tmp_path / "complete.z")
+    shutil.copytree(store, complete)
+    run_gimble("blocks", "-z", complete, *blocks_args)
+    # interrupted in the middle of the second sequence (15 sample sets per sequence)
+    with monkeypatch.context() as interrupted:
+        interrupt_blocks(interrupted, 20)
+        with pytest.raises(Interrupted):
+            run_gimble("blocks", "-z", store, *blocks_args)
+    capsys.readouterr()
+    with pytest.raises(SystemExit) as exit_info:
+        run_gimble("blocks", "-z", store, *blocks_args)
+    message = str(exit_info.value)
+    assert "already contains blocks %r" % blocks_key in message
+    assert "'-l 8 -m 16 -u 1 -i 0' (interrupted run)" in message
+    assert "(or '--resume' to continue the interrupted run)" in message
+    run_gimble("blocks", "-z", store, "--resume", *blocks_args)
+    assert "Resuming blocks %r" % blocks_key in capsys.readouterr().out
+    assert_stores_equal(complete, store)
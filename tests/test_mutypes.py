@@ -0,0 +1,129 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import lib.gimble
+from legacy_blocks import blocks_to_arrays, intervals_to_sites, sites_to_blocks
+
+
+def pairwise_mutypes(gt_matrix, sample_idx_pairs):
+    """Mutypes by the per-pair path: szudzik_pairing(gt2fmac(...)) + 2 of each pair of samples"""
+    return np.stack(
+        [
+            lib.gimble.szudzik_pairing(lib.gimble.gt2fmac(gt_matrix[:, list(pair)])) + 2
+            for pair in sample_idx_pairs
+        ],
+        axis=1,
+    )
+
+
+def random_gt_matrix(rng, sites, samples, max_allele, missing_fraction):
+    gt_matrix = rng.integers(0, max_allele + 1, size=(sites, samples, 2), dtype=np.int8)
+    gt_matrix[rng.random(gt_matrix.shape) < missing_fraction] = -1
+    return gt_matrix
+
+
+def test_biallelic_mutypes_lut():
+    genotypes = [[0, 0], [0, 1], [1, 0], [1, 1], [-1, -1], [0, -1], [-1, 1]]
+    gt_matrix = np.array(
+        [[gt_A, gt_B] for gt_A, gt_B in itertools.product(genotypes, repeat=2)],
+        dtype=np.int8,
+    )
+    assert np.array_equal(
+        lib.gimble.gt_matrix_to_mutypes(gt_matrix, [(0, 1)]),
+        pairwise_mutypes(gt_matrix, [(0, 1)]),
+    )
+    assert set(lib.gimble.BIALLELIC_MUTYPES_LUT) == {1, 2, 3, 4, 5, 6}
+
+
+def test_all_pairs_of_genotypes():
+    # every combination of two diploid genotypes over alleles 0-3 and missing
+    genotypes = list(itertools.product(range(-1, 4), repeat=2))
+    gt_matrix = np.array(
+        [[gt_A, gt_B] for gt_A, gt_B in itertools.product(genotypes, repeat=2)],
+        dtype=np.int8,
+    )
+    assert np.array_equal(
+        lib.gimble.gt_matrix_to_mutypes(gt_matrix, [(0, 1), (1, 0)]),
+        pairwise_mutypes(gt_matrix, [(0, 1), (1, 0)]),
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize(
+    "max_allele,missing_fraction",
+    [(1, 0.0), (1, 0.05), (2, 0.0), (3, 0.05)],
+)
+def test_random_gt_matrix(seed, max_allele, missing_fraction):
+    rng = np.random.default_rng(seed)
+    gt_matrix = random_gt_matrix(rng, 500, 6, max_allele, missing_fraction)
+    sample_idx_pairs = list(itertools.product(range(3), range(3, 6)))
+    mutypes = lib.gimble.gt_matrix_to_mutypes(gt_matrix, sample_idx_pairs)
+    assert mutypes.shape == (500, len(sample_idx_pairs))
+    assert np.array_equal(mutypes, pairwise_mutypes(gt_matrix, sample_idx_pairs))
+
+
+def test_mixed_biallelic_and_multiallelic_sites():
+    # mostly biallelic sites (fast path) interspersed with multiallelic sites (general path)
+    rng = np.random.default_rng(42)
+    gt_matrix = random_gt_matrix(rng, 1000, 4, 1, 0.02)
+    multiallelic_idxs = rng.choice(1000, size=50, replace=False)
+    gt_matrix[multiallelic_idxs] = random_gt_matrix(rng, 50, 4, 3, 0.02)
+    sample_idx_pairs = [(0, 2), (0, 3), (1, 2), (1, 3)]
+    mutypes = lib.gimble.gt_matrix_to_mutypes(gt_matrix, sample_idx_pairs)
+    assert np.array_equal(mutypes, pairwise_mutypes(gt_matrix, sample_idx_pairs))
+    assert np.any(mutypes == 0) and np.any(mutypes == 1)
+
+
+@pytest.mark.parametrize("block_length,block_span", [(8, 16), (32, 64)])
+def test_block_arrays_match_per_pair_path(parsed_store, block_length, block_span):
+    # blocks of the parsed test data (with missing and multiallelic genotypes)
+    gimbleStore = lib.gimble.Store(path=parsed_store, read_only=True)
+    meta_seqs = gimbleStore._get_meta("seqs")
+    variations, legacy_variations, multiallelic, missing = [], [], 0, 0
+    for seq_name in meta_seqs["seq_names"]:
+        working_set = gimbleStore._get_sequence_working_set(seq_name, meta_seqs)
+        pos, gt_matrix = working_set["pos"], working_set["gt_matrix"]
+        if gt_matrix is None:  # no variants in intervals
+            continue
+        sample_idx_pairs = [
+            [working_set["variants_idx_by_sample"][sample] for sample in sample_set]
+            for sample_set in meta_seqs["sample_sets"]
+        ]
+        mutypes = lib.gimble.gt_matrix_to_mutypes(gt_matrix, sample_idx_pairs)
+        for sample_set_idx, sample_set in enumerate(meta_seqs["sample_sets"]):
+            intervals = lib.gimble.get_working_set_intervals(working_set, sample_set)
+            block_sites = sites_to_blocks(intervals_to_sites(intervals), block_length, block_span)
+            if block_sites is None:
+                continue
+            block_starts, block_ends = block_sites[:, 0], block_sites[:, -1] + 1
+            block_idxs = lib.gimble.pos_to_block_idxs(pos, intervals, block_starts, block_ends)
+            variant_mask = block_idxs >= 0
+            arrays = lib.gimble.block_coordinates_to_arrays(
+                block_starts,
+                block_ends,
+                block_length,
+                mutypes[variant_mask, sample_set_idx],
+                block_idxs[variant_mask],
+            )
+            legacy_arrays = blocks_to_arrays(
+                block_sites.copy(),
+                gt_matrix.subset(
+                    np.isin(pos, block_sites, assume_unique=True), sample_idx_pairs[sample_set_idx]
+                ),
+                pos,
+            )
+            for array, legacy_array in zip(arrays, legacy_arrays):
+                assert np.array_equal(array, legacy_array), (seq_name, sample_set_idx)
+            variations.append(arrays[5])
+            legacy_variations.append(legacy_arrays[5])
+            multiallelic += np.sum(arrays[2])
+            missing += np.sum(arrays[3])
+    assert multiallelic and missing
+    variation, legacy_variation = np.concatenate(variations), np.concatenate(legacy_variations)
+    for max_k in (None, np.array([2, 2, 2, 2])):
+        assert np.array_equal(
+            lib.gimble.tally_variation(variation, form="bsfs", max_k=max_k),
+            lib.gimble.tally_variation(legacy_variation, form="bsfs", max_k=max_k),
+        )
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+import zarr
+
+import lib.gimble
+from conftest import run_gimble
+
+
+def has_consolidated_metadata(path):
+    return os.path.isfile(os.path.join(path, ".zmetadata"))
+
+
+def test_consolidated_metadata_kept_until_modified(store):
+    assert has_consolidated_metadata(store)
+    gimbleStore = lib.gimble.Store(path=store)
+    gimbleStore._get_meta("seqs")
+    assert has_consolidated_metadata(store)
+    gimbleStore.consolidate_metadata()
+    assert not gimbleStore.data.store.modified
+    # pool workers write to stores modified by their parent process
+    workerStore = lib.gimble.Store(path=store, worker=True)
+    workerStore._set_meta("test_worker", meta={"value": 1})
+    assert has_consolidated_metadata(store)
+    gimbleStore._set_meta("test", meta={"value": 2})
+    assert not has_consolidated_metadata(store)
+    gimbleStore.consolidate_metadata()
+    consolidated = zarr.open_consolidated(store, mode="r")
+    assert consolidated["test"].attrs.asdict() == {"value": 2}
+    assert consolidated["test_worker"].attrs.asdict() == {"value": 1}
+
+
+def test_consolidated_metadata_after_failed_run(store, monkeypatch):
+    def _make_blocks(self, configs):
+        self.data.require_group("blocks/chr1")
+        raise RuntimeError("interrupted")
+
+    monkeypatch.setattr(lib.gimble.Store, "_make_blocks", _make_blocks)
+    with pytest.raises(RuntimeError):
+        run_gimble("blocks", "-z", store, "-l", 8)
+    consolidated = zarr.open_consolidated(store, mode="r")
+    assert "blocks/chr1" in consolidated
+    assert "checkpoint" in consolidated["blocks"].attrs
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import lib.gimble
+
+
+def unique_tally(variation, max_k):
+    """bsfs counted by np.unique(axis=0) of clipped mutuples (as before mixed-radix codes)"""
+    clip = max_k + 1
+    if variation.ndim == 2:
+        mutuples = np.clip(variation, 0, clip)
+        out = np.zeros(tuple(clip + 1), dtype=np.int64)
+    else:
+        index = np.repeat(np.arange(variation.shape[0]), variation.shape[1]).reshape(-1, 1)
+        mutuples = np.concatenate(
+            (index, np.clip(variation.reshape(-1, variation.shape[-1]), 0, clip)), axis=-1
+        )
+        out = np.zeros((variation.shape[0],) + tuple(clip + 1), dtype=np.int64)
+    mutuples_unique, counts = np.unique(mutuples, return_counts=True, axis=0)
+    out[tuple(mutuples_unique.T)] = counts
+    return out
+
+
+@pytest.mark.parametrize("shape", [(1000, 4), (20, 50, 4)])
+def test_tally_variation_bsfs(shape, monkeypatch):
+    rng = np.random.default_rng(1)
+    variation = rng.poisson(1.5, size=shape).astype(np.uint8)
+    max_k = np.array([2, 2, 2, 2])
+    expected = unique_tally(variation, max_k)
+    assert np.array_equal(lib.gimble.tally_variation(variation, form="bsfs", max_k=max_k), expected)
+    # codes that would overflow int64 fall back to np.unique(axis=0)
+    monkeypatch.setattr(lib.gimble, "get_mutuple_codes", lambda mutuples, radix: None)
+    assert np.array_equal(lib.gimble.tally_variation(variation, form="bsfs", max_k=max_k), expected)
+
+
+def test_get_mutuple_codes_overflow():
+    mutuples = np.zeros((3, 4), dtype=np.int64)
+    assert lib.gimble.get_mutuple_codes(mutuples, (2 ** 16,) * 4) is None
+    assert lib.gimble.get_mutuple_codes(mutuples, (2 ** 15,) * 4) is not None
@@ -0,0 +1,62 @@
+import glob
+
+import numpy as np
+import pytest
+
+import lib.gimble
+from conftest import run_gimble
+
+
+def random_window_bounds(rng, block_count, fixed):
+    """Bounds of windows of 50 blocks (shifted by 20) or of fixed length (in bases) along blocks"""
+    if fixed:
+        return lib.gimble.blocks_to_window_index(np.arange(block_count), 50, 20)[1]
+    ends = np.sort(rng.integers(0, block_count * 10, size=block_count))
+    return lib.gimble.blocks_to_bp_window_index(ends, block_count * 10, 400, rng.choice([100, 400, 700]))[1]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("fixed", [True, False])
+@pytest.mark.parametrize("chunksize", [1, 7, 1000])
+def test_sliding_window_histograms_and_medians(seed, fixed, chunksize):
+    rng = np.random.default_rng(seed)
+    categories = rng.integers(0, 6, size=2000)
+    values = rng.integers(0, 10000, size=2000) / 2
+    bounds = random_window_bounds(rng, categories.shape[0], fixed)
+    histograms = np.concatenate(
+        [histograms for _, histograms in lib.gimble.sliding_window_histograms(categories, 6, bounds, chunksize)]
+    )
+    expected = np.stack([np.bincount(categories[lo:hi], minlength=6) for lo, hi in bounds])
+    assert np.array_equal(histograms, expected)
+    medians = lib.gimble.window_medians(values, bounds)
+    assert np.array_equal(medians, [np.median(values[lo:hi]) for lo, hi in bounds])
+
+
+def test_windows_of_fixed_length(store, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    run_gimble("blocks", "-z", store, "-l", 8)
+    run_gimble("windows", "-z", store, "-x", 1000, "-y", 250, "-n", 5)
+    run_gimble("tally", "-z", store, "-t", "windows", "-l", "w", "-k", "2,2,2,2")
+    # tally of sequences other than those of tally 'windows_raw' (see _tally_windows)
+    run_gimble("tally", "-z", store, "-t", "windows", "-l", "w_seqs", "-k", "2,2,2,2", "-s", "chr1,chr2")
+    gimbleStore = lib.gimble.Store(path=store, read_only=True)
+    variations = gimbleStore._get_variation(data_type="windows")
+    window_count = sum(
+        gimbleStore._get_window_bounds(seq_name).shape[0]
+        for seq_name in gimbleStore._get_meta("seqs")["seq_names"]
+        if gimbleStore._get_window_bounds(seq_name) is not None
+    )
+    # windows vary in number of blocks (one array of variation per window)
+    assert len(variations) == window_count > 0
+    assert len({window_variation.shape[0] for window_variation in variations}) > 1
+    assert min(window_variation.shape[0] for window_variation in variations) >= 5
+    max_k = np.array([2, 2, 2, 2])
+    expected = np.stack(
+        [lib.gimble.tally_variation(window_variation, form="bsfs", max_k=max_k) for window_variation in variations]
+    )
+    for key in ("tally/w", "tally/w_seqs"):
+        assert np.array_equal(gimbleStore.data[key][:], expected), key
+    run_gimble("query", "-z", store, "-l", "windows")
+    run_gimble("query", "-z", store, "-l", "tally/w")
+    assert len(glob.glob(str(tmp_path / "*.bed"))) == 1
+    assert len(glob.glob(str(tmp_path / "*.tsv"))) >= 1